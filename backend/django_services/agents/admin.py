@@ -1,3 +1,30 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AdviceJob, ChatSession, ChatTurn, Transaction
+
+
+class ChatTurnInline(admin.TabularInline):
+    model = ChatTurn
+    extra = 0
+    readonly_fields = ('index', 'question', 'answer', 'tokens', 'model', 'created_at')
+
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'turn_count', 'summarized_through', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at')
+    inlines = [ChatTurnInline]
+
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'date', 'category', 'amount', 'is_income')
+    list_filter = ('is_income', 'category')
+    search_fields = ('user_id', 'external_id')
+
+
+@admin.register(AdviceJob)
+class AdviceJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at',)
@@ -0,0 +1,327 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+
+from django.conf import settings
+
+from agents.forecasting import savings_risk_level
+from agents.metrics import REGISTRY, Counter
+from agents.prompts import ADVICE_FIELDS, get_template
+
+# Precomputed comprehensive advice for common personas.
+# `manage.py generate_advice_packs` runs the agent over the occupation x income band x
+# family size grid and writes the answers to one JSON index per advice template
+# version (ADVICE_PACK_DIR/advice-packs-<template>.json), so a prompt change never
+# serves packs written for the old prompt. The financial advice endpoints answer a
+# request without personal data (no transactions, no user_id) from the nearest pack
+# of the same occupation: same income band or the closest one, then the closest
+# family size. A pack is only served when the request's occupation is one a persona
+# covers and the figures and text it does send (expenses, savings, goals, ...)
+# describe that persona too; otherwise the agent answers. "pack": false skips the
+# lookup; "personalize": true also queues a background advice job (agents.jobs)
+# whose result the client can fetch later.
+
+INDEX_FORMAT = 1
+PACK_DIR = Path(os.getenv('ADVICE_PACK_DIR', str(Path(settings.BASE_DIR) / 'advice_packs')))
+PACKS_ENABLED = os.getenv('ADVICE_PACKS', 'True').lower() == 'true'
+PERSONALIZE_DEFAULT = os.getenv('ADVICE_PACK_PERSONALIZE', 'False').lower() == 'true'
+
+OCCUPATIONS = ('delivery driver', 'auto driver', 'cab driver', 'gig worker', 'street vendor', 'domestic worker')
+INCOME_BANDS = ('5000-15000', '15000-25000', '25000-40000', '40000-60000')
+FAMILY_SIZES = ('1-2 members', '3-4 members', '5+ members')
+
+# Occupation words (matched as whole words, plural or not) mapped to the persona that
+# covers them. No occupation means the prompt's default, a gig worker; an occupation
+# none of the personas covers gets no pack and is answered live.
+OCCUPATION_ALIASES = {
+    'delivery driver': ('delivery', 'swiggy', 'zomato', 'zepto', 'blinkit', 'dunzo', 'courier', 'rider'),
+    'auto driver': ('auto', 'rickshaw', 'tuk'),
+    'cab driver': ('cab', 'taxi', 'uber', 'ola', 'rapido'),
+    'street vendor': ('vendor', 'hawker', 'stall', 'thela'),
+    'domestic worker': ('domestic', 'maid', 'cook', 'housekeeper', 'housekeeping', 'nanny'),
+    'gig worker': ('gig',),
+}
+DEFAULT_OCCUPATION = 'gig worker'
+
+# An income further than this factor outside the nearest band gets no pack
+MAX_INCOME_RATIO = 1.5
+# Largest difference in expenses / income from the persona's that still gets its pack
+MAX_EXPENSE_RATIO_GAP = 0.15
+# Free-text fields a pack only answers when absent or the same as the persona's
+PROFILE_TEXT_FIELDS = ('income_pattern', 'goals', 'location')
+
+PACK_LOOKUPS = REGISTRY.register(Counter(
+    'moneymitra_advice_pack_lookups_total', 'Financial advice requests answered from precomputed packs.',
+    ('outcome',)))
+
+
+def _numbers(text):
+    """Amounts in a free-form value: '15000-25000', '20k', '₹20,000' -> [15000.0, 25000.0]"""
+    values = []
+    for number, suffix in re.findall(r'(\d+(?:\.\d+)?)\s*(k|K|l|L|lakh)?', str(text).replace(',', '')):
+        value = float(number)
+        if suffix in ('k', 'K'):
+            value *= 1000
+        elif suffix:
+            value *= 100000
+        values.append(value)
+    return values
+
+
+def band_range(band):
+    low, high = _numbers(band)[:2]
+    return low, high
+
+
+def band_midpoint(band):
+    low, high = band_range(band)
+    return (low + high) / 2
+
+
+def family_count(value):
+    """Family members from '3-4 members', '4' or 'family of 5' (upper end of a range)"""
+    numbers = _numbers(value)
+    return int(max(numbers[:2])) if numbers else None
+
+
+def persona_occupation(occupation):
+    """Persona covering an occupation, or None when none of them does"""
+    text = ' '.join(str(occupation or '').lower().split())
+    if not text:
+        return DEFAULT_OCCUPATION
+    if text in OCCUPATIONS:
+        return text
+    words = set(re.findall(r'[a-z]+', text))
+    for persona, aliases in OCCUPATION_ALIASES.items():
+        if any(alias in words or alias + 's' in words for alias in aliases):
+            return persona
+    return None
+
+
+def profile_mismatch(user_data, income, persona):
+    """First request field the persona's advice doesn't reflect, or None.
+
+    Expenses must be a similar share of income, and savings against expenses must
+    give the same risk level; text fields must be absent or the persona's value.
+    """
+    expenses = _numbers(user_data.get('monthly_expenses'))
+    savings = _numbers(user_data.get('current_savings'))
+    if user_data.get('monthly_expenses') not in (None, ''):
+        if not expenses:
+            return 'monthly_expenses'
+        persona_ratio = float(persona['monthly_expenses']) / band_midpoint(persona['income_range'])
+        if abs(expenses[0] / max(income, 1) - persona_ratio) > MAX_EXPENSE_RATIO_GAP:
+            return 'monthly_expenses'
+    if user_data.get('current_savings') not in (None, ''):
+        if not savings:
+            return 'current_savings'
+        user_expenses = expenses[0] if expenses else persona['monthly_expenses']
+        if (savings_risk_level(savings[0], user_expenses)
+                != savings_risk_level(persona['current_savings'], persona['monthly_expenses'])):
+            return 'current_savings'
+    for field in PROFILE_TEXT_FIELDS:
+        value = str(user_data.get(field) or '').strip().lower()
+        if value and value != str(persona.get(field) or '').strip().lower():
+            return field
+    return None
+
+
+def pack_key(occupation, income_band, family_size):
+    return f'{occupation}|{income_band}|{family_size}'
+
+
+def persona_profile(occupation, income_band, family_size):
+    """Advice request for one grid persona; expenses and savings follow the income band"""
+    income = band_midpoint(income_band)
+    return {
+        **ADVICE_FIELDS,
+        'occupation': occupation,
+        'income_range': income_band,
+        'family_size': family_size,
+        'monthly_expenses': str(int(round(income * 0.85, -2))),
+        'current_savings': str(int(round(income * 0.3, -2))),
+    }
+
+
+def persona_grid(occupations=OCCUPATIONS, income_bands=INCOME_BANDS, family_sizes=FAMILY_SIZES):
+    """(key, profile) for every persona in the grid"""
+    for occupation, band, family in product(occupations, income_bands, family_sizes):
+        yield pack_key(occupation, band, family), persona_profile(occupation, band, family)
+
+
+def index_version():
+    """Packs are only valid for the advice template (and variant) they were generated with"""
+    return get_template('financial_advice').key
+
+
+def index_path(directory=None, version=None):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', version or index_version()).strip('-')
+    return Path(directory or PACK_DIR) / f'advice-packs-{slug}.json'
+
+
+class PackIndex:
+    """Precomputed advice by persona key, with nearest-persona lookup"""
+
+    def __init__(self, version, packs=None, generated_at=None):
+        self.version = version
+        self.packs = dict(packs or {})
+        self.generated_at = generated_at
+        self._by_occupation = {}
+        for key, pack in self.packs.items():
+            occupation, band, family = key.split('|')
+            self._by_occupation.setdefault(occupation, []).append(
+                (band_range(band), family_count(family), key, pack))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != INDEX_FORMAT:
+            raise ValueError(f'{path}: unsupported advice pack format {data.get("format")}')
+        return cls(data['version'], data.get('packs'), data.get('generated_at'))
+
+    def save(self, path):
+        """Write atomically, so serving workers never read a half-written index"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.generated_at = datetime.now().isoformat()
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'format': INDEX_FORMAT, 'version': self.version, 'generated_at': self.generated_at,
+                       'packs': self.packs}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def add(self, key, pack):
+        self.packs[key] = pack
+
+    def nearest(self, user_data):
+        """(key, pack, match) of the closest persona, or None when no pack is close enough.
+
+        Not close enough: an occupation no persona covers, income too far from every
+        band, or a profile_mismatch().
+        """
+        occupation = persona_occupation(user_data.get('occupation'))
+        candidates = self._by_occupation.get(occupation)
+        if not candidates:
+            return None
+        incomes = _numbers(user_data.get('income_range') or ADVICE_FIELDS['income_range'])
+        income = sum(incomes[:2]) / len(incomes[:2]) if incomes else band_midpoint(ADVICE_FIELDS['income_range'])
+        family = family_count(user_data.get('family_size') or ADVICE_FIELDS['family_size'])
+
+        def distance(candidate):
+            (low, high), members, _, _ = candidate
+            # Income inside the band is distance 0; outside it grows with the log ratio
+            edge = low if income < low else high
+            income_gap = 0.0 if low <= income <= high else abs(math.log(max(income, 1) / edge))
+            family_gap = abs((members or 0) - (family or 0)) if family is not None else 0
+            return income_gap, family_gap
+
+        best = min(candidates, key=distance)
+        income_gap, family_gap = distance(best)
+        if income_gap > math.log(MAX_INCOME_RATIO):
+            return None
+        _, _, key, pack = best
+        if profile_mismatch(user_data, income, pack['profile']):
+            return None
+        return key, pack, {'occupation': occupation, 'income': income, 'family_size': family,
+                           'exact': income_gap == 0 and family_gap == 0}
+
+    def stats(self):
+        return {'version': self.version, 'packs': len(self.packs), 'generated_at': self.generated_at}
+
+
+class PackStore:
+    """The current version's index on disk, reloaded when the generator replaces it"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else index_path()
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._index = PackIndex.load(self.path)
+                    except (OSError, ValueError, KeyError):
+                        self._index = None
+                    self._mtime = mtime
+        return self._index
+
+    def lookup(self, user_data):
+        index = self.index()
+        found = index.nearest(user_data) if index is not None else None
+        PACK_LOOKUPS.inc(outcome='hit' if found else 'miss')
+        return found
+
+    def stats(self):
+        index = self.index()
+        return {'path': str(self.path), **(index.stats() if index is not None else {'packs': 0})}
+
+
+def pack_requested(user_data):
+    """Serve from packs unless disabled or the request carries personal data a pack can't reflect"""
+    flag = user_data.get('pack')
+    if flag is not None and flag != '':
+        return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+    return PACKS_ENABLED and not user_data.get('recent_transactions') and not user_data.get('user_id')
+
+
+def personalize_requested(user_data):
+    flag = user_data.get('personalize')
+    if flag is None or flag == '':
+        return PERSONALIZE_DEFAULT
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+
+def pack_result(key, pack, match):
+    """Agent-style advice result for a served pack (see api.views.advice_payload)"""
+    result = dict(pack['result'])
+    result['pack'] = {'key': key, 'version': index_version(), 'generated_at': pack.get('generated_at'), **match}
+    return result
+
+
+def generate(index, items, agent, max_workers=4, rate_limiter=None, on_result=None):
+    """Run the agent for (key, profile) items on a bounded pool; successful answers go into `index`"""
+    from agents.batch import run_bounded
+
+    def run(item):
+        started = time.perf_counter()
+        result = agent.get_financial_advice(item[1])
+        return result, round((time.perf_counter() - started) * 1000, 1)
+
+    for (key, profile), outcome in run_bounded(items, run, max_workers=max_workers, rate_limiter=rate_limiter):
+        if isinstance(outcome, Exception):
+            result, elapsed_ms = {'success': False, 'error': str(outcome)}, None
+        else:
+            result, elapsed_ms = outcome
+        if result.get('success'):
+            index.add(key, {'profile': profile, 'result': result, 'generated_at': datetime.now().isoformat()})
+        if on_result is not None:
+            on_result(key, result, elapsed_ms)
+
+
+_lock = threading.Lock()
+_store = None
+
+
+def get_pack_store():
+    """Process-wide advice pack store"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = PackStore()
+    return _store
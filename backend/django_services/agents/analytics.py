@@ -0,0 +1,224 @@
+import numpy as np
+
+# Columnar spending analytics.
+# A transaction list is parsed once into NumPy arrays (amount, category code, day)
+# and every aggregate below is computed from those arrays without Python loops.
+
+UNKNOWN_DATE = 'unknown'
+
+# Rows treated as money coming in rather than spending
+INCOME_TYPES = frozenset(['income', 'credit', 'cr', 'received'])
+INCOME_CATEGORIES = frozenset(['income', 'salary', 'earnings', 'payout', 'tips', 'wages'])
+
+
+def _is_income(transaction):
+    kind = str(transaction.get('type') or '').lower()
+    category = str(transaction.get('category') or '').lower()
+    return kind in INCOME_TYPES or category in INCOME_CATEGORIES
+
+
+def _parse_amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _parse_dates(raw_dates):
+    """ISO date strings -> datetime64[D], NaT where missing or unparseable"""
+    values = [d[:10] if isinstance(d, str) else '' for d in raw_dates]
+    try:
+        return np.array(values, dtype='datetime64[D]')
+    except ValueError:
+        out = np.empty(len(values), dtype='datetime64[D]')
+        for i, value in enumerate(values):
+            try:
+                out[i] = np.datetime64(value, 'D')
+            except ValueError:
+                out[i] = np.datetime64('NaT')
+        return out
+
+
+class TransactionFrame:
+    """Transactions as parallel NumPy columns.
+
+    Rows whose amount cannot be parsed are dropped from the columns but still
+    counted in ``row_count`` (matching the original per-request analysis).
+    """
+
+    def __init__(self, amounts, category_codes, categories, days, row_count, row_index=None, is_income=None):
+        self.amounts = amounts
+        self.category_codes = category_codes
+        self.categories = categories
+        self.days = days
+        self.row_count = row_count
+        # Position of each parsed row in the original transaction list
+        self.row_index = np.arange(len(amounts)) if row_index is None else row_index
+        self.is_income = np.zeros(len(amounts), dtype=bool) if is_income is None else is_income
+
+    @classmethod
+    def from_records(cls, transactions):
+        transactions = transactions or []
+        amounts = np.fromiter(
+            (_parse_amount(t.get('amount', 0)) for t in transactions),
+            dtype=np.float64,
+            count=len(transactions),
+        )
+        valid = ~np.isnan(amounts)
+        kept = [t for t, ok in zip(transactions, valid) if ok]
+
+        raw_categories = np.array([str(t.get('category') or 'other').lower() for t in kept], dtype=str)
+        categories, codes = np.unique(raw_categories, return_inverse=True)
+        days = _parse_dates([t.get('date') for t in kept])
+        is_income = np.fromiter((_is_income(t) for t in kept), dtype=bool, count=len(kept))
+
+        return cls(amounts[valid], codes.astype(np.int64), categories.tolist(), days,
+                   len(transactions), np.flatnonzero(valid), is_income)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def subset(self, mask):
+        """Frame restricted to the rows selected by a boolean mask"""
+        return TransactionFrame(
+            self.amounts[mask], self.category_codes[mask], self.categories, self.days[mask],
+            int(np.count_nonzero(mask)), self.row_index[mask], self.is_income[mask],
+        )
+
+    def slice(self, start, stop, raw_start=0, raw_stop=None):
+        """Frame over parsed rows [start, stop) that came from raw rows [raw_start, raw_stop)"""
+        raw_stop = self.row_count if raw_stop is None else raw_stop
+        return TransactionFrame(
+            self.amounts[start:stop], self.category_codes[start:stop], self.categories,
+            self.days[start:stop], int(raw_stop - raw_start), self.row_index[start:stop] - raw_start,
+            self.is_income[start:stop],
+        )
+
+    def spending(self):
+        return self.subset(~self.is_income)
+
+    def spending_count(self):
+        """Rows that are not income; unparseable rows count, as in row_count"""
+        return self.row_count - int(np.count_nonzero(self.is_income))
+
+    def income(self):
+        return self.subset(self.is_income)
+
+    # Totals
+
+    def total(self):
+        return float(self.amounts.sum())
+
+    def _category_arrays(self):
+        size = len(self.categories)
+        totals = np.bincount(self.category_codes, weights=self.amounts, minlength=size)
+        counts = np.bincount(self.category_codes, minlength=size)
+        return totals, counts
+
+    def category_totals(self):
+        """{category: total} for every category present"""
+        totals, counts = self._category_arrays()
+        return {cat: float(total) for cat, total, count in zip(self.categories, totals, counts) if count}
+
+    def category_counts(self):
+        _, counts = self._category_arrays()
+        return {cat: int(count) for cat, count in zip(self.categories, counts) if count}
+
+    def top_categories(self, n=3):
+        """[(category, total)] for the n biggest categories"""
+        totals, counts = self._category_arrays()
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-totals[present], kind='stable')][:n]
+        return [(self.categories[i], float(totals[i])) for i in order]
+
+    def percentiles(self, qs=(50, 90, 95, 99)):
+        if not len(self):
+            return {}
+        values = np.percentile(self.amounts, qs)
+        return {f'p{q}': round(float(v), 2) for q, v in zip(qs, values)}
+
+    # Time series
+
+    def _dated(self):
+        mask = ~np.isnat(self.days)
+        return self.days[mask], self.amounts[mask]
+
+    def daily_series(self):
+        """(days, totals) for each day with dated transactions, in date order"""
+        days, amounts = self._dated()
+        # Only the dates present: a stray 0001-01-01 must not allocate millennia of empty days
+        unique, inverse = np.unique(days, return_inverse=True)
+        return unique, np.bincount(inverse, weights=amounts, minlength=len(unique))
+
+    def daily_totals(self):
+        """{date: total} for days with spending, plus 'unknown' for undated rows"""
+        days, totals = self.daily_series()
+        out = {str(d): float(t) for d, t in zip(days, totals) if t}
+        undated = np.isnat(self.days)
+        if undated.any():
+            out[UNKNOWN_DATE] = float(self.amounts[undated].sum())
+        return out
+
+    def weekly_totals(self):
+        """{week start (Monday): total}"""
+        days, amounts = self._dated()
+        if not len(days):
+            return {}
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        weeks, inverse = np.unique((days.astype(np.int64) + 3) // 7, return_inverse=True)
+        totals = np.bincount(inverse, weights=amounts, minlength=len(weeks))
+        starts = (weeks * 7 - 3).astype('datetime64[D]')
+        return {str(d): float(t) for d, t in zip(starts, totals) if t}
+
+    def rolling_average(self, window=7):
+        """Trailing mean over the last `window` calendar days, at each day with transactions"""
+        days, totals = self.daily_series()
+        if not len(totals):
+            return days, totals
+        cumulative = np.cumsum(np.insert(totals, 0, 0.0))
+        # Days without transactions count as zero; the first days average over what has elapsed
+        lo = np.searchsorted(days, days - (window - 1))
+        elapsed = np.minimum((days - days[0]).astype(np.int64) + 1, window)
+        return days, (cumulative[1:] - cumulative[lo]) / elapsed
+
+    def top_transactions(self, n=5):
+        """Positions in the original transaction list of the n largest transactions"""
+        if not len(self):
+            return []
+        n = min(n, len(self))
+        idx = np.argpartition(-self.amounts, n - 1)[:n]
+        return self.row_index[idx[np.argsort(-self.amounts[idx], kind='stable')]].tolist()
+
+
+def frames_by_user(transaction_sets):
+    """Parse many transaction lists in one pass and return one frame per list"""
+    flat = [t for transactions in transaction_sets for t in transactions]
+    frame = TransactionFrame.from_records(flat)
+    raw_offsets = np.cumsum([0] + [len(transactions) for transactions in transaction_sets])
+    bounds = np.searchsorted(frame.row_index, raw_offsets)
+    return [
+        frame.slice(bounds[i], bounds[i + 1], raw_offsets[i], raw_offsets[i + 1])
+        for i in range(len(transaction_sets))
+    ]
+
+
+def spending_summary(frame, top_n=3, rolling_window=7):
+    """The 'basic_analysis' block returned by the spending endpoints.
+
+    Income rows are left out, as in agents.ledger.stored_summary.
+    """
+    spending = frame.spending()
+    total_spent = spending.total()
+    count = frame.spending_count()
+    _, rolling = spending.rolling_average(rolling_window)
+    return {
+        'total_spent': total_spent,
+        'category_breakdown': spending.category_totals(),
+        'transaction_count': count,
+        'average_transaction': round(total_spent / count, 2) if count else 0,
+        'top_categories': spending.top_categories(top_n),
+        'daily_spending': spending.daily_totals(),
+        'weekly_spending': spending.weekly_totals(),
+        'amount_percentiles': spending.percentiles(),
+        f'rolling_{rolling_window}d_average': round(float(rolling[-1]), 2) if len(rolling) else 0,
+    }
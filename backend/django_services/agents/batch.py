@@ -0,0 +1,146 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from agents.analytics import frames_by_user, spending_summary
+
+# Bulk spending analysis for many users (nightly reports).
+# Basic analysis is computed for a whole chunk of users at once; LLM insights run
+# through a bounded thread pool behind a token-bucket rate limiter, and results are
+# yielded as soon as each user finishes so callers can stream them out. An optional
+# admit() gate is asked before each LLM call; users it turns away get basic analysis.
+
+UNAVAILABLE_INSIGHTS = 'AI analysis temporarily unavailable. Basic analysis provided.'
+THROTTLED_INSIGHTS = 'AI analysis skipped: the LLM rate limit for this client was reached. Basic analysis provided.'
+_THROTTLED = object()
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` acquisitions per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def run_bounded(items, fn, max_workers=8, rate_limiter=None):
+    """Apply fn to items on a thread pool, yielding (item, result) in completion order.
+
+    At most 2 * max_workers items are in flight, so long inputs are never fully buffered.
+    Exceptions from fn are yielded as the result.
+    """
+    def call(item):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return fn(item)
+        except Exception as e:
+            return e
+
+    def submit(pool, item):
+        # Keep the caller's context (metrics endpoint, quota client) in the pool threads
+        return pool.submit(contextvars.copy_context().run, call, item)
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch') as pool:
+        pending = {submit(pool, item): item for item in islice(items, max_workers * 2)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                yield item, future.result()
+                nxt = next(items, None)
+                if nxt is not None:
+                    pending[submit(pool, nxt)] = nxt
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def invalid_user(user):
+    """Why a batch entry can't be analysed, or None when it is well formed"""
+    if not isinstance(user, dict):
+        return 'Each user must be an object with a "transactions" list'
+    transactions = user.get('transactions')
+    if transactions is not None and not isinstance(transactions, list):
+        return '"transactions" must be a list'
+    if any(not isinstance(t, dict) for t in transactions or []):
+        return 'Each transaction must be an object'
+    return None
+
+
+def analyze_spending_batch(users, agent=None, include_ai=True, max_workers=8, rate_per_second=5.0, chunk_size=500,
+                           admit=None):
+    """Yield one result dict per user: {'user_id', 'basic_analysis', 'ai_insights', 'analysis_type'}
+
+    admit(), when given, is called before each LLM call; False skips AI for that user.
+    Malformed entries yield {'user_id', 'success': False, 'error'} instead of failing the batch;
+    entries without a user_id are numbered by their position in the whole input.
+    """
+    limiter = RateLimiter(rate_per_second) if include_ai else None
+    offset = 0
+
+    for chunk in chunked(users, chunk_size):
+        errors = [invalid_user(user) for user in chunk]
+        transaction_sets = [(user.get('transactions') or []) if error is None else []
+                            for user, error in zip(chunk, errors)]
+        frames = frames_by_user(transaction_sets)
+        jobs = []
+
+        for index, (user, frame) in enumerate(zip(chunk, frames)):
+            position = offset + index
+            user_id = user.get('user_id', position) if isinstance(user, dict) else position
+            if errors[index] is not None:
+                yield {'user_id': user_id, 'success': False, 'error': errors[index]}
+                continue
+            if not transaction_sets[index]:
+                yield {'user_id': user_id, 'success': False, 'error': 'No transaction data provided'}
+                continue
+            basic = spending_summary(frame)
+            if not include_ai or agent is None:
+                yield {'user_id': user_id, 'success': True, 'basic_analysis': basic,
+                       'ai_insights': None, 'analysis_type': 'basic_only'}
+                continue
+            jobs.append((user_id, user, frame, basic))
+        offset += len(chunk)
+
+        def insights(job):
+            _, user, frame, _ = job
+            if admit is not None and not admit():
+                return _THROTTLED
+            return agent.analyze_spending_with_ai(user['transactions'], user.get('user_context') or {}, frame=frame)
+
+        for (user_id, _, _, basic), ai_result in run_bounded(jobs, insights, max_workers, limiter):
+            if isinstance(ai_result, dict) and ai_result.get('success'):
+                ai_insights, analysis_type = ai_result['ai_insights'], 'ai_powered'
+            elif ai_result is _THROTTLED:
+                ai_insights, analysis_type = THROTTLED_INSIGHTS, 'basic'
+            else:
+                ai_insights, analysis_type = UNAVAILABLE_INSIGHTS, 'basic'
+            yield {'user_id': user_id, 'success': True, 'basic_analysis': basic,
+                   'ai_insights': ai_insights, 'analysis_type': analysis_type}
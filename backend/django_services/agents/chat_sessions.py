@@ -0,0 +1,140 @@
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+
+from agents.models import ChatSession, ChatTurn
+from agents.prompt_compaction import estimate_tokens
+
+# Server-side chat sessions with an incremental context window.
+# Each upstream request carries the profile, a rolling extractive summary of older
+# turns and only the newest turns verbatim. When a turn no longer fits the verbatim
+# window it is folded into the summary once; the summary is itself trimmed to a budget,
+# so per-turn prompt size stays bounded however long the conversation runs.
+
+HISTORY_TOKEN_BUDGET = int(os.getenv('SESSION_HISTORY_TOKEN_BUDGET', '600'))
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SESSION_SUMMARY_TOKEN_BUDGET', '200'))
+MAX_RECENT_TURNS = int(os.getenv('SESSION_RECENT_TURNS', '4'))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+
+
+def _first_sentence(text, max_words):
+    sentence = _SENTENCE_END.split(' '.join(str(text).split()), 1)[0]
+    words = sentence.split()
+    return ' '.join(words[:max_words]) + ('…' if len(words) > max_words else '')
+
+
+def turn_digest(question, answer):
+    """One summary line for a folded turn"""
+    return f"- Asked: {_first_sentence(question, 20)} | Advised: {_first_sentence(answer, 30)}"
+
+
+def merge_summary(summary, lines, budget=None):
+    """Append digest lines, dropping the oldest lines once over the token budget"""
+    budget = SUMMARY_TOKEN_BUDGET if budget is None else budget
+    merged = [line for line in summary.splitlines() if line] + list(lines)
+    while len(merged) > 1 and estimate_tokens('\n'.join(merged)) > budget:
+        merged.pop(0)
+    return '\n'.join(merged)
+
+
+def split_window(turns, budget=None, max_turns=None):
+    """Split unsummarized turns (oldest first) into (to_fold, recent) for the verbatim window"""
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    max_turns = MAX_RECENT_TURNS if max_turns is None else max_turns
+    used = 0
+    keep = 0
+    for turn in reversed(turns):
+        if keep >= max_turns or (keep and used + turn.tokens > budget):
+            break
+        used += turn.tokens
+        keep += 1
+    cut = len(turns) - keep
+    return turns[:cut], turns[cut:]
+
+
+def create_session(context=None):
+    return ChatSession.objects.create(profile=dict(context or {}))
+
+
+def session_context(session):
+    """(summary, [(question, answer), ...]) to send with the next question"""
+    recent = list(session.turns.filter(index__gte=session.summarized_through).order_by('index'))
+    return session.summary, [(turn.question, turn.answer) for turn in recent]
+
+
+def record_turn(session_id, question, answer, model='', context=None):
+    """Store a completed turn and fold turns that left the verbatim window into the summary"""
+    with transaction.atomic():
+        # Claim the turn index with a write first: it takes the row lock (the write lock
+        # on SQLite, where select_for_update is a no-op and a read-then-write upgrade
+        # fails with "database is locked" instead of waiting)
+        if not ChatSession.objects.filter(pk=session_id).update(turn_count=F('turn_count') + 1):
+            raise ChatSession.DoesNotExist(session_id)
+        session = ChatSession.objects.get(pk=session_id)
+        if context:
+            session.profile = {**session.profile, **context}
+        turn = ChatTurn.objects.create(
+            session=session,
+            index=session.turn_count - 1,
+            question=question,
+            answer=answer,
+            tokens=estimate_tokens(question) + estimate_tokens(answer),
+            model=model[:100],
+        )
+
+        pending = list(session.turns.filter(index__gte=session.summarized_through).order_by('index'))
+        to_fold, _ = split_window(pending)
+        if to_fold:
+            session.summary = merge_summary(session.summary, [turn_digest(t.question, t.answer) for t in to_fold])
+            session.summarized_through = to_fold[-1].index + 1
+        session.save()
+    return session, turn
+
+
+def reply(agent, session, question, context=None):
+    """Answer a question in a session; returns (agent result, stored turn or None).
+
+    Fallback answers are returned but not stored, so they never enter the history.
+    """
+    profile = {**session.profile, **(context or {})}
+    summary, history = session_context(session)
+    result = agent.session_chat(profile, summary, history, question)
+    if not result['success']:
+        return result, None
+    _, turn = record_turn(session.pk, question, result['response'], result.get('model', ''), context)
+    return result, turn
+
+
+async def areply(agent, session, question, context=None):
+    """Async variant of reply"""
+    profile = {**session.profile, **(context or {})}
+    summary, history = await sync_to_async(session_context)(session)
+    result = await agent.asession_chat(profile, summary, history, question)
+    if not result['success']:
+        return result, None
+    _, turn = await sync_to_async(record_turn)(session.pk, question, result['response'],
+                                               result.get('model', ''), context)
+    return result, turn
+
+
+def session_payload(session, turns=None):
+    """Session state for API responses"""
+    payload = {
+        'session_id': str(session.pk),
+        'profile': session.profile,
+        'turn_count': session.turn_count,
+        'summary': session.summary,
+        'created_at': session.created_at.isoformat(),
+        'updated_at': session.updated_at.isoformat(),
+    }
+    if turns is not None:
+        payload['turns'] = [
+            {'index': t.index, 'question': t.question, 'answer': t.answer,
+             'model': t.model, 'created_at': t.created_at.isoformat()}
+            for t in turns
+        ]
+    return payload
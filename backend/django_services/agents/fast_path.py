@@ -0,0 +1,259 @@
+import os
+import re
+import threading
+from collections import namedtuple
+
+from agents.metrics import REGISTRY, counter_lines
+
+# Rule-based fast path for FAQ-style quick chat questions (emergency fund size,
+# how much to save, budget split, "save ₹X in N months"). A keyword classifier
+# picks an intent; when it is confident and the user's numbers are available the
+# answer is rendered from a template in microseconds, otherwise the LLM answers.
+
+FAST_PATH_MODEL = "MoneyMitra Rules"
+
+FastAnswer = namedtuple('FastAnswer', 'intent text confidence')
+
+# Topics the templates don't cover; any of these sends the question to the LLM
+_BLOCKERS = re.compile(
+    r"\b(invest\w*|mutual funds?|sip|stocks?|shares?|loans?|emi|credit cards?|insurance|tax\w*|"
+    r"gold|crypto\w*|fd|fixed deposits?|ppf|nps|debt|borrow\w*)\b"
+)
+
+_WORD = re.compile(r"[\w₹%/]+")
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+_GOAL = re.compile(
+    r"save\s*(?:rs\.?|₹|inr)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<k>k|thousand|lakh|lakhs)?\s*(?:rs|rupees)?\s*"
+    r"(?:in|within|over|by)\s*(?:the\s*next\s*)?(?P<count>\d+)\s*(?P<unit>days?|weeks?|months?|years?)"
+)
+
+# intent -> (anchor patterns: any match gives the base confidence, supporting patterns: +0.15 each)
+_INTENTS = {
+    'emergency_fund': (
+        [r"\bemergency\s+(?:fund|savings?|money|corpus|kitty)\b", r"\brainy\s+day\b"],
+        [r"\bhow\s+(?:much|big)\b", r"\b(?:enough|size|months?)\b", r"\b(?:build|start|keep|need|should)\b"],
+    ),
+    'savings_rate': (
+        [r"\bhow\s+much\s+(?:should|can|must|do)\s+i\s+save\b",
+         r"\b(?:what|which|how\s+much)\s+(?:percent|percentage|%|portion|part|share)\b.*\bsav",
+         r"\bsavings?\s+(?:rate|percentage)\b"],
+        [r"\b(?:income|salary|earn\w*|month\w*)\b", r"\b(?:each|every|per)\b"],
+    ),
+    'budget_split': (
+        [r"\b50\s*/\s*30\s*/\s*20\b", r"\bmonthly\s+budget\b", r"\bbudget\s+(?:plan|split)\b",
+         r"\b(?:split|divide|allocate|distribute)\b.*\b(?:income|salary|earnings|money)\b"],
+        [r"\b(?:how|what|explain)\b", r"\b(?:needs|wants|expenses|rent|salary|income|rule)\b"],
+    ),
+}
+_INTENT_PATTERNS = {
+    intent: ([re.compile(p) for p in anchors], [re.compile(p) for p in support])
+    for intent, (anchors, support) in _INTENTS.items()
+}
+
+_UNIT_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+
+def _amount(value):
+    """Rupee amount from context values like 20000, '₹18,000' or '15000-25000' (range -> midpoint)"""
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    numbers = [float(n.replace(',', '')) for n in _NUMBER.findall(str(value or ''))]
+    numbers = [n for n in numbers if n > 0]
+    if not numbers:
+        return None
+    return sum(numbers[:2]) / len(numbers[:2])
+
+
+def _rupees(value):
+    return f"₹{round(value, -1):,.0f}" if value >= 100 else f"₹{value:,.0f}"
+
+
+def classify(question):
+    """(intent, confidence, goal match) for a question; intent is None when nothing fits"""
+    text = ' '.join(str(question).lower().split())
+    if _BLOCKERS.search(text):
+        return None, 0.0, None
+
+    goal = _GOAL.search(text)
+    if goal:
+        return 'savings_goal', 0.95, goal
+
+    scores = []
+    for intent, (anchors, support) in _INTENT_PATTERNS.items():
+        if any(p.search(text) for p in anchors):
+            score = 0.7 + 0.15 * sum(1 for p in support if p.search(text))
+            scores.append((min(score, 1.0), intent))
+    if not scores:
+        return None, 0.0, None
+    scores.sort(reverse=True)
+    # Two intents equally likely: the question is probably compound, let the LLM handle it
+    if len(scores) > 1 and scores[1][0] >= scores[0][0]:
+        return None, 0.0, None
+    return scores[0][1], scores[0][0], None
+
+
+def _emergency_fund(income, expenses, occupation, goal):
+    if expenses is None and income is None:
+        return None
+    monthly_need = expenses if expenses is not None else income * 0.8
+    monthly_saving = (income or monthly_need) * 0.1
+    months_to_first = max(1, round(monthly_need / monthly_saving))
+    return (
+        f"With irregular income as a {occupation}, aim for an emergency fund of about 6 months of expenses: "
+        f"{_rupees(monthly_need * 6)} ({_rupees(monthly_need)} × 6). "
+        f"Start with a first milestone of one month, {_rupees(monthly_need)}, which takes about "
+        f"{months_to_first} months if you set aside {_rupees(monthly_saving)} (10% of income) each month. "
+        f"Keep it in a separate savings account you don't use for daily UPI spending, "
+        f"and top it up on high-earning days."
+    )
+
+
+def _savings_rate(income, expenses, occupation, goal):
+    if income is None:
+        return None
+    low, high = income * 0.10, income * 0.20
+    text = (f"Try to save 10-20% of what you earn: {_rupees(low)} to {_rupees(high)} a month "
+            f"on {_rupees(income)} income. ")
+    if expenses is not None:
+        surplus = income - expenses
+        if surplus <= 0:
+            text += (f"Right now your expenses ({_rupees(expenses)}) use up your whole income, so start small with "
+                     f"{_rupees(max(income * 0.02, 100))} a month and look for one expense to cut. ")
+        elif surplus < low:
+            text += (f"Your current surplus is {_rupees(surplus)}; save all of it first, then trim expenses "
+                     f"to reach 10%. ")
+        elif surplus < high:
+            text += f"Your surplus of {_rupees(surplus)} covers the 10% end; push towards 20% in good months. "
+        else:
+            text += f"Your surplus of {_rupees(surplus)} covers this comfortably. "
+    text += ("With irregular income, save a fixed share of every payout on the day you receive it, "
+             "rather than waiting for the month end.")
+    return text
+
+
+def _budget_split(income, expenses, occupation, goal):
+    if income is None:
+        return None
+    return (
+        f"A simple 50/30/20 split of {_rupees(income)}: {_rupees(income * 0.5)} for needs (rent, food, fuel, bills), "
+        f"{_rupees(income * 0.3)} for wants, and {_rupees(income * 0.2)} for savings. "
+        f"Since your income varies, plan the budget on a low-earning month and put anything extra "
+        f"from good months straight into savings. "
+        f"Track daily spending in a notebook or UPI app so you can see where the money goes."
+    )
+
+
+def _savings_goal(income, expenses, occupation, goal):
+    amount = float(goal.group('amount').replace(',', ''))
+    multiplier = {'k': 1_000, 'thousand': 1_000, 'lakh': 100_000, 'lakhs': 100_000}.get(goal.group('k') or '', 1)
+    amount *= multiplier
+    count = int(goal.group('count'))
+    days = count * _UNIT_DAYS[goal.group('unit').rstrip('s')]
+    if amount <= 0 or days <= 0:
+        return None
+    months = days / 30
+    text = f"To save {_rupees(amount)} in {count} {goal.group('unit')}, put aside about {_rupees(amount / days * 7)} a week "
+    text += f"({_rupees(amount / days)} a day)"
+    text += f", or {_rupees(amount / months)} a month. " if months >= 1 else ". "
+    if income is not None and months >= 1:
+        share = amount / months / income * 100
+        text += f"That is about {share:.0f}% of your {_rupees(income)} monthly income"
+        text += (", which is achievable. " if share <= 20
+                 else "; that is ambitious, so consider a longer timeline or cutting one regular expense. ")
+    text += "Move the money to a separate account via UPI on each payout day so it isn't spent."
+    return text
+
+
+_TEMPLATES = {
+    'emergency_fund': _emergency_fund,
+    'savings_rate': _savings_rate,
+    'budget_split': _budget_split,
+    'savings_goal': _savings_goal,
+}
+
+
+class FastPath:
+    """Intent classifier plus templated answers, with hit/miss counters"""
+
+    def __init__(self, min_confidence=0.85, max_words=30):
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+        self.hits = {intent: 0 for intent in _TEMPLATES}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, intent=None):
+        with self._lock:
+            if intent is None:
+                self.misses += 1
+            else:
+                self.hits[intent] += 1
+
+    def answer(self, question, context=None):
+        """FastAnswer for a confident, templatable question, else None"""
+        if len(_WORD.findall(str(question))) > self.max_words:
+            self._count()
+            return None
+
+        intent, confidence, goal = classify(question)
+        text = None
+        if intent is not None and confidence >= self.min_confidence:
+            context = context or {}
+            text = _TEMPLATES[intent](
+                _amount(context.get('income')),
+                _amount(context.get('expenses')),
+                context.get('occupation') or 'gig worker',
+                goal,
+            )
+        if text is None:
+            self._count()
+            return None
+        self._count(intent)
+        return FastAnswer(intent, text, confidence)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                'hits': hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / total, 4) if total else 0.0,
+                'by_intent': dict(self.hits),
+            }
+
+
+class DisabledFastPath:
+    def answer(self, question, context=None):
+        return None
+
+    def stats(self):
+        return {'enabled': False}
+
+
+_lock = threading.Lock()
+_fast_path = None
+
+
+def get_fast_path():
+    """Process-wide fast path (FAST_PATH_ENABLED, FAST_PATH_MIN_CONFIDENCE)"""
+    global _fast_path
+    if _fast_path is None:
+        with _lock:
+            if _fast_path is None:
+                if os.getenv('FAST_PATH_ENABLED', 'True').lower() == 'true':
+                    _fast_path = FastPath(min_confidence=float(os.getenv('FAST_PATH_MIN_CONFIDENCE', '0.85')))
+                else:
+                    _fast_path = DisabledFastPath()
+    return _fast_path
+
+
+@REGISTRY.register_collector
+def _fast_path_metrics():
+    if not isinstance(_fast_path, FastPath):
+        return []
+    values = {intent: count for intent, count in _fast_path.hits.items()}
+    values['miss'] = _fast_path.misses
+    return counter_lines('moneymitra_fast_path_total', 'Quick chat questions by fast path outcome (intent or miss).',
+                         values, label='outcome')
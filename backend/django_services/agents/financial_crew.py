@@ -1,247 +1,727 @@
-import openai
 import os
-from dotenv import load_dotenv
 from datetime import datetime
+import asyncio
 import json
+import logging
+import time
+
+import openai
+
+from agents.analytics import TransactionFrame
+from agents.batch import run_bounded
+from agents.fast_path import FAST_PATH_MODEL, get_fast_path
+from agents.forecasting import cash_flow_forecast, forecast_lines, savings_risk_level
+from agents.health import get_backend_health, get_upstream_health
+from agents.llm_client import get_agent
+from agents.metrics import observe_stage, record_error, record_usage, timed_stage
+from agents.prompt_compaction import DEFAULT_TOKEN_BUDGET, transaction_digest
+from agents.prompts import ADVICE_SECTIONS, get_template
+from agents.ratelimit import UpstreamBusy, get_quota
+from agents.resilience import DeadlineExceeded, get_resilience, is_retryable
+from agents.response_cache import get_response_cache
+from agents.router import get_router
+from agents.singleflight import get_single_flight, request_key
+
+logger = logging.getLogger(__name__)
+
+# The model actually called is chosen per request by agents.router; these name
+# the default backend.
+MODEL_NAME = "llama3.1-8b"  # CHANGED FROM llama3.1-70b
+MODEL_DISPLAY_NAME = "Cerebras Llama3.1-8B"  # UPDATED DISPLAY NAME
+
+# Request kinds (metrics labels, routing)
+QUICK_CHAT = "quick_chat"
+FINANCIAL_ADVICE = "get_financial_advice"
+SPENDING_ANALYSIS = "analyze_spending_with_ai"
+ADVICE_SECTION = "advice_section"
+
+# Prompt templates (agents.prompts), variants chosen at startup
+QUICK_CHAT_PROMPT = get_template('quick_chat')
+SESSION_PROMPT = get_template('chat_session')
+ADVICE_PROMPT = get_template('financial_advice')
+SPENDING_PROMPT = get_template('spending_analysis')
+
+# Fanned-out advice: one specialist prompt per section, run concurrently and merged
+# in this order. A section that fails or misses its deadline (LLM_DEADLINE_ADVICE_SECTION)
+# is replaced by its fallback text, so the slowest section bounds the response time.
+ADVICE_FANOUT = os.getenv('ADVICE_FANOUT', 'False').lower() == 'true'
+SECTION_PROMPTS = [(name, title, get_template(f'advice_{name}')) for name, title, _ in ADVICE_SECTIONS]
+SECTION_FALLBACKS = {
+    'health': "Compare your monthly income with your expenses and aim to save at least 10% of what you earn.",
+    'risks': "Irregular income is the main risk: keep 3-6 months of expenses as an emergency fund before investing.",
+    'recommendations': "This week, track every expense; over the next months, save a fixed share of each payout; long term, build an emergency fund and start a small SIP.",
+    'tips': "Use UPI apps to track spending, keep savings in a separate account, and set aside money on high-earning days.",
+}
+
+# Response cache namespace; changes with the quick chat template version or variant
+QUICK_CHAT_TEMPLATE = QUICK_CHAT_PROMPT.key
+
+
+def digest_budget(template, cash_flow):
+    """Transaction digest budget for a template; the cash-flow model already covers income cadence"""
+    budget = template.digest_tokens or DEFAULT_TOKEN_BUDGET
+    return budget // 2 if cash_flow else budget
 
-load_dotenv()
 
 class SimpleFinancialAgent:
-    def __init__(self):
-        # Configure Cerebras OpenAI client
-        self.client = openai.OpenAI(
-            api_key=os.getenv("CEREBRAS_API_KEY"),
-            base_url="https://api.cerebras.ai/v1"
-        )
-        
+    def __init__(self, router=None, cache=None):
+        # Backends (pooled clients) chosen per request kind by latency and health
+        self.router = router or get_router()
+        self.cache = cache or get_response_cache()
+        # Every upstream call feeds the readiness window
+        self.health = get_upstream_health()
+        # Concurrent identical prompts share one upstream call
+        self.flight = get_single_flight()
+        self.coalesce = os.getenv('LLM_SINGLE_FLIGHT', 'True').lower() == 'true'
+        # Deadlines, budgeted retries and hedging around every upstream call
+        self.resilience = get_resilience()
+        # Templated answers for common questions, tried before the cache and the LLM
+        self.fast_path = get_fast_path()
+        # Fair admission (in-flight cap) and token budgets around every upstream call
+        self.quota = get_quota()
+
+    def _complete(self, kind, request):
+        """Run one chat completion, coalescing identical in-flight requests"""
+        if not self.coalesce:
+            return self._complete_upstream(kind, request)
+        return self.flight.do(request_key(request), lambda: self._complete_upstream(kind, request))
+
+    async def _acomplete(self, kind, request):
+        """Async variant of _complete"""
+        if not self.coalesce:
+            return await self._acomplete_upstream(kind, request)
+        return await self.flight.ado(request_key(request), lambda: self._acomplete_upstream(kind, request))
+
+    def _record_upstream(self, kind, backend, start, response=None, error=None):
+        """Feed one upstream outcome into routing, health tracking and metrics"""
+        elapsed = time.perf_counter() - start
+        observe_stage('upstream_total', elapsed)
+        self.router.record(backend, elapsed * 1000, error)
+        # Same classification as the router: a 4xx is the request's fault, not the upstream's
+        ok = error is None or not is_retryable(error)
+        self.health.record(elapsed * 1000, ok, error=error)
+        get_backend_health(backend.name).record(elapsed * 1000, ok, error=error)
+        if error is not None:
+            record_error('upstream', error)
+        elif response is not None:
+            record_usage(kind, backend.model, getattr(response, 'usage', None))
+
+    def _queue_timeout(self, kind):
+        """Longest wait for an upstream slot: the queue timeout, capped by the kind's deadline"""
+        return min(self.quota.limiter.queue_timeout, self.resilience.deadline(kind))
+
+    def _complete_upstream(self, kind, request):
+        """Run one chat completion under the quota and the resilience policy"""
+        # Retries and hedges skip backends this request already tried (failover)
+        tried = set()
+        with self.quota.reserve(request) as reservation:
+            response = self.resilience.call(
+                kind, lambda timeout: self._attempt(kind, request, timeout, tried, reservation))
+            reservation.settle(getattr(response, 'usage', None))
+            return response
+
+    async def _acomplete_upstream(self, kind, request):
+        """Async variant of _complete_upstream"""
+        tried = set()
+        with self.quota.reserve(request) as reservation:
+            response = await self.resilience.acall(
+                kind, lambda timeout: self._aattempt(kind, request, timeout, tried, reservation))
+            reservation.settle(getattr(response, 'usage', None))
+            return response
+
+    def _attempt(self, kind, request, timeout, tried, reservation):
+        """One upstream attempt, holding its own limiter slot, on the backend the router picks"""
+        queued = time.perf_counter()
+        with self.quota.attempt(reservation, min(self.quota.limiter.queue_timeout, timeout)):
+            timeout = max(0.1, timeout - (time.perf_counter() - queued))
+            backend = self.router.choose(kind, exclude=tried)
+            tried.add(backend.name)
+            start = time.perf_counter()
+            try:
+                response = backend.client.chat.completions.create(model=backend.model, timeout=timeout, **request)
+            except Exception as e:
+                self._record_upstream(kind, backend, start, error=e)
+                raise
+            except BaseException:
+                self.router.abandon(backend)
+                raise
+            self._record_upstream(kind, backend, start, response)
+            return response
+
+    async def _aattempt(self, kind, request, timeout, tried, reservation):
+        """Async variant of _attempt"""
+        queued = time.perf_counter()
+        async with self.quota.aattempt(reservation, min(self.quota.limiter.queue_timeout, timeout)):
+            timeout = max(0.1, timeout - (time.perf_counter() - queued))
+            backend = self.router.choose(kind, exclude=tried)
+            tried.add(backend.name)
+            start = time.perf_counter()
+            try:
+                response = await backend.async_client.chat.completions.create(
+                    model=backend.model, timeout=timeout, **request)
+            except Exception as e:
+                self._record_upstream(kind, backend, start, error=e)
+                raise
+            except BaseException:
+                if time.perf_counter() - start >= timeout:
+                    # Cancelled by the hard deadline: the backend didn't answer in time
+                    self._record_upstream(kind, backend, start, error=DeadlineExceeded(
+                        f'{kind} exceeded its {timeout:.2f}s deadline'))
+                else:
+                    # Hedge loser or client gone: no outcome to record
+                    self.router.abandon(backend)
+                raise
+            self._record_upstream(kind, backend, start, response)
+            return response
+
+    def _stream(self, kind, request, route=None):
+        """Yield content deltas of a streamed chat completion.
+
+        Streams are not retried or hedged (tokens may already be on the wire), but
+        they are routed like other calls and respect the kind's deadline per read.
+        The chosen backend is stored in `route['backend']` when a dict is passed.
+        """
+        with self.quota.call(request, self._queue_timeout(kind)) as reservation:
+            backend = self.router.choose(kind)
+            if route is not None:
+                route['backend'] = backend
+            start = time.perf_counter()
+            first_token = True
+            streamed = []
+            try:
+                stream = backend.client.chat.completions.create(
+                    model=backend.model, stream=True, timeout=self.resilience.deadline(kind), **request)
+                try:
+                    for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token:
+                                observe_stage('upstream_first_token', time.perf_counter() - start)
+                                first_token = False
+                            streamed.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    stream.close()
+            except Exception as e:
+                self._record_upstream(kind, backend, start, error=e)
+                raise
+            except BaseException:
+                # Client went away mid-stream
+                self.router.abandon(backend)
+                raise
+            self._record_upstream(kind, backend, start)
+            # Streams carry no usage; estimate the completion from the text
+            reservation.settle(text=''.join(streamed))
+
+    async def _astream(self, kind, request, route=None):
+        """Async variant of _stream"""
+        async with self.quota.acall(request, self._queue_timeout(kind)) as reservation:
+            backend = self.router.choose(kind)
+            if route is not None:
+                route['backend'] = backend
+            start = time.perf_counter()
+            first_token = True
+            streamed = []
+            try:
+                stream = await backend.async_client.chat.completions.create(
+                    model=backend.model, stream=True, timeout=self.resilience.deadline(kind), **request)
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token:
+                                observe_stage('upstream_first_token', time.perf_counter() - start)
+                                first_token = False
+                            streamed.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await stream.close()
+            except Exception as e:
+                self._record_upstream(kind, backend, start, error=e)
+                raise
+            except BaseException:
+                self.router.abandon(backend)
+                raise
+            self._record_upstream(kind, backend, start)
+            reservation.settle(text=''.join(streamed))
+
+    def _quick_chat_context(self, context):
+        """Profile fields the quick chat prompt uses (also the cache context)"""
+        return QUICK_CHAT_PROMPT.coerce(context)
+
+    @timed_stage('prompt_build')
+    def _quick_chat_request(self, question, profile):
+        """Build the quick chat completion request"""
+        return QUICK_CHAT_PROMPT.request([
+            {"role": "user", "content": QUICK_CHAT_PROMPT.render(profile, question=question)}
+        ])
+
+    @timed_stage('prompt_build')
+    def _session_request(self, profile, summary, history, question):
+        """Chat session request: profile and rolling summary, then only the recent turns verbatim"""
+        summary = f"\n\nEarlier in this conversation:\n{summary}" if summary else ''
+        messages = [{"role": "system", "content": SESSION_PROMPT.render(profile, summary=summary)}]
+        for past_question, past_answer in history:
+            messages.append({"role": "user", "content": past_question})
+            messages.append({"role": "assistant", "content": past_answer})
+        messages.append({"role": "user", "content": question})
+        return SESSION_PROMPT.request(messages)
+
+    def _quick_chat_fallback(self, question, error):
+        return {
+            'success': False,
+            'error': str(error),
+            'fallback_response': f"I understand you're asking about: {question}. While I'm experiencing technical issues, here's basic advice: Track your daily earnings and expenses, save 10-15% when possible, and build an emergency fund gradually."
+        }
+
+    def _model_name(self, response):
+        """Display name of the backend model that produced a response"""
+        return self.router.display_name(getattr(response, 'model', None)) or MODEL_DISPLAY_NAME
+
+    def _route_model_name(self, route):
+        """Display name of the backend a stream was routed to (see _stream)"""
+        backend = route.get('backend')
+        return backend.display_name if backend is not None else MODEL_DISPLAY_NAME
+
+    def _cache_model(self):
+        """Response cache namespace: the models quick chat can be routed to"""
+        return '+'.join(sorted({backend.model for backend in self.router.candidates(QUICK_CHAT)}))
+
+    def _cached_result(self, cached):
+        """Quick chat result for a cache entry, naming the model that wrote it"""
+        if isinstance(cached, str):
+            # Entry stored before the model was kept with the text
+            return self._quick_chat_result(cached, cached=True)
+        return self._quick_chat_result(cached['text'], cached=True, model=cached['model'])
+
+    def _quick_chat_result(self, text, cached=False, model=MODEL_DISPLAY_NAME):
+        return {
+            'success': True,
+            'response': text,
+            'model': model,
+            'cached': cached
+        }
+
+    def _fast_path_result(self, question, context):
+        """Quick chat result from the rule-based fast path, or None to fall through"""
+        answer = self.fast_path.answer(question, context)
+        if answer is None:
+            return None
+        result = self._quick_chat_result(answer.text, model=FAST_PATH_MODEL)
+        result['fast_path'] = answer.intent
+        return result
+
     def quick_chat(self, question, context={}):
         """Quick financial advice using Cerebras"""
         try:
-            # Build context string
-            income = context.get('income', 'N/A')
-            expenses = context.get('expenses', 'N/A')
-            occupation = context.get('occupation', 'gig worker')
-            location = context.get('location', 'India')
-        
-            context_prompt = f"""User Profile:
-- Occupation: {occupation}
-- Monthly Income: ₹{income}
-- Monthly Expenses: ₹{expenses}
-- Location: {location}"""
-        
-            system_prompt = """You are MoneyMitra, a friendly AI financial coach specializing in helping Indian gig workers, delivery drivers, auto drivers, and people with irregular income. 
-
-Key Guidelines:
-- Give practical, actionable advice in simple Hindi/English
-- Understand Indian financial tools (UPI, digital wallets, bank accounts)
-- Consider irregular income challenges
-- Be encouraging and supportive
-- Keep responses concise but helpful (3-5 sentences)
-- Include specific amount suggestions when relevant"""
-
-            # Create OpenAI client for this request
-            client = openai.OpenAI(
-                api_key=os.getenv("CEREBRAS_API_KEY"),
-                base_url="https://api.cerebras.ai/v1"
-            )
-
-            response = client.chat.completions.create(
-                model="llama3.1-8b",  # CHANGED FROM llama3.1-70b
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"{context_prompt}\n\nQuestion: {question}"}
-                ],
-                max_tokens=500,
-                temperature=0.1
-            )
-        
-            return {
-                'success': True,
-                'response': response.choices[0].message.content,
-                'model': 'Cerebras Llama3.1-8B'  # UPDATED DISPLAY NAME
-            }
-        
+            fast = self._fast_path_result(question, context)
+            if fast is not None:
+                return fast
+
+            profile = self._quick_chat_context(context)
+            cached = self.cache.get(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile)
+            if cached is not None:
+                return self._cached_result(cached)
+
+            response = self._complete(QUICK_CHAT, self._quick_chat_request(question, profile))
+            text, model = response.choices[0].message.content, self._model_name(response)
+            self.cache.set(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile, {'text': text, 'model': model})
+            return self._quick_chat_result(text, model=model)
+
         except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'fallback_response': f"I understand you're asking about: {question}. While I'm experiencing technical issues, here's basic advice: Track your daily earnings and expenses, save 10-15% when possible, and build an emergency fund gradually."
-            }
+            return self._quick_chat_fallback(question, e)
+
+    async def aquick_chat(self, question, context={}):
+        """Async variant of quick_chat"""
+        try:
+            fast = self._fast_path_result(question, context)
+            if fast is not None:
+                return fast
+
+            profile = self._quick_chat_context(context)
+            cached = await self.cache.aget(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile)
+            if cached is not None:
+                return self._cached_result(cached)
+
+            response = await self._acomplete(QUICK_CHAT, self._quick_chat_request(question, profile))
+            text, model = response.choices[0].message.content, self._model_name(response)
+            await self.cache.aset(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile,
+                                  {'text': text, 'model': model})
+            return self._quick_chat_result(text, model=model)
+
+        except Exception as e:
+            return self._quick_chat_fallback(question, e)
+
+    def stream_quick_chat(self, question, context={}):
+        """Streamed quick chat: yields ('token', text) events, then ('done', result)"""
+        parts = []
+        try:
+            fast = self._fast_path_result(question, context)
+            if fast is not None:
+                yield 'token', fast['response']
+                yield 'done', fast
+                return
+
+            profile = self._quick_chat_context(context)
+            cached = self.cache.get(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile)
+            if cached is not None:
+                result = self._cached_result(cached)
+                yield 'token', result['response']
+                yield 'done', result
+                return
+
+            route = {}
+            for delta in self._stream(QUICK_CHAT, self._quick_chat_request(question, profile), route):
+                parts.append(delta)
+                yield 'token', delta
+
+            text, model = ''.join(parts), self._route_model_name(route)
+            self.cache.set(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile, {'text': text, 'model': model})
+            yield 'done', self._quick_chat_result(text, model=model)
+
+        except Exception as e:
+            yield 'done', self._quick_chat_fallback(question, e)
+
+    async def astream_quick_chat(self, question, context={}):
+        """Async variant of stream_quick_chat"""
+        parts = []
+        try:
+            fast = self._fast_path_result(question, context)
+            if fast is not None:
+                yield 'token', fast['response']
+                yield 'done', fast
+                return
+
+            profile = self._quick_chat_context(context)
+            cached = await self.cache.aget(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile)
+            if cached is not None:
+                result = self._cached_result(cached)
+                yield 'token', result['response']
+                yield 'done', result
+                return
+
+            route = {}
+            async for delta in self._astream(QUICK_CHAT, self._quick_chat_request(question, profile), route):
+                parts.append(delta)
+                yield 'token', delta
+
+            text, model = ''.join(parts), self._route_model_name(route)
+            await self.cache.aset(QUICK_CHAT_TEMPLATE, self._cache_model(), question, profile,
+                                  {'text': text, 'model': model})
+            yield 'done', self._quick_chat_result(text, model=model)
+
+        except Exception as e:
+            yield 'done', self._quick_chat_fallback(question, e)
+
+    def session_chat(self, profile, summary, history, question):
+        """One chat session turn; history is [(question, answer), ...] of recent turns.
+
+        Not cached: the answer depends on the conversation so far.
+        """
+        try:
+            request = self._session_request(self._quick_chat_context(profile), summary, history, question)
+            response = self._complete(QUICK_CHAT, request)
+            return self._quick_chat_result(response.choices[0].message.content, model=self._model_name(response))
+
+        except Exception as e:
+            return self._quick_chat_fallback(question, e)
+
+    async def asession_chat(self, profile, summary, history, question):
+        """Async variant of session_chat"""
+        try:
+            request = self._session_request(self._quick_chat_context(profile), summary, history, question)
+            response = await self._acomplete(QUICK_CHAT, request)
+            return self._quick_chat_result(response.choices[0].message.content, model=self._model_name(response))
+
+        except Exception as e:
+            return self._quick_chat_fallback(question, e)
+
+    def _advice_profile(self, user_data):
+        """Extract the user profile used by the advice prompt"""
+        transactions = user_data.get('recent_transactions', [])
+        if user_data.get('user_id'):
+            # Stored users: forecast from the persisted window (api.views.with_stored_profile)
+            cash_flow = user_data.get('cash_flow')
+        else:
+            cash_flow = cash_flow_forecast(transactions, user_data.get('current_savings'))
+        profile = ADVICE_PROMPT.coerce(user_data)
+        profile['transactions'] = transactions
+        profile['cash_flow'] = cash_flow
+        return profile
+
+    def _advice_slots(self, profile, template):
+        """Cash-flow and transaction blocks of an advice prompt"""
+        cash_flow = forecast_lines(profile['cash_flow'])
+        return {
+            'cash_flow': self._cash_flow_section(cash_flow),
+            'transactions': transaction_digest(profile['transactions'],
+                                               token_budget=digest_budget(template, cash_flow)),
+        }
+
+    @timed_stage('prompt_build')
+    def _advice_request(self, profile):
+        """Build the comprehensive advice completion request"""
+        prompt = ADVICE_PROMPT.render(profile, **self._advice_slots(profile, ADVICE_PROMPT))
+        return ADVICE_PROMPT.request([{"role": "user", "content": prompt}])
+
+    def _advice_result(self, profile, advice, model=MODEL_DISPLAY_NAME, sections=None):
+        result = {
+            'success': True,
+            'advice': advice,
+            'model_used': model,
+            'user_profile': {
+                'occupation': profile['occupation'],
+                'income_pattern': profile['income_pattern'],
+                'risk_level': self._risk_level(profile)
+            },
+            'cash_flow': profile['cash_flow'],
+        }
+        if sections is not None:
+            result['sections'] = sections
+        return result
+
+    def _fanout_requested(self, user_data):
+        """Fan out when the request says so ("fanout"), else per ADVICE_FANOUT"""
+        flag = user_data.get('fanout')
+        if flag is None or flag == '':
+            return ADVICE_FANOUT
+        return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+    @timed_stage('prompt_build')
+    def _section_requests(self, profile):
+        """One completion request per advice section; the sections share one digest"""
+        slots = self._advice_slots(profile, SECTION_PROMPTS[0][2])
+        return [(name, template.request([{"role": "user", "content": template.render(profile, **slots)}]))
+                for name, _, template in SECTION_PROMPTS]
+
+    def _section_outcome(self, start, response=None, error=None):
+        """(response or None, status, elapsed_ms) of one section call"""
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        if error is None:
+            return response, 'ok', elapsed_ms
+        timed_out = isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, UpstreamBusy))
+        return None, 'timeout' if timed_out else 'error', elapsed_ms
+
+    def _run_section(self, item):
+        name, request = item
+        start = time.perf_counter()
+        try:
+            return self._section_outcome(start, self._complete(ADVICE_SECTION, request))
+        except Exception as e:
+            return self._section_outcome(start, error=e)
+
+    async def _arun_section(self, name, request):
+        start = time.perf_counter()
+        try:
+            return self._section_outcome(start, await self._acomplete(ADVICE_SECTION, request))
+        except Exception as e:
+            return self._section_outcome(start, error=e)
+
+    def _merge_sections(self, profile, outcomes):
+        """Advice result from {section: outcome}; raises when no section succeeded"""
+        if not any(status == 'ok' for _, status, _ in outcomes.values()):
+            raise RuntimeError('All advice sections failed')
+        blocks, sections, model = [], {}, MODEL_DISPLAY_NAME
+        for index, (name, title, _) in enumerate(SECTION_PROMPTS, 1):
+            response, status, elapsed_ms = outcomes[name]
+            if response is not None:
+                text = response.choices[0].message.content.strip()
+                model = self._model_name(response)
+            else:
+                text = SECTION_FALLBACKS[name]
+            blocks.append(f"{index}. {title}\n{text}")
+            sections[name] = {'status': status, 'elapsed_ms': elapsed_ms}
+        return self._advice_result(profile, '\n\n'.join(blocks), model, sections)
+
+    def _fanout_advice(self, profile):
+        """Comprehensive advice from concurrent section completions (threads)"""
+        requests = self._section_requests(profile)
+        outcomes = {name: outcome for (name, _), outcome in
+                    run_bounded(requests, self._run_section, max_workers=len(requests))}
+        return self._merge_sections(profile, outcomes)
+
+    async def _afanout_advice(self, profile):
+        """Async variant of _fanout_advice"""
+        requests = self._section_requests(profile)
+        results = await asyncio.gather(*(self._arun_section(name, request) for name, request in requests))
+        return self._merge_sections(profile, {name: outcome for (name, _), outcome in zip(requests, results)})
+
+    def _advice_fallback(self, occupation, error):
+        return {
+            'success': False,
+            'error': str(error),
+            'fallback_advice': f"Financial coaching for {occupation}: Focus on tracking daily earnings, saving 10-15% when possible, and building emergency fund gradually. Consider your irregular income pattern when planning expenses."
+        }
 
     def get_financial_advice(self, user_data):
         """Comprehensive financial analysis using Cerebras"""
+        occupation = user_data.get('occupation', 'gig worker')
+        try:
+            profile = self._advice_profile(user_data)
+            if self._fanout_requested(user_data):
+                return self._fanout_advice(profile)
+            response = self._complete(FINANCIAL_ADVICE, self._advice_request(profile))
+            return self._advice_result(profile, response.choices[0].message.content, self._model_name(response))
+
+        except Exception as e:
+            return self._advice_fallback(occupation, e)
+
+    async def aget_financial_advice(self, user_data):
+        """Async variant of get_financial_advice"""
+        occupation = user_data.get('occupation', 'gig worker')
+        try:
+            profile = self._advice_profile(user_data)
+            if self._fanout_requested(user_data):
+                return await self._afanout_advice(profile)
+            response = await self._acomplete(FINANCIAL_ADVICE, self._advice_request(profile))
+            return self._advice_result(profile, response.choices[0].message.content, self._model_name(response))
+
+        except Exception as e:
+            return self._advice_fallback(occupation, e)
+
+    def stream_financial_advice(self, user_data):
+        """Streamed financial advice: yields ('token', text) events, then ('done', result)"""
+        occupation = user_data.get('occupation', 'gig worker')
+        parts = []
         try:
-            # Extract user data
-            income_pattern = user_data.get('income_pattern', 'irregular')
-            income_range = user_data.get('income_range', '15000-25000')
-            occupation = user_data.get('occupation', 'gig worker')
-            monthly_expenses = user_data.get('monthly_expenses', '15000')
-            current_savings = user_data.get('current_savings', '2000')
-            goals = user_data.get('goals', 'save money')
-            family_size = user_data.get('family_size', '3-4 members')
-            location = user_data.get('location', 'urban India')
-            transactions = user_data.get('recent_transactions', [])
-            
-            # Build comprehensive prompt
-            prompt = f"""As MoneyMitra, provide comprehensive financial coaching for this Indian user:
-
-USER PROFILE:
-- Occupation: {occupation}
-- Income Pattern: {income_pattern}
-- Monthly Income Range: ₹{income_range}
-- Monthly Expenses: ₹{monthly_expenses}
-- Current Savings: ₹{current_savings}
-- Financial Goals: {goals}
-- Family Size: {family_size}
-- Location: {location}
-
-RECENT TRANSACTIONS:
-{json.dumps(transactions, indent=2) if transactions else 'No recent transaction data provided'}
-
-Please provide a detailed analysis covering:
-
-1. FINANCIAL HEALTH ASSESSMENT
-   - Current financial position analysis
-   - Income vs expenses evaluation
-   - Savings rate assessment
-
-2. RISK ANALYSIS
-   - Identify immediate financial risks (next 30 days)
-   - Medium-term concerns (3-6 months)
-   - Emergency fund adequacy
-
-3. PERSONALIZED RECOMMENDATIONS
-   - 3 immediate actions (this week)
-   - 3 short-term strategies (next 3 months)
-   - 2 long-term goals (6+ months)
-
-4. PRACTICAL TIPS
-   - Specific to {occupation} and irregular income
-   - Include Indian financial tools and cultural context
-   - Realistic amount targets based on their income level
-
-Keep advice practical, encouraging, and culturally relevant for Indian users."""
-
-            response = self.client.chat.completions.create(
-                model="llama3.1-8b",  # CHANGED FROM llama3.1-70b
-                messages=[
-                    {"role": "system", "content": "You are MoneyMitra, an expert financial coach for Indian gig workers and people with irregular income. Provide detailed, practical, and culturally relevant financial advice."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.1
-            )
-            
+            profile = self._advice_profile(user_data)
+            route = {}
+            for delta in self._stream(FINANCIAL_ADVICE, self._advice_request(profile), route):
+                parts.append(delta)
+                yield 'token', delta
+
+            yield 'done', self._advice_result(profile, ''.join(parts), self._route_model_name(route))
+
+        except Exception as e:
+            yield 'done', self._advice_fallback(occupation, e)
+
+    async def astream_financial_advice(self, user_data):
+        """Async variant of stream_financial_advice"""
+        occupation = user_data.get('occupation', 'gig worker')
+        parts = []
+        try:
+            profile = self._advice_profile(user_data)
+            route = {}
+            async for delta in self._astream(FINANCIAL_ADVICE, self._advice_request(profile), route):
+                parts.append(delta)
+                yield 'token', delta
+
+            yield 'done', self._advice_result(profile, ''.join(parts), self._route_model_name(route))
+
+        except Exception as e:
+            yield 'done', self._advice_fallback(occupation, e)
+
+    @timed_stage('prompt_build')
+    def _spending_request(self, transactions, user_context, frame=None, summary=None):
+        """Build the spending analysis request and the basic metrics it embeds"""
+        # Calculate basic metrics (reuse the caller's parsed frame when given)
+        frame = frame or TransactionFrame.from_records(transactions)
+        if summary is not None:
+            # Stored aggregates cover more history than the transactions in the digest
+            total_spent = summary['total_spent']
+            categories = summary['category_breakdown']
+            cash_flow = forecast_lines(summary.get('cash_flow'))
+        else:
+            spending = frame.spending()
+            total_spent = spending.total()
+            categories = spending.category_totals()
+            cash_flow = forecast_lines(cash_flow_forecast(frame=frame))
+
+        # Get AI insights
+        prompt = SPENDING_PROMPT.render(
+            SPENDING_PROMPT.coerce(user_context),
+            transactions=transaction_digest(transactions, token_budget=digest_budget(SPENDING_PROMPT, cash_flow),
+                                            frame=frame),
+            cash_flow=self._cash_flow_section(cash_flow),
+            total_spent=total_spent,
+            categories=categories,
+        )
+        request = SPENDING_PROMPT.request([{"role": "user", "content": prompt}])
+        basic_analysis = {
+            'total_spent': total_spent,
+            'categories': categories,
+            'transaction_count': summary['transaction_count'] if summary is not None else frame.spending_count()
+        }
+        return request, basic_analysis
+
+    def analyze_spending_with_ai(self, transactions, user_context={}, frame=None, summary=None):
+        """AI-powered spending analysis"""
+        try:
+            if not transactions:
+                return {'success': False, 'error': 'No transactions provided'}
+
+            request, basic_analysis = self._spending_request(transactions, user_context, frame, summary)
+            response = self._complete(SPENDING_ANALYSIS, request)
+
             return {
                 'success': True,
-                'advice': response.choices[0].message.content,
-                'model_used': 'Cerebras Llama3.1-8B',  # UPDATED DISPLAY NAME
-                'user_profile': {
-                    'occupation': occupation,
-                    'income_pattern': income_pattern,
-                    'risk_level': self._assess_risk_level(current_savings, monthly_expenses)
-                }
+                'ai_insights': response.choices[0].message.content,
+                'basic_analysis': basic_analysis
             }
-            
+
         except Exception as e:
             return {
                 'success': False,
-                'error': str(e),
-                'fallback_advice': f"Financial coaching for {occupation}: Focus on tracking daily earnings, saving 10-15% when possible, and building emergency fund gradually. Consider your irregular income pattern when planning expenses."
+                'error': str(e)
             }
-    
-    def analyze_spending_with_ai(self, transactions, user_context={}):
-        """AI-powered spending analysis"""
+
+    async def aanalyze_spending_with_ai(self, transactions, user_context={}, frame=None, summary=None):
+        """Async variant of analyze_spending_with_ai"""
         try:
             if not transactions:
                 return {'success': False, 'error': 'No transactions provided'}
-            
-            # Calculate basic metrics
-            total_spent = sum(float(t.get('amount', 0)) for t in transactions)
-            categories = {}
-            for t in transactions:
-                cat = t.get('category', 'other').lower()
-                categories[cat] = categories.get(cat, 0) + float(t.get('amount', 0))
-            
-            # Get AI insights
-            prompt = f"""Analyze this spending pattern for an Indian gig worker:
-
-TRANSACTIONS DATA:
-{json.dumps(transactions, indent=2)}
-
-SPENDING SUMMARY:
-- Total Spent: ₹{total_spent}
-- Category Breakdown: {categories}
-
-USER CONTEXT:
-- Occupation: {user_context.get('occupation', 'gig worker')}
-- Monthly Income: ₹{user_context.get('income', 'irregular')}
-
-Provide:
-1. SPENDING INSIGHTS (3-4 key observations)
-2. RISK WARNINGS (if any category is too high)
-3. OPTIMIZATION SUGGESTIONS (2-3 specific recommendations)
-4. MONEY-SAVING TIPS (tailored to their occupation)
-
-Keep response concise and actionable."""
-
-            response = self.client.chat.completions.create(
-                model="llama3.1-8b",  # CHANGED FROM llama3.1-70b
-                messages=[
-                    {"role": "system", "content": "You are MoneyMitra, analyzing spending patterns for Indian gig workers. Provide practical insights and actionable recommendations."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=800,
-                temperature=0.1
-            )
-            
+
+            request, basic_analysis = self._spending_request(transactions, user_context, frame, summary)
+            response = await self._acomplete(SPENDING_ANALYSIS, request)
+
             return {
                 'success': True,
                 'ai_insights': response.choices[0].message.content,
-                'basic_analysis': {
-                    'total_spent': total_spent,
-                    'categories': categories,
-                    'transaction_count': len(transactions)
-                }
+                'basic_analysis': basic_analysis
             }
-            
+
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
-    
+
+    def _cash_flow_section(self, lines):
+        """Prompt section for the income / cash-flow model (empty without a forecast)"""
+        if not lines:
+            return ''
+        return 'INCOME & CASH-FLOW MODEL (from transaction history):\n' + '\n'.join(lines) + '\n\n'
+
+    def _risk_level(self, profile):
+        """Forecast-based risk when there is enough history, else the savings / expenses ratio"""
+        if profile['cash_flow']:
+            return profile['cash_flow']['risk_level']
+        return self._assess_risk_level(profile['current_savings'], profile['monthly_expenses'])
+
     def _assess_risk_level(self, savings, monthly_expenses):
         """Simple risk assessment"""
-        try:
-            savings_ratio = float(savings) / float(monthly_expenses)
-            if savings_ratio < 0.1:
-                return "High Risk"
-            elif savings_ratio < 0.3:
-                return "Medium Risk"
-            else:
-                return "Low Risk"
-        except:
-            return "Unknown"
+        return savings_risk_level(savings, monthly_expenses)
 
 # Test function
 def test_cerebras_connection():
     """Test Cerebras API connection"""
     try:
-        agent = SimpleFinancialAgent()
+        agent = get_agent()
         result = agent.quick_chat(
-            "How can I save money as a delivery driver?", 
+            "How can I save money as a delivery driver?",
             {"income": "20000", "occupation": "delivery driver"}
         )
-        print("✅ Cerebras connection successful!")
+        logger.info("Cerebras connection successful")
         if result.get('success'):
-            print(f"Response: {result.get('response', 'No response content')}")
+            logger.info("Response: %s", result.get('response', 'No response content'))
         else:
-            print(f"Response error: {result.get('error', 'Unknown error')}")
+            logger.warning("Response error: %s", result.get('error', 'Unknown error'))
         return True
-    except Exception as e:
-        print(f"❌ Cerebras connection failed: {e}")
+    except Exception:
+        logger.exception("Cerebras connection failed")
         return False
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     test_cerebras_connection()
@@ -0,0 +1,307 @@
+import math
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from agents.analytics import TransactionFrame, _parse_amount
+from agents.models import CashFlowState, DailyRollup
+
+# Income volatility and cash-flow forecasting for irregular earners.
+# Transactions are folded into a fixed window of daily income / spending totals
+# (CashFlowWindow), which can be kept per user and updated as new transactions
+# arrive. Everything below is computed from those two arrays with NumPy:
+#   - recent daily levels (exponentially weighted, half-life HALF_LIFE_DAYS)
+#   - weekday seasonality factors, shrunk towards 1 while few weeks are observed
+#   - week-to-week income variation (coefficient of variation) and trend
+#   - a HORIZON_DAYS forecast of income, spending and net cash flow with a
+#     10th-percentile band and the probability of running out of savings
+# The result is a few numbers that replace raw transaction detail in prompts.
+# Stored users keep their window in CashFlowState, updated by ledger.ingest.
+
+WINDOW_DAYS = 182
+HORIZON_DAYS = int(os.getenv('FORECAST_HORIZON_DAYS', '30'))
+HALF_LIFE_DAYS = 14.0
+# Less history than this gives no forecast (callers fall back to the savings ratio):
+# a level extrapolated from one or two paydays overstates income several times over
+MIN_DAYS = 28
+MIN_INCOME_DAYS = 4
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+Z_P10 = 1.2816
+
+
+def _weekday(days):
+    """Monday = 0 for datetime64[D] values (1970-01-01 was a Thursday)"""
+    return (days.astype(np.int64) + 3) % 7
+
+
+class CashFlowWindow:
+    """Daily income and spending totals over the last `size` days, updated in place"""
+
+    def __init__(self, size=WINDOW_DAYS, end=None, first=None, income=None, spending=None):
+        self.size = size
+        self.end = end  # last day in the window (datetime64[D]) or None when empty
+        self.first = first  # earliest transaction day ever added
+        self.income = np.zeros(size) if income is None else income
+        self.spending = np.zeros(size) if spending is None else spending
+
+    @classmethod
+    def from_frame(cls, frame, size=WINDOW_DAYS):
+        window = cls(size)
+        window.add(frame.days, frame.amounts, frame.is_income)
+        return window
+
+    def _advance(self, newest):
+        shift = int((newest - self.end).astype(np.int64))
+        if shift >= self.size:
+            self.income[:] = 0.0
+            self.spending[:] = 0.0
+        else:
+            for series in (self.income, self.spending):
+                series[:-shift] = series[shift:]
+                series[-shift:] = 0.0
+        self.end = newest
+
+    def add(self, days, amounts, is_income):
+        """Fold transactions (parallel arrays) into the window; days older than it are dropped"""
+        days = np.asarray(days, dtype='datetime64[D]')
+        dated = ~np.isnat(days)
+        if not dated.any():
+            return self
+        days, amounts, is_income = days[dated], np.asarray(amounts, dtype=float)[dated], np.asarray(is_income)[dated]
+        newest, oldest = days.max(), days.min()
+        if self.end is None:
+            self.end = newest
+        elif newest > self.end:
+            self._advance(newest)
+        self.first = oldest if self.first is None else min(self.first, oldest)
+
+        slots = (days - self.end).astype(np.int64) + self.size - 1
+        inside = slots >= 0
+        self.income += np.bincount(slots[inside & is_income], amounts[inside & is_income], minlength=self.size)
+        self.spending += np.bincount(slots[inside & ~is_income], amounts[inside & ~is_income], minlength=self.size)
+        return self
+
+    def active(self):
+        """(days, income, spending) from the first transaction (or window start) to the end"""
+        if self.end is None:
+            return np.array([], dtype='datetime64[D]'), np.array([]), np.array([])
+        span = min(self.size, int((self.end - self.first).astype(np.int64)) + 1)
+        days = self.end - np.arange(span)[::-1]
+        return days, self.income[-span:], self.spending[-span:]
+
+    def to_dict(self):
+        return {
+            'size': self.size,
+            'end': str(self.end) if self.end is not None else None,
+            'first': str(self.first) if self.first is not None else None,
+            'income': np.round(self.income, 2).tolist(),
+            'spending': np.round(self.spending, 2).tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        end, first = data.get('end'), data.get('first')
+        return cls(
+            data.get('size', WINDOW_DAYS),
+            np.datetime64(end, 'D') if end else None,
+            np.datetime64(first, 'D') if first else None,
+            np.array(data['income'], dtype=float),
+            np.array(data['spending'], dtype=float),
+        )
+
+
+def _weekday_factors(weekdays, values):
+    """Mean per weekday / overall mean, shrunk towards 1 with few observations per weekday"""
+    overall = values.mean()
+    counts = np.bincount(weekdays, minlength=7)
+    if overall <= 0 or counts.min() == 0:
+        return np.ones(7)
+    raw = np.bincount(weekdays, values, minlength=7) / counts / overall
+    weeks = counts.min()
+    return 1.0 + (raw - 1.0) * (weeks / (weeks + 2.0))
+
+
+def _stability(cv):
+    if cv is None:
+        return 'unknown'
+    if cv < 0.25:
+        return 'stable'
+    if cv < 0.6:
+        return 'variable'
+    return 'highly irregular'
+
+
+def savings_risk_level(savings, monthly_expenses):
+    """Risk from the savings / monthly expenses ratio alone (no history to forecast from)"""
+    try:
+        savings_ratio = float(savings) / float(monthly_expenses)
+        if savings_ratio < 0.1:
+            return "High Risk"
+        elif savings_ratio < 0.3:
+            return "Medium Risk"
+        else:
+            return "Low Risk"
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "Unknown"
+
+
+def _risk_level(shortfall_probability, buffer_days, stability):
+    """Same labels as savings_risk_level"""
+    if shortfall_probability > 0.3 or (buffer_days is not None and buffer_days < 7):
+        return 'High Risk'
+    if shortfall_probability > 0.1 or (buffer_days is not None and buffer_days < 30 and stability != 'stable'):
+        return 'Medium Risk'
+    return 'Low Risk'
+
+
+def forecast(window, savings=None, horizon=None):
+    """Volatility, seasonality and cash-flow forecast for a window, or None with too little history
+    (under MIN_DAYS days, or income on fewer than MIN_INCOME_DAYS of them).
+
+    `savings` (a number or numeric string) is the balance the forecast starts from.
+    """
+    horizon = horizon or HORIZON_DAYS
+    days, income, spending = window.active()
+    if len(days) < MIN_DAYS or np.count_nonzero(income > 0) < MIN_INCOME_DAYS:
+        return None
+    weekdays = _weekday(days)
+
+    weights = 0.5 ** (np.arange(len(days))[::-1] / HALF_LIFE_DAYS)
+    weights /= weights.sum()
+    income_level = float(weights @ income)
+    spending_level = float(weights @ spending)
+    income_factors = _weekday_factors(weekdays, income)
+    spending_factors = _weekday_factors(weekdays, spending)
+
+    weeks = len(days) // 7
+    weekly = income[len(days) - weeks * 7:].reshape(weeks, 7).sum(axis=1)
+    cv = float(weekly.std(ddof=1) / weekly.mean()) if weeks >= 2 and weekly.mean() > 0 else None
+    trend = None
+    if len(days) >= 56 and income[-56:-28].sum() > 0:
+        trend = float(income[-28:].sum() / income[-56:-28].sum() - 1.0)
+
+    future = _weekday(window.end + 1 + np.arange(horizon))
+    expected_income = income_level * income_factors[future]
+    expected_spending = spending_level * spending_factors[future]
+    path = np.cumsum(expected_income - expected_spending)
+    net = float(path[-1])
+    spread = float(np.std(income - spending, ddof=1)) * math.sqrt(horizon)
+
+    savings = _parse_amount(savings) if savings not in (None, '') else 0.0
+    savings = savings if math.isfinite(savings) and savings > 0 else 0.0
+    shortfall = 0.5 * math.erfc((savings + net) / (spread * math.sqrt(2))) if spread > 0 else float(savings + net < 0)
+    buffer_days = savings / spending_level if spending_level > 0 and savings > 0 else None
+    best = np.argsort(-income_factors, kind='stable')[:2]
+
+    return {
+        'as_of': str(window.end),
+        'history_days': len(days),
+        'income': {
+            'daily_level': round(income_level, 2),
+            'weekly_cv': round(cv, 3) if cv is not None else None,
+            'stability': _stability(cv),
+            'zero_income_days_pct': round(float((income == 0).mean()) * 100, 1),
+            'trend_pct': round(trend * 100, 1) if trend is not None else None,
+            'best_weekdays': [WEEKDAYS[i] for i in best] if income_factors[best[0]] > 1.1 else [],
+            'weekday_factors': {WEEKDAYS[i]: round(float(f), 2) for i, f in enumerate(income_factors)},
+        },
+        'spending': {
+            'daily_level': round(spending_level, 2),
+            'weekday_factors': {WEEKDAYS[i]: round(float(f), 2) for i, f in enumerate(spending_factors)},
+        },
+        'forecast': {
+            'horizon_days': horizon,
+            'starting_balance': round(savings, 2),
+            'expected_income': round(float(expected_income.sum()), 2),
+            'expected_spending': round(float(expected_spending.sum()), 2),
+            'expected_net': round(net, 2),
+            'net_p10': round(net - Z_P10 * spread, 2),
+            'lowest_balance': round(savings + min(float(path.min()), 0.0), 2),
+            'shortfall_probability': round(shortfall, 3),
+            'buffer_days': round(buffer_days, 1) if buffer_days is not None else None,
+        },
+        'risk_level': _risk_level(shortfall, buffer_days, _stability(cv)),
+    }
+
+
+def cash_flow_forecast(transactions=None, savings=None, frame=None):
+    """Forecast straight from a transaction list (or its parsed frame)"""
+    frame = frame or TransactionFrame.from_records(transactions or [])
+    if not len(frame):
+        return None
+    return forecast(CashFlowWindow.from_frame(frame), savings)
+
+
+def _window_from_rollups(user_id, size=WINDOW_DAYS):
+    """Rebuild a user's window from the daily rollups (users stored before forecasting existed)"""
+    window = CashFlowWindow(size)
+    latest = DailyRollup.objects.filter(user_id=user_id).order_by('-date').values_list('date', flat=True).first()
+    if latest is None:
+        return window
+    rows = list(DailyRollup.objects.filter(user_id=user_id, date__gt=latest - timedelta(days=size))
+                .values_list('date', 'total', 'is_income'))
+    first = DailyRollup.objects.filter(user_id=user_id).order_by('date').values_list('date', flat=True).first()
+    window.add(np.array([row[0] for row in rows], dtype='datetime64[D]'),
+               np.array([float(row[1]) for row in rows]), np.array([row[2] for row in rows], dtype=bool))
+    window.first = np.datetime64(first, 'D')
+    return window
+
+
+def record(user_id, rows):
+    """Fold newly stored Transaction rows into the user's window (inside ledger.ingest's transaction)"""
+    if not rows:
+        return
+    state, created = CashFlowState.objects.select_for_update().get_or_create(user_id=user_id)
+    if created:
+        # The rollups already include this batch
+        window = _window_from_rollups(user_id)
+    else:
+        window = CashFlowWindow.from_dict(state.window).add(
+            np.array([row.date for row in rows], dtype='datetime64[D]'),
+            np.array([float(row.amount) for row in rows]),
+            np.array([row.is_income for row in rows], dtype=bool))
+    state.window = window.to_dict()
+    state.save(update_fields=['window', 'updated_at'])
+
+
+def stored_forecast(user_id, savings=None):
+    """Forecast from the user's stored window, or None without enough stored history"""
+    state = CashFlowState.objects.filter(user_id=user_id).values_list('window', flat=True).first()
+    window = CashFlowWindow.from_dict(state) if state else _window_from_rollups(user_id)
+    return forecast(window, savings)
+
+
+def _rupees(value):
+    return f"₹{value:,.0f}"
+
+
+def forecast_lines(result):
+    """Compact prompt lines for a forecast"""
+    if not result:
+        return []
+    income, spending, ahead = result['income'], result['spending'], result['forecast']
+    line = f"- Income: about {_rupees(income['daily_level'])}/day recently"
+    if income['weekly_cv'] is not None:
+        line += f", week-to-week variation {income['weekly_cv']:.0%} ({income['stability']})"
+    line += f", no income on {income['zero_income_days_pct']:.0f}% of days"
+    if income['best_weekdays']:
+        line += f", best days {' and '.join(income['best_weekdays'])}"
+    if income['trend_pct'] is not None:
+        line += f", {income['trend_pct']:+.0f}% vs the previous 4 weeks"
+    lines = [line, f"- Spending: about {_rupees(spending['daily_level'])}/day"]
+    lines.append(
+        f"- Next {ahead['horizon_days']} days: expected income {_rupees(ahead['expected_income'])}, "
+        f"spending {_rupees(ahead['expected_spending'])}, net {_rupees(ahead['expected_net'])} "
+        f"(1-in-10 chance below {_rupees(ahead['net_p10'])})")
+    if ahead['starting_balance'] > 0:
+        risk = f"- Chance savings run out in that time: {ahead['shortfall_probability']:.0%}"
+    else:
+        risk = f"- Chance spending exceeds income in that time: {ahead['shortfall_probability']:.0%}"
+    if ahead['buffer_days'] is not None:
+        risk += f"; savings cover about {ahead['buffer_days']:.0f} days of spending"
+    lines.append(risk)
+    return lines
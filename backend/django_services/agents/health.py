@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from agents.router import get_router
+
+# Upstream health tracking.
+# Real agent calls record their latency/outcome here (passive), and a background
+# prober periodically hits every routed backend's /models endpoint (no completion
+# tokens). Each backend has its own window next to the combined one; the overall
+# status is ready when every backend is, unavailable when none answers, and degraded
+# in between (e.g. a dead primary with a healthy fallback). Health endpoints only
+# read the cached snapshots, so they never wait on the LLM.
+
+READY = 'ready'
+DEGRADED = 'degraded'
+UNAVAILABLE = 'unavailable'
+UNKNOWN = 'unknown'
+
+
+class UpstreamHealth:
+    """Sliding window of upstream call outcomes"""
+
+    def __init__(self, window_seconds=300, max_samples=1000, degraded_error_rate=0.2, unavailable_error_rate=0.8):
+        self.window_seconds = window_seconds
+        self.degraded_error_rate = degraded_error_rate
+        self.unavailable_error_rate = unavailable_error_rate
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.last_probe_at = None
+        self.last_error = None
+
+    def record(self, latency_ms, ok, error=None, probe=False):
+        now = time.time()
+        with self._lock:
+            self._samples.append((now, latency_ms, ok))
+            if not ok and error is not None:
+                self.last_error = str(error)[:200]
+            if probe:
+                self.last_probe_at = now
+
+    def _window(self):
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def snapshot(self):
+        samples = self._window()
+        if not samples:
+            return {
+                'status': UNKNOWN,
+                'samples': 0,
+                'window_seconds': self.window_seconds,
+                'last_probe_at': None,
+            }
+
+        errors = sum(1 for _, _, ok in samples if not ok)
+        error_rate = errors / len(samples)
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+
+        if error_rate >= self.unavailable_error_rate:
+            state = UNAVAILABLE
+        elif error_rate >= self.degraded_error_rate:
+            state = DEGRADED
+        else:
+            state = READY
+
+        return {
+            'status': state,
+            'samples': len(samples),
+            'window_seconds': self.window_seconds,
+            'error_rate': round(error_rate, 4),
+            'p50_latency_ms': round(latencies[len(latencies) // 2], 2) if latencies else None,
+            'p95_latency_ms': round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+            'last_error': self.last_error if errors else None,
+            'last_probe_at': datetime.fromtimestamp(self.last_probe_at).isoformat() if self.last_probe_at else None,
+        }
+
+
+def combined_status(statuses):
+    """Overall status from per-backend statuses"""
+    known = [s for s in statuses if s != UNKNOWN]
+    if not known:
+        return UNKNOWN
+    if all(s == READY for s in known):
+        return READY
+    if all(s == UNAVAILABLE for s in known):
+        return UNAVAILABLE
+    return DEGRADED
+
+
+class UpstreamProber(threading.Thread):
+    """Daemon thread that probes every routed backend every `interval` seconds"""
+
+    def __init__(self, health, interval=30.0, timeout=5.0, router=None):
+        super().__init__(name='upstream-prober', daemon=True)
+        self.health = health
+        self.interval = interval
+        self.timeout = timeout
+        self.router = router
+        self._stop_event = threading.Event()
+
+    def probe(self):
+        for backend in (self.router or get_router()).backends:
+            start = time.perf_counter()
+            try:
+                backend.client.with_options(max_retries=0).models.list(timeout=self.timeout)
+                ok, error = True, None
+            except Exception as e:
+                ok, error = False, e
+            latency_ms = (time.perf_counter() - start) * 1000
+            get_backend_health(backend.name).record(latency_ms, ok, error=error, probe=True)
+            self.health.record(latency_ms, ok, error=error, probe=True)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.probe()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+WINDOW_SECONDS = int(os.getenv('HEALTH_WINDOW_SECONDS', '300'))
+
+_lock = threading.Lock()
+_health = UpstreamHealth(window_seconds=WINDOW_SECONDS)
+_backend_health = {}
+_prober = None
+
+
+def get_upstream_health():
+    """Process-wide upstream health tracker (all backends)"""
+    return _health
+
+
+def get_backend_health(name):
+    """Process-wide health tracker for one routed backend"""
+    health = _backend_health.get(name)
+    if health is None:
+        with _lock:
+            health = _backend_health.setdefault(name, UpstreamHealth(window_seconds=WINDOW_SECONDS))
+    return health
+
+
+def upstream_status(router=None):
+    """Combined snapshot with one snapshot per backend; the status comes from the backends"""
+    snapshot = _health.snapshot()
+    backends = {b.name: get_backend_health(b.name).snapshot() for b in (router or get_router()).backends}
+    snapshot['status'] = combined_status(s['status'] for s in backends.values())
+    snapshot['backends'] = backends
+    return snapshot
+
+
+def ensure_prober_started():
+    """Start the background prober once per process (no-op when disabled)"""
+    global _prober
+    if _prober is not None or os.getenv('HEALTH_PROBE_ENABLED', 'True').lower() != 'true':
+        return _prober
+    with _lock:
+        if _prober is None:
+            _prober = UpstreamProber(
+                _health,
+                interval=float(os.getenv('HEALTH_PROBE_INTERVAL', '30')),
+                timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT', '5')),
+            )
+            _prober.start()
+    return _prober
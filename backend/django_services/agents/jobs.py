@@ -0,0 +1,262 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from agents.metrics import REGISTRY, Counter, Histogram
+from agents.models import AdviceJob
+from agents.ratelimit import INTERNAL_CLIENT, current_client
+
+# Background jobs for comprehensive financial advice.
+# Submitting stores an AdviceJob row and returns at once; a pool of worker threads
+# (inside each gunicorn worker, or a separate `manage.py run_advice_jobs` process)
+# claims queued rows with a conditional UPDATE, runs the agent call and stores the
+# result. The database is the only coordination point, so any number of pools can
+# share the queue without a broker. Running jobs hold a lease; if a worker dies the
+# lease runs out and the job is queued again (up to ADVICE_JOB_MAX_ATTEMPTS).
+
+QUEUE_TIMEOUT = int(os.getenv('ADVICE_JOB_QUEUE_TIMEOUT', '300'))  # seconds a job may wait to start
+RESULT_TTL = int(os.getenv('ADVICE_JOB_TTL', '3600'))  # seconds finished jobs are kept
+LEASE_SECONDS = int(os.getenv('ADVICE_JOB_LEASE', '120'))
+MAX_ATTEMPTS = int(os.getenv('ADVICE_JOB_MAX_ATTEMPTS', '2'))
+MAX_QUEUED = int(os.getenv('ADVICE_JOB_MAX_QUEUED', '500'))
+MAX_WAIT = 30.0  # longest long-poll a client may ask for
+
+JOBS = REGISTRY.register(Counter(
+    'moneymitra_advice_jobs_total', 'Advice jobs by event (submitted, succeeded, failed, expired, ...).', ('event',)))
+JOB_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    'moneymitra_advice_job_queue_seconds', 'Time advice jobs waited in the queue before a worker started them.'))
+JOB_RUN_SECONDS = REGISTRY.register(Histogram(
+    'moneymitra_advice_job_run_seconds', 'Time workers spent running advice jobs.'))
+
+
+class QueueFull(Exception):
+    pass
+
+
+def submit(user_data):
+    """Queue an advice request; raises QueueFull when too many jobs are waiting"""
+    if AdviceJob.objects.filter(status=AdviceJob.QUEUED).count() >= MAX_QUEUED:
+        JOBS.inc(event='rejected')
+        raise QueueFull(f'Too many queued advice jobs (max {MAX_QUEUED})')
+    job = AdviceJob.objects.create(
+        request=dict(user_data),
+        client=current_client.get(),
+        expires_at=timezone.now() + timedelta(seconds=QUEUE_TIMEOUT),
+    )
+    JOBS.inc(event='submitted')
+    pool = ensure_workers_started()
+    if pool is not None:
+        pool.wake()
+    return job
+
+
+def claim(worker_id):
+    """Take the oldest queued job for this worker, or None when there is nothing to do"""
+    now = timezone.now()
+    candidates = (AdviceJob.objects.filter(status=AdviceJob.QUEUED, expires_at__gt=now)
+                  .order_by('created_at').values_list('pk', flat=True)[:5])
+    for job_id in list(candidates):
+        # Conditional update: exactly one worker wins each job
+        claimed = AdviceJob.objects.filter(pk=job_id, status=AdviceJob.QUEUED).update(
+            status=AdviceJob.RUNNING,
+            worker=worker_id,
+            started_at=now,
+            lease_until=now + timedelta(seconds=LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job = AdviceJob.objects.get(pk=job_id)
+            JOB_QUEUE_SECONDS.observe((now - job.created_at).total_seconds())
+            return job
+    return None
+
+
+def finish(job, result=None, error=None):
+    """Store the outcome unless the job was taken away from this worker meanwhile"""
+    now = timezone.now()
+    status = AdviceJob.FAILED if error else AdviceJob.SUCCEEDED
+    updated = AdviceJob.objects.filter(pk=job.pk, status=AdviceJob.RUNNING, worker=job.worker).update(
+        status=status,
+        result=result,
+        error=error or '',
+        finished_at=now,
+        lease_until=None,
+        expires_at=now + timedelta(seconds=RESULT_TTL),
+    )
+    if updated:
+        JOBS.inc(event=status)
+    return bool(updated)
+
+
+def run_job(job):
+    """Run one claimed job through the agent (fallback answers count as results)"""
+    from agents.llm_client import get_agent
+
+    start = time.perf_counter()
+    token = current_client.set(job.client or INTERNAL_CLIENT)
+    try:
+        result = get_agent().get_financial_advice(job.request)
+    except Exception as e:
+        finish(job, error=str(e))
+    else:
+        finish(job, result=result)
+    finally:
+        current_client.reset(token)
+        JOB_RUN_SECONDS.observe(time.perf_counter() - start)
+
+
+def cancel(job_id):
+    """Cancel a job that has not started; True if it was cancelled"""
+    now = timezone.now()
+    cancelled = AdviceJob.objects.filter(pk=job_id, status=AdviceJob.QUEUED).update(
+        status=AdviceJob.CANCELLED, finished_at=now, expires_at=now + timedelta(seconds=RESULT_TTL))
+    if cancelled:
+        JOBS.inc(event=AdviceJob.CANCELLED)
+    return bool(cancelled)
+
+
+def maintain():
+    """Expire jobs queued too long, recover jobs from dead workers, purge old rows"""
+    now = timezone.now()
+    kept_until = now + timedelta(seconds=RESULT_TTL)
+
+    expired = AdviceJob.objects.filter(status=AdviceJob.QUEUED, expires_at__lte=now).update(
+        status=AdviceJob.EXPIRED, finished_at=now, expires_at=kept_until,
+        error='Not started before the queue timeout')
+    if expired:
+        JOBS.inc(expired, event=AdviceJob.EXPIRED)
+
+    lost = AdviceJob.objects.filter(status=AdviceJob.RUNNING, lease_until__lt=now)
+    requeued = lost.filter(attempts__lt=MAX_ATTEMPTS).update(
+        status=AdviceJob.QUEUED, worker='', lease_until=None,
+        expires_at=now + timedelta(seconds=QUEUE_TIMEOUT))
+    if requeued:
+        JOBS.inc(requeued, event='requeued')
+    failed = lost.update(
+        status=AdviceJob.FAILED, finished_at=now, lease_until=None, expires_at=kept_until,
+        error='Worker stopped while running the job')
+    if failed:
+        JOBS.inc(failed, event=AdviceJob.FAILED)
+
+    AdviceJob.objects.filter(status__in=AdviceJob.FINISHED, expires_at__lte=now).delete()
+
+
+def queue_stats():
+    counts = dict.fromkeys((AdviceJob.QUEUED, AdviceJob.RUNNING), 0)
+    for status in counts:
+        counts[status] = AdviceJob.objects.filter(status=status).count()
+    counts['local_workers'] = _pool.concurrency if _pool is not None else 0
+    return counts
+
+
+async def await_job(job_id, timeout, interval=0.25):
+    """Long-poll: the job once finished or after `timeout` seconds (None if it doesn't exist).
+
+    Async only: waiting holds no thread. The sync view answers at once instead of
+    tying up one of the few WSGI worker threads.
+    """
+    deadline = time.monotonic() + min(max(timeout, 0), MAX_WAIT)
+    while True:
+        job = await AdviceJob.objects.filter(pk=job_id).afirst()
+        remaining = deadline - time.monotonic()
+        if job is None or job.status in AdviceJob.FINISHED or remaining <= 0:
+            return job
+        await asyncio.sleep(min(interval, remaining))
+
+
+class JobWorkerPool:
+    """Threads that claim and run queued advice jobs; several pools can share one queue"""
+
+    def __init__(self, concurrency=2, poll_interval=2.0, maintenance_interval=30.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.maintenance_interval = maintenance_interval
+        self.worker_prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._threads = []
+        self._maintenance_lock = threading.Lock()
+        self._last_maintenance = 0.0
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, args=(f'{self.worker_prefix}:{i}',),
+                                      name=f'advice-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wake(self):
+        self._wake_event.set()
+
+    def _maybe_maintain(self):
+        now = time.monotonic()
+        if now - self._last_maintenance < self.maintenance_interval:
+            return
+        if not self._maintenance_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_maintenance = now
+            maintain()
+        finally:
+            self._maintenance_lock.release()
+
+    def _run(self, worker_id):
+        try:
+            while not self._stop_event.is_set():
+                job = None
+                try:
+                    close_old_connections()
+                    self._maybe_maintain()
+                    job = claim(worker_id)
+                    if job is not None:
+                        run_job(job)
+                except Exception:
+                    # Database hiccup: back off for a poll interval and try again
+                    job = None
+                if job is None:
+                    self._wake_event.wait(self.poll_interval)
+                    self._wake_event.clear()
+        finally:
+            connection.close()
+
+    def stop(self, timeout=5.0):
+        """Stop claiming; running jobs left unfinished are recovered through their lease"""
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+_lock = threading.Lock()
+_pool = None
+
+
+def ensure_workers_started():
+    """Start this process's worker pool once (ADVICE_JOB_WORKERS, 0 = leave jobs to run_advice_jobs)"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    concurrency = int(os.getenv('ADVICE_JOB_WORKERS', '2'))
+    if concurrency <= 0:
+        return None
+    with _lock:
+        if _pool is None:
+            _pool = JobWorkerPool(concurrency, poll_interval=float(os.getenv('ADVICE_JOB_POLL_INTERVAL', '2'))).start()
+    return _pool
+
+
+def stop_workers():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
@@ -0,0 +1,264 @@
+import hashlib
+import hmac
+import math
+import os
+import secrets
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from agents import forecasting
+from agents.analytics import TransactionFrame, _is_income, _parse_amount, spending_summary
+from agents.models import CategoryRollup, DailyRollup, LedgerKey, MonthlyRollup, Transaction
+
+# Per-user transaction store.
+# Ingested transactions are persisted once and folded into daily, monthly and
+# all-time category rollups in the same database transaction, so an analysis reads
+# a bounded number of rollup rows (window days x categories) and the latest
+# transactions instead of the caller resending and re-aggregating full history.
+# The same transaction also advances the user's cash-flow window (agents.forecasting).
+#
+# Stored data is only readable with the user's access key (X-User-Key header). The
+# first write for an unused user id claims it and returns the key once; keys are kept
+# hashed. `manage.py ledger_key <user_id>` issues a new key (lost keys, or data stored
+# by the import command).
+
+ANALYSIS_DAYS = int(os.getenv('LEDGER_ANALYSIS_DAYS', '90'))
+# Latest transactions loaded for the prompt digest and amount percentiles
+RECENT_TRANSACTIONS = int(os.getenv('LEDGER_RECENT_TRANSACTIONS', '200'))
+MONTHS_SHOWN = 12
+
+
+def _hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_key(user_id):
+    """New access key for a user, replacing any previous one"""
+    key = secrets.token_urlsafe(24)
+    LedgerKey.objects.update_or_create(user_id=user_id, defaults={'key_hash': _hash_key(key)})
+    return key
+
+
+def claim(user_id):
+    """Access key for a user id nobody owns yet (no key, no stored data), else None"""
+    if LedgerKey.objects.filter(user_id=user_id).exists() or Transaction.objects.filter(user_id=user_id).exists():
+        return None
+    key = secrets.token_urlsafe(24)
+    try:
+        with transaction.atomic():
+            LedgerKey.objects.create(user_id=user_id, key_hash=_hash_key(key))
+    except IntegrityError:
+        # Claimed concurrently
+        return None
+    return key
+
+
+def owns(user_id, key):
+    """True when `key` is the user's access key"""
+    if not key:
+        return False
+    stored = LedgerKey.objects.filter(user_id=user_id).values_list('key_hash', flat=True).first()
+    return stored is not None and hmac.compare_digest(stored, _hash_key(str(key)))
+
+
+def _parse_date(value, today):
+    """date for an ISO date string; today when missing, None when unparseable"""
+    if value in (None, ''):
+        return today
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def parse_records(user_id, records, today=None):
+    """(unsaved Transaction rows, rejected count) for request transaction dicts"""
+    today = today or timezone.localdate()
+    rows, rejected = [], 0
+    for record in records:
+        if not isinstance(record, dict):
+            rejected += 1
+            continue
+        amount = _parse_amount(record.get('amount'))
+        day = _parse_date(record.get('date'), today)
+        if math.isnan(amount) or math.isinf(amount) or day is None:
+            rejected += 1
+            continue
+        rows.append(Transaction(
+            user_id=user_id,
+            date=day,
+            category=str(record.get('category') or 'other').lower()[:50],
+            amount=Decimal(str(round(amount, 2))),
+            is_income=_is_income(record),
+            description=str(record.get('description') or '')[:255],
+            external_id=str(record.get('id') or '')[:100],
+        ))
+    return rows, rejected
+
+
+def _drop_duplicates(user_id, rows):
+    """Rows whose external id is new for the user (and first in the batch)"""
+    ids = {row.external_id for row in rows if row.external_id}
+    seen = set()
+    if ids:
+        # exclude() repeats the partial index condition so the unique index is used
+        seen = set(Transaction.objects.filter(user_id=user_id, external_id__in=ids).exclude(external_id='')
+                   .order_by().values_list('external_id', flat=True))
+    fresh = []
+    for row in rows:
+        if row.external_id:
+            if row.external_id in seen:
+                continue
+            seen.add(row.external_id)
+        fresh.append(row)
+    return fresh
+
+
+# rollup model -> the field that varies besides category / is_income
+ROLLUP_PERIODS = ((DailyRollup, 'date'), (MonthlyRollup, 'month'), (CategoryRollup, None))
+
+
+def _rollup_deltas(rows):
+    """{model: {(period, category, is_income): [total, count]}} for a batch of rows"""
+    deltas = {model: defaultdict(lambda: [Decimal(0), 0]) for model, _ in ROLLUP_PERIODS}
+    for row in rows:
+        for model, period in ((DailyRollup, row.date), (MonthlyRollup, row.date.replace(day=1)),
+                              (CategoryRollup, None)):
+            delta = deltas[model][period, row.category, row.is_income]
+            delta[0] += row.amount
+            delta[1] += 1
+    return deltas
+
+
+def _apply_rollups(user_id, rows):
+    """Add a batch to the rollups with one locking read, one bulk UPDATE and one bulk INSERT per model"""
+    all_deltas = _rollup_deltas(rows)
+    for model, field in ROLLUP_PERIODS:
+        deltas = all_deltas[model]
+        if not deltas:
+            continue
+        existing = model.objects.select_for_update().filter(user_id=user_id)
+        if field:
+            existing = existing.filter(**{f'{field}__in': {key[0] for key in deltas}})
+        changed = []
+        for rollup in existing:
+            key = (getattr(rollup, field) if field else None, rollup.category, rollup.is_income)
+            delta = deltas.pop(key, None)
+            if delta:
+                rollup.total += delta[0]
+                rollup.count += delta[1]
+                changed.append(rollup)
+        model.objects.bulk_update(changed, ['total', 'count'], batch_size=500)
+        model.objects.bulk_create([
+            model(user_id=user_id, category=category, is_income=is_income, total=total, count=count,
+                  **({field: period} if field else {}))
+            for (period, category, is_income), (total, count) in deltas.items()
+        ], batch_size=500)
+
+
+def ingest(user_id, records, attempts=2):
+    """Store transactions for a user and update the rollups.
+
+    Returns {'ingested', 'duplicates', 'rejected'}. A concurrent ingest that creates
+    the same rollup key or external id first makes ours retry once.
+    """
+    for attempt in range(attempts):
+        rows, rejected = parse_records(user_id, records)
+        fresh = _drop_duplicates(user_id, rows)
+        try:
+            with transaction.atomic():
+                # Insert before reading anything so SQLite takes the write lock up front
+                Transaction.objects.bulk_create(fresh, batch_size=500)
+                _apply_rollups(user_id, fresh)
+                forecasting.record(user_id, fresh)
+            break
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+    return {'ingested': len(fresh), 'duplicates': len(rows) - len(fresh), 'rejected': rejected}
+
+
+def as_record(row):
+    """Stored transaction in the request payload shape"""
+    record = {
+        'amount': float(row.amount),
+        'category': row.category,
+        'date': row.date.isoformat(),
+        'description': row.description,
+        'type': 'income' if row.is_income else 'expense',
+    }
+    if row.external_id:
+        record['id'] = row.external_id
+    return record
+
+
+def recent_transactions(user_id, limit=None):
+    """The user's latest transactions as request-shaped dicts, newest first"""
+    limit = RECENT_TRANSACTIONS if limit is None else limit
+    return [as_record(row) for row in Transaction.objects.filter(user_id=user_id).order_by('-date', '-id')[:limit]]
+
+
+def _monthly_spending(user_id, months):
+    """[{'month', 'spent'}] for the latest `months` months with spending, newest first"""
+    return list(MonthlyRollup.objects.filter(user_id=user_id, is_income=False)
+                .values('month').annotate(spent=Sum('total')).order_by('-month')[:months])
+
+
+def average_monthly_spending(user_id, months=3):
+    """Mean spending over the user's latest `months` months with data, or None"""
+    totals = _monthly_spending(user_id, months)
+    if not totals:
+        return None
+    return float(sum(row['spent'] for row in totals)) / len(totals)
+
+
+def stored_summary(user_id, days=None):
+    """(basic analysis, recent transactions) from the rollups, or None if the user has no data.
+
+    The analysis has the same shape as agents.analytics.spending_summary over the
+    spending (not income) of the last `days` days with data, plus monthly and all-time
+    spending totals; amount percentiles are taken over the latest spending
+    transactions, and the cash-flow forecast.
+    """
+    days = days or ANALYSIS_DAYS
+    latest = DailyRollup.objects.filter(user_id=user_id).aggregate(latest=Max('date'))['latest']
+    if latest is None:
+        return None
+    start = latest - timedelta(days=days - 1)
+
+    daily = list(DailyRollup.objects.filter(user_id=user_id, date__gte=start, is_income=False)
+                 .values_list('date', 'category', 'total', 'count'))
+    # One pseudo-transaction per (day, category) rollup gives the same totals and series
+    frame = TransactionFrame.from_records(
+        [{'amount': float(total), 'category': category, 'date': day.isoformat()} for day, category, total, _ in daily])
+    summary = spending_summary(frame)
+    count = sum(row[3] for row in daily)
+    summary['transaction_count'] = count
+    summary['average_transaction'] = round(summary['total_spent'] / count, 2) if count else 0
+
+    recent = recent_transactions(user_id)
+    in_window = [t for t in recent if t['date'] >= start.isoformat() and t['type'] != 'income']
+    summary['amount_percentiles'] = TransactionFrame.from_records(in_window).percentiles()
+
+    summary['monthly_spending'] = {row['month'].isoformat()[:7]: float(row['spent'])
+                                   for row in reversed(_monthly_spending(user_id, MONTHS_SHOWN))}
+
+    categories = {}
+    all_count = 0
+    spending = CategoryRollup.objects.filter(user_id=user_id, is_income=False)
+    for category, total, n in spending.values_list('category', 'total', 'count'):
+        categories[category] = categories.get(category, 0.0) + float(total)
+        all_count += n
+    summary['all_time'] = {
+        'total': round(sum(categories.values()), 2),
+        'transaction_count': all_count,
+        'category_breakdown': categories,
+    }
+    summary['window'] = {'start': start.isoformat(), 'end': latest.isoformat(), 'days': days}
+    summary['cash_flow'] = forecasting.stored_forecast(user_id)
+    return summary, recent
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+from agents.metrics import observe_stage
+
+# Process-wide registry of LLM clients and agents.
+# Every gunicorn worker builds one pooled HTTP transport per upstream and reuses
+# it for all requests, so keep-alive connections to Cerebras survive between calls.
+# The SDK (openai, httpx) and the agent are imported on first use, not at startup:
+# they are most of a worker's import time. LLM_PRELOAD warms them up in the background
+# once the worker is serving (see preload_agent).
+
+DEFAULT_BASE_URL = "https://api.cerebras.ai/v1"
+
+_lock = threading.RLock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_agent = None
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def pool_limits():
+    """Connection pool limits for one worker process"""
+    import httpx
+
+    max_connections = _env_int("LLM_MAX_CONNECTIONS", 20)
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=_env_int("LLM_MAX_KEEPALIVE", max_connections),
+        keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def default_timeout():
+    """Default upstream timeout (seconds) for the shared transport"""
+    import httpx
+
+    return httpx.Timeout(
+        _env_float("LLM_TIMEOUT", 30.0),
+        connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+    )
+
+
+# httpx event hooks: the response hook fires once headers arrive, which gives the
+# upstream time-to-first-byte separately from the full completion time.
+_START = 'moneymitra_start'
+
+
+def _mark_start(request):
+    request.extensions[_START] = time.perf_counter()
+
+
+def _record_ttfb(response):
+    start = response.request.extensions.get(_START)
+    if start is not None and response.request.url.path.endswith('/chat/completions'):
+        observe_stage('upstream_ttfb', time.perf_counter() - start)
+
+
+async def _amark_start(request):
+    _mark_start(request)
+
+
+async def _arecord_ttfb(response):
+    _record_ttfb(response)
+
+
+def get_client(base_url=None, api_key=None):
+    """Return the shared OpenAI-compatible client for an upstream (thread-safe)"""
+    base_url = base_url or os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL)
+    api_key = api_key or os.getenv("CEREBRAS_API_KEY")
+    key = (base_url, api_key)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            import openai
+
+            http_client = httpx.Client(
+                limits=pool_limits(),
+                timeout=default_timeout(),
+                event_hooks={'request': [_mark_start], 'response': [_record_ttfb]},
+            )
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                # Retries are budgeted by agents.resilience, not by the SDK
+                max_retries=0,
+            )
+            _clients[key] = client
+    return client
+
+
+def get_async_client(base_url=None, api_key=None):
+    """Return the shared async client for an upstream on the running event loop"""
+    base_url = base_url or os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL)
+    api_key = api_key or os.getenv("CEREBRAS_API_KEY")
+    key = (base_url, api_key)
+
+    # httpx async pools are bound to the loop that opened them, so each loop
+    # (one per uvicorn worker, or one per async_to_sync call under WSGI) gets its own.
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            import httpx
+            import openai
+
+            http_client = httpx.AsyncClient(
+                limits=pool_limits(),
+                timeout=default_timeout(),
+                event_hooks={'request': [_amark_start], 'response': [_arecord_ttfb]},
+            )
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=0,
+            )
+            loop_clients[key] = client
+    return client
+
+
+def get_agent():
+    """Return the process-wide SimpleFinancialAgent"""
+    global _agent
+    if _agent is not None:
+        return _agent
+
+    with _lock:
+        if _agent is None:
+            from agents.financial_crew import SimpleFinancialAgent
+            _agent = SimpleFinancialAgent()
+    return _agent
+
+
+def preload_agent():
+    """Build the agent and its clients on a background thread (LLM_PRELOAD), so the
+    worker starts serving at once and the first LLM request doesn't pay the imports"""
+    if os.getenv("LLM_PRELOAD", "True").lower() != "true" or _agent is not None:
+        return None
+
+    def warm():
+        try:
+            for backend in get_agent().router.backends:
+                backend.client
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=warm, name='llm-preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def close_clients():
+    """Close all pooled transports (used on worker shutdown and in tests)"""
+    global _agent
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
+        _async_clients.clear()
+        _agent = None
@@ -0,0 +1,177 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# In-process metrics with Prometheus text exposition.
+# Each gunicorn worker keeps its own registry; scrape every worker (or run one worker
+# per container) to see the whole picture.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Endpoint label for stage timings, set per request by api.middleware.MetricsMiddleware
+current_endpoint = contextvars.ContextVar('current_endpoint', default='-')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Callables returning exposition lines for state kept elsewhere (cache, single-flight...)
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'moneymitra_request_duration_seconds', 'HTTP request duration until the response is returned.',
+    ('endpoint', 'method', 'status')))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    'moneymitra_stage_duration_seconds', 'Duration of request stages '
+    '(parse, prompt_build, upstream_ttfb, upstream_first_token, upstream_total, serialization).',
+    ('endpoint', 'stage')))
+LLM_TOKENS = REGISTRY.register(Counter(
+    'moneymitra_llm_tokens_total', 'Tokens reported by the upstream in response.usage.',
+    ('kind', 'model', 'type')))
+ERRORS = REGISTRY.register(Counter(
+    'moneymitra_errors_total', 'Errors by stage and exception class.',
+    ('stage', 'error_class')))
+
+
+def observe_stage(stage_name, seconds, endpoint=None):
+    STAGE_DURATION.observe(seconds, endpoint=endpoint or current_endpoint.get(), stage=stage_name)
+
+
+@contextmanager
+def stage(stage_name):
+    """Time a block as one request stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage_name, time.perf_counter() - start)
+
+
+def timed_stage(stage_name):
+    """Decorator form of stage() for plain functions"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(stage_name, error):
+    ERRORS.inc(stage=stage_name, error_class=type(error).__name__)
+
+
+def record_usage(kind, model, usage):
+    """Count prompt/completion tokens from an OpenAI-style usage object"""
+    if usage is None:
+        return
+    for token_type in ('prompt_tokens', 'completion_tokens'):
+        value = getattr(usage, token_type, None)
+        if value:
+            LLM_TOKENS.inc(value, kind=kind, model=model, type=token_type.split('_')[0])
+
+
+def counter_lines(name, documentation, values, label=None):
+    """Exposition lines for counters whose values live outside the registry"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+    for key, value in values.items():
+        labels = _format_labels((label,), (key,)) if label else ''
+        lines.append(f'{name}{labels} {value}')
+    return lines
+
+
+def render_prometheus():
+    return REGISTRY.render()
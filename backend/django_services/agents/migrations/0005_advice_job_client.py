@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0004_cash_flow_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advicejob',
+            name='client',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,102 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for an OpenAI-compatible upstream (chat completions, streaming and
+# /models) with configurable latency, jitter and error rate. Used as a router backend
+# in development and by the benchmarks; never calls a real model.
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MoneyMitraMockLLM/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if not self.path.rstrip('/').endswith('/models'):
+            return self._send_json(404, {'error': {'message': 'Not found'}})
+        self._send_json(200, {'object': 'list', 'data': [
+            {'id': self.server.model, 'object': 'model', 'created': 0, 'owned_by': 'mock'}]})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send_json(404, {'error': {'message': 'Not found'}})
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        self.server.sleep()
+        if random.random() < self.server.error_rate:
+            return self._send_json(503, {'error': {'message': 'Mock upstream overloaded', 'type': 'server_error'}})
+
+        model = request.get('model') or self.server.model
+        question = request.get('messages', [{}])[-1].get('content', '')
+        text = f'[mock:{self.server.model}] Save a fixed share of every payout. ({question[-60:]})'.replace('\n', ' ')
+        usage = {'prompt_tokens': max(1, len(json.dumps(request.get('messages', []))) // 4),
+                 'completion_tokens': max(1, len(text) // 4)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        if not request.get('stream'):
+            return self._send_json(200, {
+                'id': 'mock-completion', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in text.split(' '):
+            chunk = {'id': 'mock-completion', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': {'content': token + ' '}, 'finish_reason': None}]}
+            self._write_chunk(f'data: {json.dumps(chunk)}\n\n')
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        self._write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model='mock-llama', latency=0.05, jitter=0.0, error_rate=0.0, token_delay=0.0):
+        super().__init__(address, MockLLMHandler)
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+
+    def sleep(self):
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+
+def start_mock_llm(host='127.0.0.1', port=0, **options):
+    """Start a mock server on a daemon thread; port 0 picks a free port (see server.base_url)"""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
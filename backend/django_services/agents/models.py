@@ -1,3 +1,173 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class ChatSession(models.Model):
+    """Server-side quick chat conversation.
+
+    Only the most recent turns are sent upstream verbatim; older turns are folded
+    into `summary` (see agents.chat_sessions), so prompt size stays bounded.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    profile = models.JSONField(default=dict, blank=True)
+    summary = models.TextField(blank=True, default='')
+    # Turns with index below this are covered by the summary
+    summarized_through = models.PositiveIntegerField(default=0)
+    turn_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f'ChatSession {self.id} ({self.turn_count} turns)'
+
+
+class ChatTurn(models.Model):
+    """One question/answer pair in a chat session"""
+    session = models.ForeignKey(ChatSession, related_name='turns', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    question = models.TextField()
+    answer = models.TextField()
+    # Estimated prompt tokens of question + answer, so windows are sized without re-counting
+    tokens = models.PositiveIntegerField(default=0)
+    model = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='unique_chat_turn_index'),
+        ]
+
+    def __str__(self):
+        return f'Turn {self.index} of {self.session_id}'
+
+
+class Transaction(models.Model):
+    """One stored transaction (see agents.ledger for ingestion and rollups)"""
+    user_id = models.CharField(max_length=64)
+    date = models.DateField()
+    category = models.CharField(max_length=50, default='other')
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    is_income = models.BooleanField(default=False)
+    description = models.CharField(max_length=255, blank=True, default='')
+    # Client-supplied id; re-sending a transaction with the same id is a no-op
+    external_id = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['user_id', 'date', 'category'], name='txn_user_date_category'),
+            models.Index(fields=['user_id', 'category'], name='txn_user_category'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'external_id'], condition=~models.Q(external_id=''),
+                                    name='unique_txn_external_id'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.date} {self.category} {self.amount}'
+
+
+class LedgerKey(models.Model):
+    """Hashed access key for a user's stored transactions (see agents.ledger)"""
+    user_id = models.CharField(max_length=64, unique=True)
+    key_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.user_id} ledger key'
+
+
+class Rollup(models.Model):
+    """Running total and count of a user's transactions per category, kept current on insert"""
+    user_id = models.CharField(max_length=64)
+    category = models.CharField(max_length=50)
+    is_income = models.BooleanField(default=False)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyRollup(Rollup):
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'date', 'category', 'is_income'], name='unique_daily_rollup'),
+        ]
+
+
+class MonthlyRollup(Rollup):
+    # First day of the month
+    month = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'month', 'category', 'is_income'],
+                                    name='unique_monthly_rollup'),
+        ]
+
+
+class CategoryRollup(Rollup):
+    """All-time totals per category"""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'category', 'is_income'], name='unique_category_rollup'),
+        ]
+
+
+class CashFlowState(models.Model):
+    """Recent daily income / spending window for forecasting (agents.forecasting.CashFlowWindow)"""
+    user_id = models.CharField(max_length=64, unique=True)
+    window = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.user_id} cash flow'
+
+
+class AdviceJob(models.Model):
+    """Queued comprehensive advice request (see agents.jobs)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, EXPIRED)]
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED, EXPIRED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    request = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    # Client the job's upstream tokens are charged to (agents.ratelimit)
+    client = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # A running job whose lease ran out belongs to a dead worker and is queued again
+    lease_until = models.DateTimeField(null=True, blank=True)
+    # Queued: deadline to start; finished: when the row is purged
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='advice_job_status_created'),
+            models.Index(fields=['expires_at'], name='advice_job_expires'),
+        ]
+
+    def __str__(self):
+        return f'AdviceJob {self.id} ({self.status})'
@@ -0,0 +1,164 @@
+import math
+import os
+
+import numpy as np
+
+from agents.analytics import TransactionFrame
+
+# Prompt compaction: replaces raw transaction JSON in prompts with a bounded digest
+# (totals, category aggregates, income cadence, recurring payments, outliers, recent rows).
+# Sections are added in priority order until the token budget is used up, so prompt size
+# stays flat no matter how long the history is.
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv('PROMPT_TRANSACTION_TOKEN_BUDGET', '400'))
+
+NO_TRANSACTIONS = 'No recent transaction data provided'
+
+
+def estimate_tokens(text):
+    """Cheap token estimate: ~4 ASCII chars per token, non-ASCII chars (₹, Devanagari) count as one each"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+def _rupees(value):
+    return f"₹{value:,.0f}"
+
+
+def _label(transaction):
+    for field in ('description', 'merchant', 'note'):
+        if transaction.get(field):
+            return str(transaction[field]).strip().lower()[:40]
+    return str(transaction.get('category') or 'other').lower()
+
+
+def _overview(frame, spending, income):
+    lines = [f"- {frame.row_count} transactions"]
+    days = frame.days[~np.isnat(frame.days)]
+    if len(days):
+        first, last = days.min(), days.max()
+        span = int((last - first).astype(np.int64)) + 1
+        lines[0] += f" from {first} to {last} ({span} days)"
+        lines.append(f"- Spent {_rupees(spending.total())} (avg {_rupees(spending.total() / span)}/day)")
+    else:
+        lines.append(f"- Spent {_rupees(spending.total())}")
+    if len(income):
+        lines.append(f"- Received {_rupees(income.total())} across {len(income)} income entries")
+    return lines
+
+
+def _categories(spending, limit=8):
+    total = spending.total() or 1.0
+    counts = spending.category_counts()
+    lines = []
+    for category, amount in spending.top_categories(limit):
+        lines.append(f"- {category}: {_rupees(amount)} ({amount / total:.0%}, {counts[category]} txns)")
+    return lines
+
+
+def _income_cadence(income):
+    if not len(income):
+        return []
+    days = np.sort(income.days[~np.isnat(income.days)])
+    line = f"- {len(income)} payments, median {_rupees(float(np.median(income.amounts)))}"
+    if len(days) > 1:
+        gaps = np.diff(days).astype(np.int64)
+        line += f", every {float(np.median(gaps)):.0f} days on average (gap range {gaps.min()}-{gaps.max()})"
+    return [line]
+
+
+def _recurring(transactions, spending, min_occurrences=3):
+    """Same label and similar amount seen on several different days"""
+    if len(spending) < min_occurrences:
+        return []
+    labels = np.array([_label(transactions[i]) for i in spending.row_index], dtype=str)
+    # Bucket amounts to ~5% so small variations (₹499 / ₹500) group together
+    buckets = np.round(np.log(np.maximum(spending.amounts, 1.0)) / np.log(1.05)).astype(np.int64)
+    keys = np.char.add(np.char.add(labels, '|'), buckets.astype(str))
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    unique_labels, label_counts = np.unique(labels, return_counts=True)
+    label_totals = dict(zip(unique_labels.tolist(), label_counts.tolist()))
+
+    lines = []
+    for k in np.flatnonzero(counts >= min_occurrences):
+        label = unique_keys[k].rsplit('|', 1)[0]
+        # A fixed bill dominates its label; a common amount among many purchases does not
+        if counts[k] * 2 < label_totals[label]:
+            continue
+        rows = inverse == k
+        days = np.unique(spending.days[rows][~np.isnat(spending.days[rows])])
+        if len(days) < min_occurrences:
+            continue
+        gaps = np.diff(days).astype(np.int64)
+        interval = float(np.median(gaps))
+        if gaps.std() > 0.25 * gaps.mean():
+            continue
+        amount = float(np.median(spending.amounts[rows]))
+        lines.append((amount, f"- {label}: ~{_rupees(amount)} about every {interval:.0f} days ({int(counts[k])}x)"))
+    lines.sort(key=lambda item: -item[0])
+    return [line for _, line in lines[:5]]
+
+
+def _outliers(transactions, spending, limit=3):
+    if len(spending) < 5:
+        return []
+    median = float(np.median(spending.amounts))
+    threshold = max(float(np.percentile(spending.amounts, 95)), 3 * median)
+    lines = []
+    for i in spending.top_transactions(limit):
+        t = transactions[i]
+        amount = float(t.get('amount', 0))
+        if amount < threshold:
+            break
+        lines.append(f"- {t.get('date', 'unknown')} {_label(t)} {_rupees(amount)} (median txn {_rupees(median)})")
+    return lines
+
+
+def _recent(transactions, frame, limit=10):
+    # NaT is the smallest int64, so undated rows sort as the oldest
+    order = np.argsort(frame.days.astype(np.int64), kind='stable')[::-1][:limit]
+    lines = []
+    for j in order:
+        t = transactions[frame.row_index[j]]
+        kind = 'in' if frame.is_income[j] else 'out'
+        lines.append(f"- {t.get('date', 'unknown')} {_label(t)} {_rupees(float(frame.amounts[j]))} {kind}")
+    return lines
+
+
+def transaction_digest(transactions, token_budget=None, frame=None):
+    """Bounded text summary of a transaction list for use inside prompts"""
+    if not transactions:
+        return NO_TRANSACTIONS
+    token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+    frame = frame or TransactionFrame.from_records(transactions)
+    spending, income = frame.spending(), frame.income()
+
+    sections = [
+        ('Overview', _overview(frame, spending, income)),
+        ('Spending by category', _categories(spending)),
+        ('Income cadence', _income_cadence(income)),
+        ('Recurring payments', _recurring(transactions, spending)),
+        ('Unusually large payments', _outliers(transactions, spending)),
+        ('Most recent transactions', _recent(transactions, frame)),
+    ]
+
+    out = []
+    used = 0
+    for title, lines in sections:
+        if not lines:
+            continue
+        header = f"{title}:"
+        cost = estimate_tokens(header) + 1
+        if used + cost + estimate_tokens(lines[0]) > token_budget:
+            break
+        out.append(header)
+        used += cost
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            if used + cost > token_budget:
+                break
+            out.append(line)
+            used += cost
+    return '\n'.join(out)
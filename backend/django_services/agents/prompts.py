@@ -0,0 +1,266 @@
+import os
+from string import Formatter
+
+from agents.metrics import REGISTRY, Histogram
+from agents.prompt_compaction import estimate_tokens
+
+# Prompt template registry.
+# Every upstream prompt is a registered PromptTemplate with a name and version. The
+# system prompt and the instructions are static text, built into one shared system
+# message at import time; all per-request text goes after it. Providers that cache
+# prompt prefixes can then reuse that prefix across requests. Each template declares
+# its fields and defaults: user-supplied values are coerced once per request (str,
+# stripped, capped) and the placeholders are checked against the declaration at
+# registration. Code-built blocks such as digests are passed as slots.
+#
+# Templates can have variants for prompt-size experiments. PROMPT_VARIANTS picks one
+# per template at startup, e.g. PROMPT_VARIANTS=financial_advice=compact. The variant
+# is part of the template key (cache namespace, metrics label), so results from
+# different variants never mix.
+
+DEFAULT_VARIANT = 'default'
+MAX_FIELD_CHARS = int(os.getenv('PROMPT_MAX_FIELD_CHARS', '200'))
+
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    'moneymitra_prompt_tokens', 'Estimated prompt size per request by template.', ('template',),
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)))
+
+
+def _text(value, default):
+    if value is None or value == '':
+        return default
+    return str(value).strip()[:MAX_FIELD_CHARS] or default
+
+
+class PromptTemplate:
+    """A versioned prompt: static system text plus a per-request template with declared fields and slots"""
+
+    def __init__(self, name, version, system, template, fields=None, slots=(), max_tokens=500,
+                 temperature=0.1, variant=DEFAULT_VARIANT, digest_tokens=None):
+        self.name = name
+        self.version = version
+        self.variant = variant
+        self.key = f'{name}/{version}' if variant == DEFAULT_VARIANT else f'{name}/{version}/{variant}'
+        self.template = template
+        self.fields = dict(fields or {})  # field -> default
+        self.slots = frozenset(slots)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.digest_tokens = digest_tokens  # transaction digest budget (None = the default)
+
+        placeholders = {field for _, field, _, _ in Formatter().parse(template) if field is not None}
+        undeclared = placeholders - self.fields.keys() - self.slots
+        if undeclared:
+            raise ValueError(f'{self.key}: undeclared placeholders {sorted(undeclared)}')
+
+        self.system_message = {"role": "system", "content": system}
+        literal = ''.join(text for text, _, _, _ in Formatter().parse(template))
+        self.static_tokens = estimate_tokens(system)
+        self.template_tokens = estimate_tokens(literal)
+
+    def coerce(self, values):
+        """Declared fields from user data: defaults for missing values, strings capped at MAX_FIELD_CHARS"""
+        return {field: _text(values.get(field), default) for field, default in self.fields.items()}
+
+    def render(self, fields, **slots):
+        """Per-request text from coerced fields and code-built slots"""
+        text = self.template.format_map({**fields, **slots})
+        PROMPT_TOKENS.observe(self.static_tokens + estimate_tokens(text), template=self.key)
+        return text
+
+    def request(self, messages):
+        """Completion request: the shared system message, then `messages`"""
+        return {
+            'messages': [self.system_message, *messages],
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+        }
+
+    def describe(self):
+        return {
+            'key': self.key,
+            'static_tokens': self.static_tokens,
+            'template_tokens': self.template_tokens,
+            'max_tokens': self.max_tokens,
+        }
+
+
+_templates = {}  # name -> {variant: template}
+
+
+def register(template):
+    _templates.setdefault(template.name, {})[template.variant] = template
+    return template
+
+
+def _selected_variants():
+    """{template name: variant} from PROMPT_VARIANTS ("name=variant,...")"""
+    selected = {}
+    for item in os.getenv('PROMPT_VARIANTS', '').split(','):
+        name, _, variant = item.partition('=')
+        if name.strip() and variant.strip():
+            selected[name.strip()] = variant.strip()
+    return selected
+
+
+VARIANTS = _selected_variants()
+
+
+def get_template(name):
+    """The active variant of a template (unknown variants fall back to the default)"""
+    variants = _templates[name]
+    return variants.get(VARIANTS.get(name, DEFAULT_VARIANT)) or variants[DEFAULT_VARIANT]
+
+
+def template_stats():
+    """Active template keys and their static sizes, for /api/health/"""
+    return {name: get_template(name).describe() for name in sorted(_templates)}
+
+
+# Templates
+
+QUICK_CHAT_SYSTEM_PROMPT = """You are MoneyMitra, a friendly AI financial coach specializing in helping Indian gig workers, delivery drivers, auto drivers, and people with irregular income.
+
+Key Guidelines:
+- Give practical, actionable advice in simple Hindi/English
+- Understand Indian financial tools (UPI, digital wallets, bank accounts)
+- Consider irregular income challenges
+- Be encouraging and supportive
+- Keep responses concise but helpful (3-5 sentences)
+- Include specific amount suggestions when relevant"""
+
+PROFILE_FIELDS = {'income': 'N/A', 'expenses': 'N/A', 'occupation': 'gig worker', 'location': 'India'}
+
+PROFILE_BLOCK = """User Profile:
+- Occupation: {occupation}
+- Monthly Income: ₹{income}
+- Monthly Expenses: ₹{expenses}
+- Location: {location}"""
+
+register(PromptTemplate(
+    'quick_chat', 'v1', QUICK_CHAT_SYSTEM_PROMPT, PROFILE_BLOCK + '\n\nQuestion: {question}',
+    fields=PROFILE_FIELDS, slots=('question',)))
+
+# Sent as a second system message: profile, then the rolling summary block (or '')
+register(PromptTemplate(
+    'chat_session', 'v1', QUICK_CHAT_SYSTEM_PROMPT, PROFILE_BLOCK + '{summary}',
+    fields=PROFILE_FIELDS, slots=('summary',)))
+
+ADVICE_FIELDS = {
+    'income_pattern': 'irregular',
+    'income_range': '15000-25000',
+    'occupation': 'gig worker',
+    'monthly_expenses': '15000',
+    'current_savings': '2000',
+    'goals': 'save money',
+    'family_size': '3-4 members',
+    'location': 'urban India',
+}
+
+ADVICE_TEMPLATE = """As MoneyMitra, provide comprehensive financial coaching for this Indian user:
+
+USER PROFILE:
+- Occupation: {occupation}
+- Income Pattern: {income_pattern}
+- Monthly Income Range: ₹{income_range}
+- Monthly Expenses: ₹{monthly_expenses}
+- Current Savings: ₹{current_savings}
+- Financial Goals: {goals}
+- Family Size: {family_size}
+- Location: {location}
+
+{cash_flow}RECENT TRANSACTIONS:
+{transactions}"""
+
+register(PromptTemplate('financial_advice', 'v2', """You are MoneyMitra, an expert financial coach for Indian gig workers and people with irregular income. Provide detailed, practical, and culturally relevant financial advice.
+
+For each user, provide a detailed analysis covering:
+
+1. FINANCIAL HEALTH ASSESSMENT
+   - Current financial position analysis
+   - Income vs expenses evaluation
+   - Savings rate assessment
+
+2. RISK ANALYSIS
+   - Identify immediate financial risks (next 30 days)
+   - Medium-term concerns (3-6 months)
+   - Emergency fund adequacy
+
+3. PERSONALIZED RECOMMENDATIONS
+   - 3 immediate actions (this week)
+   - 3 short-term strategies (next 3 months)
+   - 2 long-term goals (6+ months)
+
+4. PRACTICAL TIPS
+   - Specific to the user's occupation and irregular income
+   - Include Indian financial tools and cultural context
+   - Realistic amount targets based on their income level
+
+Keep advice practical, encouraging, and culturally relevant for Indian users.""",
+    ADVICE_TEMPLATE, fields=ADVICE_FIELDS, slots=('cash_flow', 'transactions'), max_tokens=1500))
+
+register(PromptTemplate('financial_advice', 'v2', """You are MoneyMitra, a financial coach for Indian gig workers with irregular income.
+
+Cover: 1) financial health (position, income vs expenses, savings rate); 2) risks (next 30 days, 3-6 months, emergency fund); 3) actions: 3 this week, 3 for the next 3 months, 2 long-term; 4) tips for their occupation using Indian financial tools, with realistic amounts. Be practical and encouraging.""",
+    ADVICE_TEMPLATE, fields=ADVICE_FIELDS, slots=('cash_flow', 'transactions'), max_tokens=1500,
+    variant='compact', digest_tokens=200))
+
+SPENDING_TEMPLATE = """Analyze this spending pattern for an Indian gig worker:
+
+TRANSACTIONS DATA:
+{transactions}
+
+{cash_flow}SPENDING SUMMARY:
+- Total Spent: ₹{total_spent}
+- Category Breakdown: {categories}
+
+USER CONTEXT:
+- Occupation: {occupation}
+- Monthly Income: ₹{income}"""
+
+SPENDING_FIELDS = {'occupation': 'gig worker', 'income': 'irregular'}
+SPENDING_SLOTS = ('transactions', 'cash_flow', 'total_spent', 'categories')
+
+register(PromptTemplate('spending_analysis', 'v2', """You are MoneyMitra, analyzing spending patterns for Indian gig workers. Provide practical insights and actionable recommendations.
+
+For each spending pattern, provide:
+1. SPENDING INSIGHTS (3-4 key observations)
+2. RISK WARNINGS (if any category is too high)
+3. OPTIMIZATION SUGGESTIONS (2-3 specific recommendations)
+4. MONEY-SAVING TIPS (tailored to their occupation)
+
+Keep response concise and actionable.""",
+    SPENDING_TEMPLATE, fields=SPENDING_FIELDS, slots=SPENDING_SLOTS, max_tokens=800))
+
+register(PromptTemplate('spending_analysis', 'v2', """You are MoneyMitra, analyzing spending for Indian gig workers.
+
+Give 3 key observations, any category that is too high, 2 specific savings changes and 1 tip for their occupation. Be brief.""",
+    SPENDING_TEMPLATE, fields=SPENDING_FIELDS, slots=SPENDING_SLOTS, max_tokens=800,
+    variant='compact', digest_tokens=200))
+
+# Sections of the comprehensive advice. With fan-out (ADVICE_FANOUT or "fanout": true)
+# each is written by its own specialist prompt, run concurrently, and merged in order.
+ADVICE_SECTIONS = (
+    ('health', 'FINANCIAL HEALTH ASSESSMENT', """- Current financial position analysis
+- Income vs expenses evaluation
+- Savings rate assessment"""),
+    ('risks', 'RISK ANALYSIS', """- Identify immediate financial risks (next 30 days)
+- Medium-term concerns (3-6 months)
+- Emergency fund adequacy"""),
+    ('recommendations', 'PERSONALIZED RECOMMENDATIONS', """- 3 immediate actions (this week)
+- 3 short-term strategies (next 3 months)
+- 2 long-term goals (6+ months)"""),
+    ('tips', 'PRACTICAL TIPS', """- Specific to the user's occupation and irregular income
+- Include Indian financial tools and cultural context
+- Realistic amount targets based on their income level"""),
+)
+
+for _name, _title, _points in ADVICE_SECTIONS:
+    register(PromptTemplate(f'advice_{_name}', 'v1', f"""You are MoneyMitra's {_title.lower()} specialist, one of several coaches advising Indian gig workers and people with irregular income. Write only the {_title} section of a larger report; other specialists write the other sections.
+
+Cover:
+{_points}
+
+Keep it practical, encouraging, culturally relevant for Indian users, and under 250 words. Start with the content itself, without a section heading.""",
+        ADVICE_TEMPLATE, fields=ADVICE_FIELDS, slots=('cash_flow', 'transactions'), max_tokens=450,
+        digest_tokens=250))
@@ -0,0 +1,388 @@
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.core.cache import cache
+
+from agents.metrics import REGISTRY, Counter
+from agents.prompt_compaction import estimate_tokens
+
+# Upstream quota protection.
+# - Token budgets: token buckets in LLM tokens per client (LLM_CLIENT_TOKENS_PER_MINUTE)
+#   and for the whole service (LLM_GLOBAL_TOKENS_PER_MINUTE, the provider quota). Each
+#   call reserves its estimated prompt size plus max_tokens when it starts, and the
+#   reservation is corrected from response.usage (or the streamed text) when it ends.
+#   Buckets live in the Django cache, so workers share them when the cache is shared.
+#   api.throttling rejects requests from clients whose bucket is empty.
+# - UpstreamLimiter: at most LLM_MAX_IN_FLIGHT upstream calls per process. Extra
+#   callers wait in per-client queues served round-robin, so one client's burst
+#   can't starve the others. Admission also pauses while the global budget is spent.
+#   A caller that can't start within LLM_QUEUE_TIMEOUT gets UpstreamBusy, and the
+#   agent falls back as for any other upstream error. Every attempt of a call takes
+#   its own slot (retries and hedges included), so the cap counts real requests.
+
+# Client the current request's upstream calls are charged to (set by api.throttling;
+# background jobs set it from the submitting client)
+INTERNAL_CLIENT = 'internal'
+current_client = contextvars.ContextVar('current_client', default=INTERNAL_CLIENT)
+
+GLOBAL_KEY = '*'
+RECHECK_INTERVAL = 0.25  # seconds between admission checks while the global budget is spent
+
+UPSTREAM_QUEUE = REGISTRY.register(Counter(
+    'moneymitra_upstream_admissions_total', 'Upstream call admissions by outcome (immediate, queued, timeout).',
+    ('outcome',)))
+TOKENS_CHARGED = REGISTRY.register(Counter(
+    'moneymitra_llm_tokens_charged_total', 'Tokens charged to budgets per call (usage, or an estimate without it).'))
+
+
+class UpstreamBusy(Exception):
+    """No upstream slot became free within the queue timeout"""
+
+
+class TokenBudget:
+    """Token buckets measured in LLM tokens, one per key, refilled continuously; may go negative"""
+
+    def __init__(self, tokens_per_minute, burst=None, prefix='llm_tokens'):
+        self.rate = max(0.0, float(tokens_per_minute)) / 60.0
+        self.capacity = float(burst or tokens_per_minute)
+        self.prefix = prefix
+        self.timeout = math.ceil(self.capacity / self.rate) + 60 if self.rate else None
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def level(self, key, now=None):
+        """Tokens currently available for `key` (negative after overspending)"""
+        now = now or time.time()
+        stored = cache.get(self._key(key))
+        if stored is None:
+            return self.capacity
+        tokens, updated = stored
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def charge(self, key, tokens):
+        """Take tokens (or give them back when negative); not atomic across workers, like DRF throttles"""
+        if not self.enabled or not tokens:
+            return
+        now = time.time()
+        cache.set(self._key(key), (self.level(key, now) - tokens, now), self.timeout)
+
+    def retry_after(self, key):
+        """Seconds until `key` has tokens again (0 when it has some now)"""
+        if not self.enabled:
+            return 0.0
+        level = self.level(key)
+        return 0.0 if level > 0 else (1.0 - level) / self.rate
+
+
+class _Waiter:
+    """A thread blocked in UpstreamLimiter.slot"""
+
+    def __init__(self):
+        self.granted = False
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+
+class _AsyncWaiter:
+    """A task awaiting UpstreamLimiter.aslot; granted from any thread"""
+
+    def __init__(self):
+        self.granted = False
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.granted
+
+
+class UpstreamLimiter:
+    """Caps in-flight upstream calls; callers over the cap are queued per client and served round-robin"""
+
+    def __init__(self, max_in_flight=20, queue_timeout=10.0, global_budget=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_timeout = queue_timeout
+        self.global_budget = global_budget
+        self.in_flight = 0
+        self._queues = OrderedDict()  # client -> deque of waiters, in round-robin order
+        self._lock = threading.Lock()
+
+    def _budget_spent(self):
+        return self.global_budget is not None and self.global_budget.retry_after(GLOBAL_KEY) > 0
+
+    def _dispatch(self):
+        """Grant free slots to waiters, one client at a time (caller holds the lock)"""
+        while self._queues and self.in_flight < self.max_in_flight and not self._budget_spent():
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self.in_flight += 1
+            waiter.granted = True
+            waiter.notify()
+
+    def _enter(self, client, waiter):
+        """Take a slot at once if nobody is waiting, else join the client's queue; True when granted"""
+        with self._lock:
+            if not self._queues and self.in_flight < self.max_in_flight and not self._budget_spent():
+                self.in_flight += 1
+                UPSTREAM_QUEUE.inc(outcome='immediate')
+                return True
+            self._queues.setdefault(client, deque()).append(waiter)
+            UPSTREAM_QUEUE.inc(outcome='queued')
+            self._dispatch()
+            return waiter.granted
+
+    def _recheck(self, client, waiter, expired):
+        """Re-run admission (the global budget refills over time); drop the waiter once expired"""
+        with self._lock:
+            self._dispatch()
+            if waiter.granted or not expired:
+                return waiter.granted
+            queue = self._queues.get(client)
+            if queue is not None:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[client]
+        UPSTREAM_QUEUE.inc(outcome='timeout')
+        raise UpstreamBusy('No upstream capacity within the queue timeout')
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, client, timeout=None):
+        """Hold one upstream slot for the block, waiting up to `timeout` seconds for it"""
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        waiter = _Waiter()
+        granted = self._enter(client, waiter)
+        while not granted:
+            remaining = deadline - time.monotonic()
+            waiter.wait(min(max(remaining, 0), RECHECK_INTERVAL))
+            granted = self._recheck(client, waiter, time.monotonic() >= deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, client, timeout=None):
+        """Async variant of slot; waiting holds no thread"""
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        waiter = _AsyncWaiter()
+        granted = self._enter(client, waiter)
+        try:
+            while not granted:
+                remaining = deadline - time.monotonic()
+                await waiter.wait(min(max(remaining, 0), RECHECK_INTERVAL))
+                granted = self._recheck(client, waiter, time.monotonic() >= deadline)
+        except asyncio.CancelledError:
+            # Cancelled while queued (hedge loser, client gone): leave the queue or hand back the slot
+            with self._lock:
+                if not waiter.granted:
+                    queue = self._queues.get(client)
+                    if queue is not None and waiter in queue:
+                        queue.remove(waiter)
+                        if not queue:
+                            del self._queues[client]
+                    raise
+            self.release()
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'waiting': sum(len(queue) for queue in self._queues.values()),
+                'waiting_clients': len(self._queues),
+            }
+
+
+def request_tokens(request):
+    """Estimated tokens a completion request can use: prompt plus max_tokens"""
+    prompt = sum(estimate_tokens(message.get('content') or '') for message in request.get('messages', ()))
+    return prompt, prompt + int(request.get('max_tokens') or 0)
+
+
+class Reservation:
+    """Tokens reserved for one upstream call, corrected to actual usage by settle()"""
+
+    def __init__(self, quota, client, request, start=True):
+        self.quota = quota
+        self.client = client
+        self.prompt_tokens, self.reserved = request_tokens(request)
+        self.started = False
+        self.settled = False
+        self._lock = threading.Lock()
+        if start:
+            self.start()
+
+    def start(self):
+        """Charge the reservation (once, when the first attempt is admitted)"""
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+        self.quota.charge(self.client, self.reserved)
+
+    def settle(self, usage=None, text=None):
+        """Replace the reservation with usage from the response, or an estimate from the streamed text"""
+        with self._lock:
+            if self.settled or not self.started:
+                self.settled = True
+                return
+            self.settled = True
+        if usage is not None and getattr(usage, 'total_tokens', None):
+            actual = usage.total_tokens
+        elif text is not None:
+            actual = self.prompt_tokens + estimate_tokens(text)
+        else:
+            # Failed call: assume the prompt was counted, the completion was not
+            actual = self.prompt_tokens
+        self.quota.charge(self.client, actual - self.reserved)
+        TOKENS_CHARGED.inc(actual)
+
+
+class UpstreamQuota:
+    """Token budgets plus the in-flight limiter, applied around every upstream call"""
+
+    def __init__(self, limiter, client_budget, global_budget):
+        self.limiter = limiter
+        self.client_budget = client_budget
+        self.global_budget = global_budget
+
+    def charge(self, client, tokens):
+        self.client_budget.charge(client, tokens)
+        self.global_budget.charge(GLOBAL_KEY, tokens)
+
+    def retry_after(self, client):
+        """Seconds until this client may call the LLM again (0 = now)"""
+        return self.client_budget.retry_after(client)
+
+    @contextmanager
+    def call(self, request, timeout=None):
+        """Wait for a slot, reserve tokens, and settle them when the block ends"""
+        client = current_client.get()
+        with self.limiter.slot(client, timeout):
+            reservation = Reservation(self, client, request)
+            try:
+                yield reservation
+            finally:
+                reservation.settle()
+
+    @asynccontextmanager
+    async def acall(self, request, timeout=None):
+        """Async variant of call"""
+        client = current_client.get()
+        async with self.limiter.aslot(client, timeout):
+            reservation = Reservation(self, client, request)
+            try:
+                yield reservation
+            finally:
+                reservation.settle()
+
+    @contextmanager
+    def reserve(self, request):
+        """Tokens for a call made of several attempts, each holding its own slot (attempt / aattempt)"""
+        reservation = Reservation(self, current_client.get(), request, start=False)
+        try:
+            yield reservation
+        finally:
+            reservation.settle()
+
+    @contextmanager
+    def attempt(self, reservation, timeout=None):
+        """One upstream slot for one attempt; the first admitted attempt charges the reservation.
+
+        A sync hedge can't be cancelled while it waits, so one admitted after its call
+        has finished (settled) gives up instead of sending a request nobody reads.
+        """
+        with self.limiter.slot(reservation.client, timeout):
+            if reservation.settled:
+                raise UpstreamBusy('The call finished while this attempt was queued')
+            reservation.start()
+            yield
+
+    @asynccontextmanager
+    async def aattempt(self, reservation, timeout=None):
+        """Async variant of attempt"""
+        async with self.limiter.aslot(reservation.client, timeout):
+            reservation.start()
+            yield
+
+    def snapshot(self):
+        snapshot = self.limiter.snapshot()
+        snapshot['global_tokens_available'] = (
+            round(self.global_budget.level(GLOBAL_KEY)) if self.global_budget.enabled else None)
+        return snapshot
+
+
+def build_quota():
+    """Limits configured by LLM_* environment variables (0 disables a token budget)"""
+    global_budget = TokenBudget(float(os.getenv('LLM_GLOBAL_TOKENS_PER_MINUTE', '0')))
+    limiter = UpstreamLimiter(
+        max_in_flight=int(os.getenv('LLM_MAX_IN_FLIGHT', os.getenv('LLM_MAX_CONNECTIONS', '20'))),
+        queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', '10')),
+        global_budget=global_budget if global_budget.enabled else None,
+    )
+    client_budget = TokenBudget(float(os.getenv('LLM_CLIENT_TOKENS_PER_MINUTE', '20000')))
+    return UpstreamQuota(limiter, client_budget, global_budget)
+
+
+_lock = threading.Lock()
+_quota = None
+
+
+def get_quota():
+    """Process-wide upstream quota"""
+    global _quota
+    if _quota is None:
+        with _lock:
+            if _quota is None:
+                _quota = build_quota()
+    return _quota
+
+
+@REGISTRY.register_collector
+def _quota_metrics():
+    if _quota is None:
+        return []
+    snapshot = _quota.limiter.snapshot()
+    lines = ['# HELP moneymitra_upstream_in_flight Upstream calls in flight in this process.',
+             '# TYPE moneymitra_upstream_in_flight gauge',
+             f'moneymitra_upstream_in_flight {snapshot["in_flight"]}',
+             '# HELP moneymitra_upstream_waiting Callers queued for an upstream slot.',
+             '# TYPE moneymitra_upstream_waiting gauge',
+             f'moneymitra_upstream_waiting {snapshot["waiting"]}']
+    return lines
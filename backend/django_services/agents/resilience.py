@@ -0,0 +1,382 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.metrics import REGISTRY, Counter
+
+# Upstream resilience: every agent call runs under a per-kind deadline, failed
+# attempts are retried with jittered backoff while a shared retry budget allows it,
+# and latency-sensitive kinds are hedged with a second request after a short delay.
+# Circuit breakers (one per backend, see agents.router) fail fast so callers fall back.
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Seconds an agent call may take in total, retries and hedges included
+DEFAULT_DEADLINES = {
+    'quick_chat': 10.0,
+    'get_financial_advice': 25.0,
+    'analyze_spending_with_ai': 20.0,
+    # One section of fanned-out advice; also how long the merge waits for it
+    'advice_section': 12.0,
+}
+
+RETRIES = REGISTRY.register(Counter(
+    'moneymitra_llm_retries_total', 'Upstream attempts retried after a failure.', ('kind',)))
+HEDGES = REGISTRY.register(Counter(
+    'moneymitra_llm_hedged_requests_total', 'Hedge requests sent, by which request answered first.',
+    ('kind', 'winner')))
+
+
+# Result of a sync hedge that was skipped because the primary had already finished
+_NOT_SENT = object()
+
+# Extra time the async hard cap allows so the transport's own timeout fires first
+# (and is recorded as an upstream error) in the common case
+DEADLINE_GRACE = 0.25
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """An async attempt ran past its deadline and was cancelled"""
+
+
+def is_retryable(error):
+    """Timeouts, connection errors, 429 and 5xx are worth another attempt; 4xx are not"""
+    import openai  # loaded by the time an upstream call has failed
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt, base=0.2, cap=2.0):
+    """Full-jitter exponential backoff for the given retry number (1-based)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class RetryBudget:
+    """Retries allowed as a fraction of recent requests, so an outage can't multiply load"""
+
+    def __init__(self, ratio=0.2, min_retries=3, window_seconds=10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        cutoff = now - self.window_seconds
+        for samples in (self._requests, self._retries):
+            while samples and samples[0] < cutoff:
+                samples.popleft()
+
+    def record_request(self):
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_spend(self):
+        """Reserve one retry (or hedge); False when the budget is exhausted"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """Opens when the failure rate over a sliding window crosses a threshold.
+
+    While open every call is rejected; after `open_seconds` a single trial call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window_seconds=30.0, open_seconds=15.0):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record(self, ok):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._samples.clear()
+                if ok:
+                    self._state = CLOSED
+                else:
+                    self._state, self._opened_at = OPEN, now
+                return
+            if self._state == OPEN:
+                return
+
+            self._samples.append((now, ok))
+            cutoff = now - self.window_seconds
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            if len(self._samples) >= self.min_calls:
+                failures = sum(1 for _, sample_ok in self._samples if not sample_ok)
+                if failures / len(self._samples) >= self.failure_rate:
+                    self._state, self._opened_at = OPEN, now
+                    self._samples.clear()
+
+    def abandon(self):
+        """Release a half-open trial whose call was cancelled without an outcome"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            failures = sum(1 for _, ok in self._samples if not ok)
+            calls = len(self._samples)
+        return {
+            'state': self.state,
+            'window_calls': calls,
+            'window_failures': failures,
+        }
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def breaker_from_env():
+    """Circuit breaker configured by LLM_BREAKER_* environment variables"""
+    return CircuitBreaker(
+        failure_rate=_env_float('LLM_BREAKER_FAILURE_RATE', 0.5),
+        min_calls=int(_env_float('LLM_BREAKER_MIN_CALLS', 10)),
+        window_seconds=_env_float('LLM_BREAKER_WINDOW_SECONDS', 30.0),
+        open_seconds=_env_float('LLM_BREAKER_OPEN_SECONDS', 15.0),
+    )
+
+
+class Resilience:
+    """Deadline, retry and hedging policy for upstream calls.
+
+    `fn(timeout)` performs one upstream attempt and must give up after `timeout`
+    seconds; `call` / `acall` decide how many attempts run and when.
+    """
+
+    def __init__(self, budget=None, deadlines=None, max_attempts=3,
+                 backoff_base=0.2, backoff_cap=2.0, hedge_delay=1.5, hedge_kinds=('quick_chat',),
+                 hedge_workers=8):
+        self.budget = budget or RetryBudget()
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_delay = hedge_delay
+        self.hedge_kinds = frozenset(hedge_kinds)
+        self._hedge_workers = hedge_workers
+        self._hedge_pool = None
+        self._lock = threading.Lock()
+
+    def deadline(self, kind):
+        return self.deadlines.get(kind, 30.0)
+
+    def should_hedge(self, kind):
+        return self.hedge_delay > 0 and kind in self.hedge_kinds
+
+    async def _aattempt(self, kind, coro_fn, timeout):
+        try:
+            return await asyncio.wait_for(coro_fn(timeout), timeout + DEADLINE_GRACE)
+        except asyncio.TimeoutError as e:
+            if isinstance(e, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded(f'{kind} exceeded its {timeout:.2f}s deadline') from None
+
+    def _pool(self):
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=self._hedge_workers, thread_name_prefix='hedge')
+            return self._hedge_pool
+
+    def _hedged(self, kind, fn, deadline):
+        """Run fn on the caller's thread and, if it hasn't answered after hedge_delay, a hedge on the pool.
+
+        Only hedges use the pool, and every attempt gets what is left of the absolute
+        deadline when it starts, so time spent queued for a pool thread is not added on.
+        A blocking sync request can't be abandoned: the caller returns when the primary
+        does, with the hedge's answer if that came first or the primary failed.
+        """
+        primary_done = threading.Event()
+        sent = []
+
+        def hedge():
+            if primary_done.wait(self.hedge_delay) or time.monotonic() >= deadline or not self.budget.try_spend():
+                return _NOT_SENT
+            sent.append(True)
+            return fn(deadline - time.monotonic())
+
+        future = self._pool().submit(contextvars.copy_context().run, hedge)
+        try:
+            answer = fn(deadline - time.monotonic())
+        except Exception as e:
+            error = e
+        else:
+            primary_done.set()
+            if future.done() and future.exception() is None and future.result() is not _NOT_SENT:
+                HEDGES.inc(kind=kind, winner='hedge')
+                return future.result()
+            future.cancel()
+            if sent:
+                HEDGES.inc(kind=kind, winner='primary')
+            return answer
+
+        primary_done.set()
+        if future.cancel():
+            raise error
+        try:
+            answer = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:
+            # The hedge failed too or is still running at the deadline
+            raise error from None
+        if answer is _NOT_SENT:
+            raise error
+        HEDGES.inc(kind=kind, winner='hedge')
+        return answer
+
+    async def _ahedged(self, kind, coro_fn, timeout):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        primary = asyncio.ensure_future(self._aattempt(kind, coro_fn, timeout))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_delay)
+        if done or not self.budget.try_spend():
+            return await primary
+
+        hedge = asyncio.ensure_future(
+            self._aattempt(kind, coro_fn, max(0.1, timeout - (loop.time() - start))))
+        pending = {primary: 'primary', hedge: 'hedge'}
+        error = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    winner = pending.pop(task)
+                    if task.exception() is None:
+                        HEDGES.inc(kind=kind, winner=winner)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _next_delay(self, kind, attempt, error, deadline):
+        """Backoff before the next attempt, or None when we should give up"""
+        if isinstance(error, CircuitOpenError) or not is_retryable(error):
+            return None
+        if attempt >= self.max_attempts or not self.budget.try_spend():
+            return None
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+        if time.monotonic() + delay >= deadline:
+            return None
+        RETRIES.inc(kind=kind)
+        return delay
+
+    def call(self, kind, fn):
+        """Run fn(timeout) under this kind's deadline, retrying and hedging as configured"""
+        deadline = time.monotonic() + self.deadline(kind)
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                if self.should_hedge(kind):
+                    return self._hedged(kind, fn, deadline)
+                return fn(remaining)
+            except Exception as e:
+                delay = self._next_delay(kind, attempt, e, deadline)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def acall(self, kind, coro_fn):
+        """Async variant of call; coro_fn(timeout) is also cancelled at the deadline"""
+        deadline = time.monotonic() + self.deadline(kind)
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                if self.should_hedge(kind):
+                    return await self._ahedged(kind, coro_fn, remaining)
+                return await self._aattempt(kind, coro_fn, remaining)
+            except Exception as e:
+                delay = self._next_delay(kind, attempt, e, deadline)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+
+def build_resilience():
+    """Policy configured by LLM_* environment variables"""
+    deadlines = {kind: _env_float(f'LLM_DEADLINE_{kind.upper()}', seconds)
+                 for kind, seconds in DEFAULT_DEADLINES.items()}
+    return Resilience(
+        budget=RetryBudget(ratio=_env_float('LLM_RETRY_BUDGET_RATIO', 0.2)),
+        deadlines=deadlines,
+        max_attempts=int(_env_float('LLM_MAX_ATTEMPTS', 3)),
+        hedge_delay=_env_float('LLM_HEDGE_DELAY', 1.5),
+        hedge_kinds=[k.strip() for k in os.getenv('LLM_HEDGE_KINDS', 'quick_chat').split(',') if k.strip()],
+        hedge_workers=int(_env_float('LLM_HEDGE_WORKERS', _env_float('LLM_MAX_CONNECTIONS', 20))),
+    )
+
+
+_lock = threading.Lock()
+_resilience = None
+
+
+def get_resilience():
+    """Process-wide resilience policy"""
+    global _resilience
+    if _resilience is None:
+        with _lock:
+            if _resilience is None:
+                _resilience = build_resilience()
+    return _resilience
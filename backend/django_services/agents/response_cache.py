@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from agents.metrics import REGISTRY, counter_lines
+
+# Response cache for LLM answers.
+# Keys are a fingerprint of (prompt template, model, normalized question, context);
+# values are what the agent stores (quick chat: the text and the model that wrote it).
+# Backends: in-process LRU or any Django cache.
+
+KEY_PREFIX = "mm:llm:"
+
+_STOPWORDS = frozenset(
+    "a an the i me my we our you your is am are was be to of in on for and or "
+    "can could should would how what which do does much many as with it this that "
+    "kya hai mein main ke ki ko".split()
+)
+_PUNCTUATION = re.compile(r"[^\w\s₹]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(" ", str(text).lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def question_tokens(text):
+    """Content words of a question, used for fuzzy matching"""
+    return frozenset(t for t in normalize_text(text).split() if t not in _STOPWORDS)
+
+
+def _normalize_context(context):
+    return {str(k): normalize_text(v) for k, v in sorted((context or {}).items())}
+
+
+def fingerprint(template, model, question, context):
+    """Stable cache key for one prompt"""
+    raw = json.dumps(
+        [template, model, normalize_text(question), _normalize_context(context)],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _bucket_key(template, model, context):
+    raw = json.dumps([template, model, _normalize_context(context)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCacheBackend:
+    """In-process LRU with per-entry TTL and a bounded number of entries"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl=None):
+        self.set(key, value, ttl)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Adapter for a Django cache alias (locmem, redis, memcached, db...)"""
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(key, value, timeout=ttl)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, value, ttl=None):
+        await self.cache.aset(key, value, timeout=ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+    """Exact (and optionally fuzzy) response cache with hit/miss counters"""
+
+    def __init__(self, backend, ttl=3600, fuzzy=False, fuzzy_threshold=0.8, fuzzy_index_size=256):
+        self.backend = backend
+        self.ttl = ttl
+        self.fuzzy = fuzzy
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_index_size = fuzzy_index_size
+        # bucket (template, model, context) -> recent (question tokens, key)
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def _remember(self, bucket, tokens, key):
+        if not self.fuzzy or not tokens:
+            return
+        with self._lock:
+            entries = self._index.get(bucket)
+            if entries is None:
+                entries = self._index[bucket] = deque(maxlen=32)
+            self._index.move_to_end(bucket)
+            entries.append((tokens, key))
+            while len(self._index) > self.fuzzy_index_size:
+                self._index.popitem(last=False)
+
+    def _similar_keys(self, bucket, tokens):
+        """Keys of indexed questions similar enough to reuse, best match first"""
+        if not self.fuzzy or not tokens:
+            return []
+        with self._lock:
+            entries = list(self._index.get(bucket, ()))
+        scored = []
+        for other, key in entries:
+            score = len(tokens & other) / len(tokens | other)
+            if score >= self.fuzzy_threshold:
+                scored.append((score, key))
+        scored.sort(reverse=True)
+        return [key for _, key in scored]
+
+    def _count(self, value, fuzzy=False):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            elif fuzzy:
+                self.fuzzy_hits += 1
+            else:
+                self.hits += 1
+
+    def get(self, template, model, question, context):
+        value = self.backend.get(fingerprint(template, model, question, context))
+        if value is not None:
+            self._count(value)
+            return value
+        bucket = _bucket_key(template, model, context)
+        for key in self._similar_keys(bucket, question_tokens(question)):
+            value = self.backend.get(key)
+            if value is not None:
+                self._count(value, fuzzy=True)
+                return value
+        self._count(None)
+        return None
+
+    def set(self, template, model, question, context, value):
+        key = fingerprint(template, model, question, context)
+        self.backend.set(key, value, self.ttl)
+        self._remember(_bucket_key(template, model, context), question_tokens(question), key)
+
+    async def aget(self, template, model, question, context):
+        value = await self.backend.aget(fingerprint(template, model, question, context))
+        if value is not None:
+            self._count(value)
+            return value
+        bucket = _bucket_key(template, model, context)
+        for key in self._similar_keys(bucket, question_tokens(question)):
+            value = await self.backend.aget(key)
+            if value is not None:
+                self._count(value, fuzzy=True)
+                return value
+        self._count(None)
+        return None
+
+    async def aset(self, template, model, question, context, value):
+        key = fingerprint(template, model, question, context)
+        await self.backend.aset(key, value, self.ttl)
+        self._remember(_bucket_key(template, model, context), question_tokens(question), key)
+
+    def stats(self):
+        lookups = self.hits + self.fuzzy_hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'fuzzy_hits': self.fuzzy_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+        }
+        if isinstance(self.backend, LRUCacheBackend):
+            stats['entries'] = len(self.backend)
+        return stats
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._index.clear()
+            self.hits = self.fuzzy_hits = self.misses = 0
+
+
+class NullCache:
+    """Cache stand-in when caching is disabled"""
+
+    def get(self, *args):
+        return None
+
+    def set(self, *args):
+        pass
+
+    async def aget(self, *args):
+        return None
+
+    async def aset(self, *args):
+        pass
+
+    def stats(self):
+        return {'backend': 'disabled'}
+
+    def clear(self):
+        pass
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def build_response_cache():
+    """Build the cache configured by LLM_CACHE_* environment variables"""
+    backend_name = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    if backend_name in ("none", "off", "disabled"):
+        return NullCache()
+    if backend_name == "django":
+        backend = DjangoCacheBackend(os.getenv("LLM_CACHE_ALIAS", "default"))
+    else:
+        backend = LRUCacheBackend(int(os.getenv("LLM_CACHE_SIZE", "1024")))
+    return ResponseCache(
+        backend,
+        ttl=int(os.getenv("LLM_CACHE_TTL", "3600")),
+        fuzzy=os.getenv("LLM_CACHE_FUZZY", "False").lower() == "true",
+        fuzzy_threshold=float(os.getenv("LLM_CACHE_FUZZY_THRESHOLD", "0.8")),
+    )
+
+
+def get_response_cache():
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = build_response_cache()
+    return _cache
+
+
+@REGISTRY.register_collector
+def _cache_metrics():
+    stats = get_response_cache().stats()
+    if 'hits' not in stats:
+        return []
+    return counter_lines(
+        'moneymitra_response_cache_lookups_total', 'Response cache lookups by result.',
+        {'hit': stats['hits'], 'fuzzy_hit': stats['fuzzy_hits'], 'miss': stats['misses']}, label='result')
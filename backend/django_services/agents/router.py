@@ -0,0 +1,198 @@
+import json
+import os
+import random
+import threading
+
+from agents.llm_client import DEFAULT_BASE_URL, get_async_client, get_client
+from agents.metrics import REGISTRY, Counter
+from agents.resilience import CircuitBreaker, CircuitOpenError, breaker_from_env, is_retryable
+
+# Model router: several OpenAI-compatible backends (Cerebras, a local stand-in
+# server, ...) each with live latency / error-rate estimates and a circuit breaker.
+# Every request kind goes to the fastest healthy backend within its cost tier;
+# retries and hedges exclude backends already tried, which gives failover.
+#
+# LLM_BACKENDS (JSON list, or LLM_BACKENDS_FILE pointing at one), e.g.
+#   [{"name": "cerebras", "model": "llama3.1-8b", "tier": 2},
+#    {"name": "local", "base_url": "http://127.0.0.1:9100/v1", "api_key": "local",
+#     "model": "llama3.1-8b", "tier": 1, "display_name": "Local Llama3.1-8B"}]
+# LLM_ROUTE_TIERS (JSON object): highest tier each kind may use, e.g. {"quick_chat": 1}
+
+DEFAULT_MODEL = "llama3.1-8b"
+DEFAULT_DISPLAY_NAME = "Cerebras Llama3.1-8B"
+
+ROUTED = REGISTRY.register(Counter(
+    'moneymitra_llm_routed_total', 'Upstream attempts by request kind and chosen backend.', ('kind', 'backend')))
+SHORT_CIRCUITS = REGISTRY.register(Counter(
+    'moneymitra_llm_short_circuits_total', 'Calls rejected because every eligible backend circuit was open.',
+    ('kind',)))
+
+
+class Backend:
+    """One OpenAI-compatible upstream with EWMA latency and error-rate estimates"""
+
+    def __init__(self, name, model=DEFAULT_MODEL, base_url=None, api_key=None, api_key_env='CEREBRAS_API_KEY',
+                 tier=1, kinds=None, display_name=None, breaker=None, alpha=0.2):
+        self.name = name
+        self.model = model
+        self.base_url = base_url or os.getenv('LLM_BASE_URL', DEFAULT_BASE_URL)
+        self.api_key = api_key or os.getenv(api_key_env)
+        self.tier = tier
+        self.kinds = frozenset(kinds) if kinds else None
+        self.display_name = display_name or model
+        self.breaker = breaker or CircuitBreaker()
+        self.alpha = alpha
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return get_client(self.base_url, self.api_key)
+
+    @property
+    def async_client(self):
+        return get_async_client(self.base_url, self.api_key)
+
+    def serves(self, kind):
+        return self.kinds is None or kind in self.kinds
+
+    def record(self, latency_ms, ok):
+        with self._lock:
+            self.calls += 1
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            # Failed calls say little about speed (fast refusals, slow timeouts)
+            if ok:
+                if self.latency_ms is None:
+                    self.latency_ms = latency_ms
+                else:
+                    self.latency_ms += self.alpha * (latency_ms - self.latency_ms)
+
+    def score(self):
+        """Lower is better; untried backends go first so they get measured, never-successful ones last"""
+        with self._lock:
+            if self.latency_ms is None:
+                return 0.0 if self.calls == 0 else float('inf')
+            return self.latency_ms * (1.0 + 4.0 * self.error_rate)
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'model': self.model,
+            'base_url': self.base_url,
+            'tier': self.tier,
+            'latency_ms': round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            'error_rate': round(self.error_rate, 4),
+            'calls': self.calls,
+            'circuit': self.breaker.state,
+        }
+
+
+class ModelRouter:
+    """Picks a backend per request kind: cheapest allowed tier, fastest healthy backend"""
+
+    def __init__(self, backends, kind_tiers=None, explore=0.05):
+        if not backends:
+            raise ValueError('ModelRouter needs at least one backend')
+        self.backends = list(backends)
+        self.kind_tiers = dict(kind_tiers or {})
+        self.explore = explore
+
+    def candidates(self, kind):
+        max_tier = self.kind_tiers.get(kind)
+        eligible = [b for b in self.backends
+                    if b.serves(kind) and (max_tier is None or b.tier <= max_tier)]
+        return eligible or [b for b in self.backends if b.serves(kind)] or self.backends
+
+    def choose(self, kind, exclude=()):
+        """Best backend for kind whose circuit admits a call; raises CircuitOpenError if none"""
+        ranked = sorted(self.candidates(kind), key=lambda b: b.score())
+        if len(ranked) > 1 and self.explore and random.random() < self.explore:
+            # Occasionally try a non-best backend so its latency estimate stays current
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        # Backends already tried for this request are the last resort
+        ranked.sort(key=lambda b: b.name in exclude)
+        for backend in ranked:
+            if backend.breaker.allow():
+                ROUTED.inc(kind=kind, backend=backend.name)
+                return backend
+        SHORT_CIRCUITS.inc(kind=kind)
+        raise CircuitOpenError(f'No healthy upstream for {kind}: every backend circuit is open')
+
+    def record(self, backend, latency_ms, error=None):
+        """Feed one attempt outcome back (client errors don't count against the backend)"""
+        ok = error is None or not is_retryable(error)
+        backend.record(latency_ms, ok)
+        backend.breaker.record(ok)
+
+    def abandon(self, backend):
+        """The attempt was cancelled without an outcome"""
+        backend.breaker.abandon()
+
+    def display_name(self, model):
+        for backend in self.backends:
+            if backend.model == model:
+                return backend.display_name
+        return model
+
+    def snapshot(self):
+        return [backend.snapshot() for backend in self.backends]
+
+
+def _load_backend_configs():
+    path = os.getenv('LLM_BACKENDS_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    raw = os.getenv('LLM_BACKENDS')
+    if raw:
+        return json.loads(raw)
+    return [{'name': 'cerebras', 'model': DEFAULT_MODEL, 'display_name': DEFAULT_DISPLAY_NAME}]
+
+
+def build_router():
+    """Router configured by LLM_BACKENDS / LLM_BACKENDS_FILE and LLM_ROUTE_TIERS"""
+    backends = []
+    for config in _load_backend_configs():
+        config = dict(config)
+        backends.append(Backend(config.pop('name'), breaker=breaker_from_env(), **config))
+    return ModelRouter(
+        backends,
+        kind_tiers=json.loads(os.getenv('LLM_ROUTE_TIERS', '{}')),
+        explore=float(os.getenv('LLM_ROUTER_EXPLORE', '0.05')),
+    )
+
+
+_lock = threading.Lock()
+_router = None
+
+
+def get_router():
+    """Process-wide model router"""
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                _router = build_router()
+    return _router
+
+
+@REGISTRY.register_collector
+def _backend_metrics():
+    if _router is None:
+        return []
+    lines = ['# HELP moneymitra_llm_backend_latency_ms EWMA latency of successful calls per backend.',
+             '# TYPE moneymitra_llm_backend_latency_ms gauge']
+    lines += [f'moneymitra_llm_backend_latency_ms{{backend="{b.name}"}} {b.latency_ms or 0}'
+              for b in _router.backends]
+    lines += ['# HELP moneymitra_llm_backend_error_rate EWMA error rate per backend.',
+              '# TYPE moneymitra_llm_backend_error_rate gauge']
+    lines += [f'moneymitra_llm_backend_error_rate{{backend="{b.name}"}} {b.error_rate}' for b in _router.backends]
+    lines += ['# HELP moneymitra_llm_circuit_state Circuit breaker state per backend (1 for the current state).',
+              '# TYPE moneymitra_llm_circuit_state gauge']
+    for b in _router.backends:
+        state = b.breaker.state
+        lines += [f'moneymitra_llm_circuit_state{{backend="{b.name}",state="{s}"}} {int(s == state)}'
+                  for s in ('closed', 'open', 'half_open')]
+    return lines
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+
+from agents.metrics import REGISTRY, counter_lines
+
+# Request coalescing: concurrent callers with the same key share one execution.
+# The first caller (leader) runs the function; everyone arriving while it is in
+# flight waits for and receives the same result (or exception).
+
+
+def request_key(request):
+    """Stable key for an upstream request dict"""
+    raw = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Single-flight groups for threads (do) and asyncio tasks (ado)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Futures belong to one event loop, so async calls are grouped per loop
+        self._async_calls = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, coro_fn):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+
+        while True:
+            future = calls.get(key)
+            if future is None:
+                break
+            with self._lock:
+                self.followers += 1
+            # asyncio.wait never raises the future's error/cancellation, only our own
+            await asyncio.wait([future])
+            if not future.cancelled():
+                return future.result()
+            # The leader was cancelled (client went away): retry, possibly as leader
+
+        future = calls[key] = loop.create_future()
+        # Followers may be gone; don't warn about an unretrieved exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        with self._lock:
+            self.leaders += 1
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del calls[key]
+
+    def stats(self):
+        calls = self.leaders + self.followers
+        return {
+            'upstream_calls': self.leaders,
+            'coalesced_calls': self.followers,
+            'coalesced_ratio': round(self.followers / calls, 4) if calls else 0.0,
+        }
+
+
+_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Process-wide single-flight group"""
+    return _flight
+
+
+@REGISTRY.register_collector
+def _single_flight_metrics():
+    return counter_lines(
+        'moneymitra_llm_calls_total', 'Completion requests by single-flight role (leader = upstream call).',
+        {'leader': _flight.leaders, 'coalesced': _flight.followers}, label='role')
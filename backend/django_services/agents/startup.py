@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+from agents.metrics import REGISTRY
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Worker start-up report.
+# moneymitra.wsgi / moneymitra.asgi time loading the application (settings, apps,
+# URLconf and the views it imports) and pass the result to finish(), which prints
+# one line per worker (STARTUP_REPORT=False silences it). /api/health/ and /metrics
+# expose the same numbers. Compare deployment profiles (API_PROFILE=full|lean) with
+# python manage.py startup_report.
+
+_report = None
+
+
+def max_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def finish(started, server):
+    """Load the URLconf (so the first request doesn't import the views) and record the start-up time.
+
+    `started` is a time.perf_counter() taken before Django was imported.
+    """
+    global _report
+    from django.conf import settings
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    _report = {
+        'server': server,
+        'profile': settings.API_PROFILE,
+        'load_ms': round((time.perf_counter() - started) * 1000, 1),
+        'modules': len(sys.modules),
+        'max_rss_mb': max_rss_mb(),
+    }
+    if os.getenv('STARTUP_REPORT', 'True').lower() == 'true':
+        print(f"🚀 MoneyMitra {server} worker ready in {_report['load_ms']:.0f} ms "
+              f"({_report['profile']} profile, {_report['modules']} modules, {_report['max_rss_mb']} MB peak RSS)")
+    return _report
+
+
+def report():
+    """Start-up report plus what has been loaded lazily since (None before finish())"""
+    if _report is None:
+        return None
+    from agents import llm_client
+
+    return {
+        **_report,
+        'llm_sdk_loaded': 'openai' in sys.modules,
+        'agent_ready': llm_client._agent is not None,
+        'modules_now': len(sys.modules),
+        'max_rss_mb_now': max_rss_mb(),
+    }
+
+
+@REGISTRY.register_collector
+def _startup_metrics():
+    if _report is None:
+        return []
+    return ['# HELP moneymitra_startup_seconds Time to load the application in this worker.',
+            '# TYPE moneymitra_startup_seconds gauge',
+            f'moneymitra_startup_seconds {_report["load_ms"] / 1000:.4f}',
+            '# HELP moneymitra_startup_modules Python modules loaded when the worker was ready.',
+            '# TYPE moneymitra_startup_modules gauge',
+            f'moneymitra_startup_modules {_report["modules"]}']
@@ -0,0 +1,242 @@
+import csv
+import hashlib
+import itertools
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from agents import ledger
+
+# Streaming import of bank / UPI statement exports (CSV or JSON Lines) into the
+# transaction store. Lines are read one at a time and written in fixed-size batches
+# through ledger.ingest, so memory stays bounded however long the statement is.
+#
+# Rows are normalized to the API transaction shape: common bank column names are
+# recognised, debit/credit columns and Dr/Cr markers decide income vs spending,
+# dates in the usual Indian formats become ISO dates, and rows without a category
+# get one from keywords in the narration. Rows without a reference id get a stable
+# one derived from their content, so re-importing an overlapping statement does not
+# duplicate transactions.
+
+MAX_LINE_BYTES = 64 * 1024
+
+# canonical field -> header names seen in bank exports (lowercase, single spaces)
+HEADER_ALIASES = {
+    'date': ('date', 'txn date', 'transaction date', 'value date', 'posting date', 'tran date'),
+    'amount': ('amount', 'transaction amount', 'amount (inr)', 'amount(inr)', 'amt'),
+    'debit': ('debit', 'debit amount', 'withdrawal', 'withdrawal amt', 'withdrawal amt.', 'withdrawal amount', 'dr'),
+    'credit': ('credit', 'credit amount', 'deposit', 'deposit amt', 'deposit amt.', 'deposit amount', 'cr'),
+    'description': ('description', 'narration', 'remarks', 'particulars', 'details', 'transaction details'),
+    'category': ('category',),
+    'id': ('id', 'reference', 'ref no', 'ref no.', 'reference no', 'chq/ref no', 'chq./ref.no.', 'utr',
+           'transaction id', 'upi ref no'),
+    'type': ('type', 'dr/cr', 'cr/dr', 'transaction type'),
+}
+_ALIASES = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y',
+                '%d-%b-%y', '%d %b %y', '%Y/%m/%d', '%d %B %Y')
+
+CATEGORY_KEYWORDS = {
+    'food': ('swiggy', 'zomato', 'restaurant', 'cafe', 'dhaba', 'eatery', 'food'),
+    'groceries': ('bigbasket', 'blinkit', 'zepto', 'dmart', 'grocery', 'groceries', 'kirana', 'supermarket'),
+    'fuel': ('petrol', 'diesel', 'fuel', 'hpcl', 'bpcl', 'iocl', 'indian oil', 'bharat petroleum'),
+    'transport': ('uber', 'ola', 'rapido', 'metro', 'irctc', 'railway', 'bus', 'fastag', 'toll'),
+    'mobile': ('recharge', 'airtel', 'jio', 'vodafone', 'bsnl', 'prepaid', 'postpaid'),
+    'utilities': ('electricity', 'bescom', 'msedcl', 'water bill', 'gas', 'broadband', 'bill pay'),
+    'rent': ('rent',),
+    'shopping': ('amazon', 'flipkart', 'myntra', 'meesho', 'ajio'),
+    'health': ('pharmacy', 'medical', 'hospital', 'apollo', 'clinic', 'chemist'),
+}
+_CATEGORY_PATTERNS = [
+    (category, re.compile(r'\b(?:' + '|'.join(re.escape(k) for k in keywords) + r')\b'))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+]
+
+CREDIT_MARKERS = frozenset(['cr', 'credit', 'income', 'received', 'deposit'])
+
+_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?|\.\d+')
+
+
+def read_lines(stream, max_line=MAX_LINE_BYTES):
+    """Decoded lines from a binary stream (request body, uploaded file, open file)"""
+    first = True
+    while True:
+        line = stream.readline(max_line)
+        if not line:
+            return
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig' if first else 'utf-8', errors='replace')
+        elif first:
+            line = line.lstrip('\ufeff')
+        first = False
+        yield line
+
+
+def _field_map(keys):
+    """{canonical field: original key} for a header row or JSON object"""
+    fields = {}
+    for key in keys:
+        field = _ALIASES.get(' '.join(str(key or '').lower().split()))
+        if field and field not in fields:
+            fields[field] = key
+    return fields
+
+
+def parse_amount(value):
+    """(amount, 'dr' / 'cr' / None) for strings like '₹1,250.00', '-500', '(500)', '500 Dr'; None if no number"""
+    text = str(value or '').strip().lower()
+    number = _NUMBER.search(text)
+    if not number:
+        return None
+    amount = float(number.group().replace(',', ''))
+    if text.endswith('cr'):
+        return amount, 'cr'
+    if text.endswith('dr') or text.startswith('-') or (text.startswith('(') and text.endswith(')')):
+        return amount, 'dr'
+    return amount, None
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """ISO date string for the date formats banks export, or None (statements repeat few distinct dates)"""
+    text = ' '.join(str(value or '').split())
+    if not text:
+        return None
+    # Timestamps: keep the date part
+    candidates = (text, text.split(' ')[0], text.split('T')[0])
+    for candidate in candidates:
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def infer_category(description):
+    text = description.lower()
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return category
+    return 'other'
+
+
+def normalize(raw, fields):
+    """API-shaped transaction dict for one statement row, or None if it can't be used"""
+    def get(name):
+        key = fields.get(name)
+        value = raw.get(key) if key is not None else None
+        return '' if value is None else str(value).strip()
+
+    day = parse_date(get('date'))
+    if day is None:
+        return None
+
+    debit, credit = parse_amount(get('debit')), parse_amount(get('credit'))
+    if debit and debit[0]:
+        amount, income = debit[0], False
+    elif credit and credit[0]:
+        amount, income = credit[0], True
+    else:
+        parsed = parse_amount(get('amount'))
+        if parsed is None:
+            return None
+        amount, marker = parsed
+        kind = get('type').lower()
+        # Unmarked amounts are spending, as in the JSON API
+        income = marker == 'cr' or (marker is None and kind in CREDIT_MARKERS)
+
+    description = get('description')
+    category = get('category').lower() or ('income' if income else infer_category(description))
+    return {
+        'id': get('id'),
+        'amount': amount,
+        'category': category,
+        'date': day,
+        'description': description,
+        'type': 'income' if income else 'expense',
+    }
+
+
+def _csv_rows(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = _field_map(header)
+    if 'date' not in fields or not ({'amount', 'debit', 'credit'} & fields.keys()):
+        raise ValueError(f'Unrecognised statement header: {", ".join(header)}')
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        yield dict(zip(header, values)), fields
+
+
+def _json_lines_rows(lines):
+    cached = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        if not isinstance(raw, dict):
+            yield None, None
+            continue
+        keys = tuple(raw)
+        if keys not in cached:
+            cached[keys] = _field_map(keys)
+        yield raw, cached[keys]
+
+
+def iter_statement(lines):
+    """Normalized transactions (None for unusable rows) from CSV or JSON Lines text lines"""
+    lines = iter(lines)
+    first = next((line for line in lines if line.strip()), None)
+    if first is None:
+        return
+    lines = itertools.chain([first], lines)
+    rows = _json_lines_rows(lines) if first.lstrip().startswith('{') else _csv_rows(lines)
+
+    # Content ids count repeats of the same row within a day, so two identical
+    # purchases on one day stay two transactions. Counts are kept for the whole file
+    # (one entry per distinct row), so statements need not be in date order.
+    repeats = {}
+    for raw, fields in rows:
+        record = normalize(raw, fields) if raw is not None else None
+        if record is not None and not record['id']:
+            key = f"{record['date']}|{record['amount']:.2f}|{record['type']}|{record['description'].lower()}"
+            repeats[key] = repeats.get(key, 0) + 1
+            record['id'] = 'imp-' + hashlib.sha1(f"{key}|{repeats[key]}".encode()).hexdigest()[:24]
+        yield record
+
+
+def import_batches(user_id, lines, batch_size=1000):
+    """Import a statement in batches, yielding running totals after each batch"""
+    stats = {'rows': 0, 'ingested': 0, 'duplicates': 0, 'rejected': 0, 'batches': 0}
+    batch = []
+
+    def flush():
+        result = ledger.ingest(user_id, batch)
+        stats['batches'] += 1
+        for key in ('ingested', 'duplicates', 'rejected'):
+            stats[key] += result[key]
+        batch.clear()
+
+    for record in iter_statement(lines):
+        stats['rows'] += 1
+        if record is None:
+            stats['rejected'] += 1
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+            yield dict(stats)
+    if batch:
+        flush()
+    yield dict(stats)
@@ -1,3 +1,1341 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import threading
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import openai
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from agents import jobs, ledger, prompts
+from agents.advice_packs import PackIndex, persona_grid, persona_occupation
+from agents.analytics import TransactionFrame, frames_by_user, spending_summary
+from agents.batch import THROTTLED_INSIGHTS, analyze_spending_batch, run_bounded
+from agents.chat_sessions import create_session, merge_summary, record_turn, reply, split_window
+from agents.fast_path import FAST_PATH_MODEL, FastPath, classify
+from agents.financial_crew import SECTION_FALLBACKS, SimpleFinancialAgent
+from agents.forecasting import CashFlowWindow, cash_flow_forecast, forecast_lines, savings_risk_level
+from agents.health import (DEGRADED, READY, UNAVAILABLE, UNKNOWN, UpstreamHealth, UpstreamProber,
+                           combined_status, get_backend_health, upstream_status)
+from agents.metrics import Histogram
+from agents.mock_llm import start_mock_llm
+from agents.models import AdviceJob, CategoryRollup, DailyRollup, Transaction
+from agents.prompt_compaction import NO_TRANSACTIONS, estimate_tokens, transaction_digest
+from agents.ratelimit import GLOBAL_KEY, TokenBudget, UpstreamBusy, UpstreamLimiter, UpstreamQuota, current_client
+from agents.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Resilience, RetryBudget
+from agents.response_cache import LRUCacheBackend, NullCache, ResponseCache, fingerprint
+from agents.router import Backend, ModelRouter
+from agents.singleflight import SingleFlight
+from agents.statement_import import import_batches, iter_statement, parse_amount, parse_date, read_lines
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'http://upstream.test/v1/chat/completions'))
+
+
+def status_error(status_code):
+    request = httpx.Request('POST', 'http://upstream.test/v1/chat/completions')
+    response = httpx.Response(status_code, request=request)
+    return openai.APIStatusError(f'HTTP {status_code}', response=response, body=None)
+
+
+def _chunks(response):
+    """Streamed chunks for a reply, one per word"""
+    words = response.choices[0].message.content.split(' ')
+    return [SimpleNamespace(model=response.model, choices=[SimpleNamespace(delta=SimpleNamespace(
+        content=word if i == len(words) - 1 else word + ' '))]) for i, word in enumerate(words)]
+
+
+class StubStream:
+    def __init__(self, response):
+        self.chunks = _chunks(response)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+
+class AsyncStubStream(StubStream):
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+def completion(model, content):
+    """A chat completion response carrying `content`"""
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=40, completion_tokens=10, total_tokens=50),
+    )
+
+
+class StubCompletions:
+    """chat.completions stand-in: replies are returned (or raised) in order, the last one repeats"""
+
+    def __init__(self, *replies, delay=0.0):
+        self.replies = list(replies) or ['ok']
+        self.delay = delay
+        self.calls = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _next(self, model, request):
+        with self._lock:
+            self.calls += 1
+            self.requests.append(request)
+            reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return completion(model, reply)
+
+    def create(self, model, timeout=None, stream=False, **request):
+        time.sleep(self.delay)
+        response = self._next(model, request)
+        return StubStream(response) if stream else response
+
+
+class AsyncStubCompletions(StubCompletions):
+    async def create(self, model, timeout=None, stream=False, **request):
+        await asyncio.sleep(self.delay)
+        response = self._next(model, request)
+        return AsyncStubStream(response) if stream else response
+
+
+class StubBackend(Backend):
+    """Backend whose clients never leave the process"""
+
+    def __init__(self, name, completions=None, async_completions=None, **kwargs):
+        kwargs.setdefault('model', f'{name}-model')
+        super().__init__(name, api_key='test', base_url=f'http://{name}.test/v1', **kwargs)
+        self.completions = completions or StubCompletions()
+        self.async_completions = async_completions or AsyncStubCompletions()
+        self.probe_error = None
+
+    def _models_list(self, timeout=None):
+        if self.probe_error is not None:
+            raise self.probe_error
+        return []
+
+    @property
+    def client(self):
+        models = SimpleNamespace(list=self._models_list)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions), models=models)
+        client.with_options = lambda **options: client
+        return client
+
+    @property
+    def async_client(self):
+        return SimpleNamespace(chat=SimpleNamespace(completions=self.async_completions))
+
+
+def stub_agent(*backends, max_in_flight=4, client_tokens=0, coalesce=True, cache=None, resilience=None):
+    """Agent over stub backends with its own quota and resilience policy (no hedging, no backoff)"""
+    agent = SimpleFinancialAgent(router=ModelRouter(backends, explore=0), cache=cache or NullCache())
+    agent.coalesce = coalesce
+    agent.flight = SingleFlight()
+    agent.fast_path = FastPath(min_confidence=2.0)  # never confident: every question goes upstream
+    agent.resilience = resilience or Resilience(budget=RetryBudget(min_retries=10), backoff_base=0.0, hedge_delay=0)
+    agent.quota = UpstreamQuota(UpstreamLimiter(max_in_flight=max_in_flight, queue_timeout=2.0),
+                                TokenBudget(client_tokens, prefix='test_client'), TokenBudget(0, prefix='test_global'))
+    return agent
+
+
+class MockLLMTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_mock_llm(model='mock-test', latency=0.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def backend(self):
+        return Backend('mock', model='mock-test', base_url=self.server.base_url, api_key='test')
+
+    def test_completion_and_models(self):
+        client = self.backend().client
+        response = client.chat.completions.create(
+            model='mock-test', messages=[{'role': 'user', 'content': 'How do I save?'}])
+        self.assertTrue(response.choices[0].message.content.startswith('[mock:mock-test]'))
+        self.assertGreater(response.usage.total_tokens, 0)
+        self.assertEqual([m.id for m in client.models.list()], ['mock-test'])
+
+    def test_stream(self):
+        stream = self.backend().client.chat.completions.create(
+            model='mock-test', stream=True, messages=[{'role': 'user', 'content': 'hi'}])
+        text = ''.join(chunk.choices[0].delta.content or '' for chunk in stream)
+        self.assertIn('Save a fixed share of every payout.', text)
+
+    def test_error_rate(self):
+        self.server.error_rate = 1.0
+        try:
+            with self.assertRaises(openai.InternalServerError):
+                self.backend().client.with_options(max_retries=0).chat.completions.create(
+                    model='mock-test', messages=[{'role': 'user', 'content': 'hi'}])
+        finally:
+            self.server.error_rate = 0.0
+
+    def test_agent_over_mock_upstream(self):
+        agent = stub_agent(self.backend())
+        result = agent.quick_chat('How do I save?')
+        self.assertTrue(result['success'])
+        self.assertTrue(result['response'].startswith('[mock:mock-test]'))
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_fingerprint_ignores_case_punctuation_and_context_order(self):
+        self.assertEqual(fingerprint('t', 'm', 'How do I save?', {'a': 'X', 'b': 'y'}),
+                         fingerprint('t', 'm', '  how do i SAVE ', {'b': 'Y', 'a': 'x'}))
+        self.assertNotEqual(fingerprint('t', 'm', 'How do I save?', {}), fingerprint('t', 'other', 'How do I save?', {}))
+
+    def test_lru_evicts_oldest_and_expires(self):
+        backend = LRUCacheBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual((backend.get('a'), backend.get('b'), backend.get('c')), (1, None, 3))
+        backend.set('d', 4, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(backend.get('d'))
+
+    def test_fuzzy_hit(self):
+        cache = ResponseCache(LRUCacheBackend(), fuzzy=True, fuzzy_threshold=0.6)
+        cache.set('t', 'm', 'How much emergency fund should I keep?', {}, 'three months')
+        self.assertEqual(cache.get('t', 'm', 'How much emergency fund should I keep aside?', {}), 'three months')
+        self.assertIsNone(cache.get('t', 'm', 'Which loan is cheapest?', {}))
+        self.assertEqual((cache.fuzzy_hits, cache.misses), (1, 1))
+
+    def test_hit_reports_the_model_that_wrote_the_answer(self):
+        completions = StubCompletions('Keep a buffer.')
+        agent = stub_agent(StubBackend('primary', completions, display_name='Primary Llama'),
+                           cache=ResponseCache(LRUCacheBackend()))
+        first = agent.quick_chat('How do I save?')
+        second = agent.quick_chat('How do I save?')
+        self.assertEqual(completions.calls, 1)
+        self.assertEqual((first['model'], first['cached']), ('Primary Llama', False))
+        self.assertEqual((second['response'], second['model'], second['cached']), ('Keep a buffer.', 'Primary Llama', True))
+
+    def test_stream_hit_reports_the_model(self):
+        agent = stub_agent(StubBackend('primary', display_name='Primary Llama'), cache=ResponseCache(LRUCacheBackend()))
+        agent.quick_chat('How do I save?')
+        events = list(agent.stream_quick_chat('How do I save?'))
+        self.assertEqual(events[0], ('token', 'ok'))
+        self.assertEqual((events[-1][1]['model'], events[-1][1]['cached']), ('Primary Llama', True))
+
+    def test_backend_sets_have_separate_namespaces(self):
+        cache = ResponseCache(LRUCacheBackend())
+        stub_agent(StubBackend('a', StubCompletions('from a')), cache=cache).quick_chat('How do I save?')
+        result = stub_agent(StubBackend('b', StubCompletions('from b')), cache=cache).quick_chat('How do I save?')
+        self.assertEqual((result['response'], result['cached']), ('from b', False))
+
+
+class AnalyticsTests(SimpleTestCase):
+    TRANSACTIONS = [
+        {'amount': '100', 'category': 'Food', 'date': '2024-01-01'},
+        {'amount': 50, 'category': 'fuel', 'date': '2024-01-01T08:30:00'},
+        {'amount': 30, 'category': 'food', 'date': '2024-01-04'},
+        {'amount': 'n/a', 'category': 'food', 'date': '2024-01-04'},
+        {'amount': 20, 'category': 'rent', 'date': None},
+    ]
+
+    def test_summary(self):
+        summary = spending_summary(TransactionFrame.from_records(self.TRANSACTIONS), rolling_window=7)
+        self.assertEqual(summary['total_spent'], 200.0)
+        self.assertEqual(summary['transaction_count'], 5)
+        self.assertEqual(summary['average_transaction'], 40.0)
+        self.assertEqual(summary['category_breakdown'], {'food': 130.0, 'fuel': 50.0, 'rent': 20.0})
+        self.assertEqual(summary['top_categories'], [('food', 130.0), ('fuel', 50.0), ('rent', 20.0)])
+        self.assertEqual(summary['daily_spending'], {'2024-01-01': 150.0, '2024-01-04': 30.0, 'unknown': 20.0})
+        self.assertEqual(summary['weekly_spending'], {'2024-01-01': 180.0})
+        # 180 spent over the four calendar days elapsed
+        self.assertEqual(summary['rolling_7d_average'], 45.0)
+
+    def test_rolling_average_counts_quiet_days(self):
+        frame = TransactionFrame.from_records([
+            {'amount': 70, 'date': '2024-01-01'}, {'amount': 14, 'date': '2024-01-10'}])
+        days, values = frame.rolling_average(7)
+        self.assertEqual([str(d) for d in days], ['2024-01-01', '2024-01-10'])
+        self.assertEqual(values.tolist(), [70.0, 2.0])
+
+    def test_outlying_dates_stay_cheap(self):
+        frame = TransactionFrame.from_records([
+            {'amount': 1, 'date': '0001-01-01'}, {'amount': 2, 'date': '9999-12-31'}, {'amount': 3, 'date': '2024-01-01'}])
+        days, totals = frame.daily_series()
+        self.assertEqual(len(days), 3)
+        self.assertEqual(frame.daily_totals(), {'0001-01-01': 1.0, '2024-01-01': 3.0, '9999-12-31': 2.0})
+        self.assertEqual(len(frame.weekly_totals()), 3)
+
+    def test_frames_by_user(self):
+        first, second = frames_by_user([self.TRANSACTIONS, [{'amount': 'x'}, {'amount': 9, 'category': 'fuel'}]])
+        self.assertEqual((first.total(), first.row_count), (200.0, 5))
+        self.assertEqual((second.total(), second.row_count, second.top_transactions(1)), (9.0, 2, [1]))
+
+
+class PromptCompactionTests(SimpleTestCase):
+    def history(self, days):
+        transactions = []
+        for day in range(days):
+            date = f'2024-{1 + day // 28:02d}-{1 + day % 28:02d}'
+            transactions.append({'amount': 120 + day % 7 * 10, 'category': 'food', 'date': date,
+                                 'description': f'meal {day % 5}'})
+            if day % 7 == 0:
+                transactions.append({'amount': 4000, 'category': 'payout', 'type': 'income', 'date': date})
+            if day % 14 == 0:
+                transactions.append({'amount': 499, 'category': 'mobile', 'date': date, 'description': 'Phone recharge'})
+        return transactions
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('abcdefgh'), 2)
+        self.assertEqual(estimate_tokens('₹500'), 2)
+
+    def test_no_transactions(self):
+        self.assertEqual(transaction_digest([]), NO_TRANSACTIONS)
+
+    def test_digest_sections(self):
+        digest = transaction_digest(self.history(84), token_budget=2000)
+        self.assertIn('Overview:', digest)
+        self.assertIn('- food: ', digest)
+        self.assertIn('every 7 days on average', digest)
+        self.assertIn('- phone recharge: ~₹499 about every 14 days (6x)', digest)
+        self.assertIn('Most recent transactions:', digest)
+
+    def test_digest_stays_within_budget(self):
+        for days in (28, 336):
+            digest = transaction_digest(self.history(days), token_budget=150)
+            self.assertLessEqual(sum(estimate_tokens(line) + 1 for line in digest.split('\n')), 150)
+            self.assertTrue(digest.startswith('Overview:'))
+
+
+class HealthTests(SimpleTestCase):
+    def test_combined_status(self):
+        self.assertEqual(combined_status([]), UNKNOWN)
+        self.assertEqual(combined_status([READY, UNKNOWN]), READY)
+        self.assertEqual(combined_status([READY, UNAVAILABLE]), DEGRADED)
+        self.assertEqual(combined_status([UNAVAILABLE, UNAVAILABLE]), UNAVAILABLE)
+
+    def test_window_thresholds(self):
+        health = UpstreamHealth(degraded_error_rate=0.2, unavailable_error_rate=0.8)
+        self.assertEqual(health.snapshot()['status'], UNKNOWN)
+        for ok in (True, True, True, False):
+            health.record(10.0, ok, error=None if ok else 'HTTP 500')
+        snapshot = health.snapshot()
+        self.assertEqual((snapshot['status'], snapshot['error_rate'], snapshot['last_error']), (DEGRADED, 0.25, 'HTTP 500'))
+        for _ in range(16):
+            health.record(10.0, False)
+        self.assertEqual(health.snapshot()['status'], UNAVAILABLE)
+
+    def test_prober_marks_each_backend(self):
+        alive, dead = StubBackend('probe-alive'), StubBackend('probe-dead')
+        dead.probe_error = connection_error()
+        router = ModelRouter([alive, dead], explore=0)
+        UpstreamProber(UpstreamHealth(), router=router).probe()
+        status = upstream_status(router)
+        self.assertEqual(status['status'], DEGRADED)
+        self.assertEqual(status['backends']['probe-alive']['status'], READY)
+        self.assertEqual(status['backends']['probe-dead']['status'], UNAVAILABLE)
+        self.assertIsNotNone(status['backends']['probe-dead']['last_probe_at'])
+
+    def test_client_errors_do_not_count_against_the_upstream(self):
+        for name, error, state in (('health-4xx', status_error(400), READY), ('health-5xx', status_error(500), UNAVAILABLE)):
+            backend = StubBackend(name, StubCompletions(error))
+            agent = stub_agent(backend)
+            agent.health = UpstreamHealth()
+            agent.quick_chat('How do I save?')
+            self.assertEqual(get_backend_health(name).snapshot()['status'], state)
+            self.assertEqual(agent.health.snapshot()['status'], state)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return 'answer'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+        threads[0].start()
+        started.wait(2)
+        for thread in threads[1:]:
+            thread.start()
+        while flight.followers < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['answer'] * 5)
+        self.assertEqual(flight.stats(), {'upstream_calls': 1, 'coalesced_calls': 4, 'coalesced_ratio': 0.8})
+
+    def test_error_reaches_every_caller_and_key_is_released(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('k', lambda: (_ for _ in ()).throw(ValueError('boom')))
+        self.assertEqual(flight.do('k', lambda: 'again'), 'again')
+        self.assertEqual(flight.leaders, 2)
+
+    def test_async_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def run():
+            return await asyncio.gather(*(flight.ado('k', slow) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(run()), ['answer'] * 4)
+        self.assertEqual(calls, [1])
+
+    def test_cancelled_leader_hands_over_to_a_follower(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def run():
+            leader = asyncio.ensure_future(flight.ado('k', slow))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(flight.ado('k', slow))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), 'answer')
+        self.assertEqual(len(calls), 2)
+
+    def test_agent_coalesces_identical_questions(self):
+        completions = StubCompletions('Save 10% of each payout.', delay=0.1)
+        agent = stub_agent(StubBackend('primary', completions))
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(agent.quick_chat('How do I save?')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(completions.calls, 1)
+        self.assertEqual([r['response'] for r in results], ['Save 10% of each payout.'] * 4)
+
+
+class BatchTests(SimpleTestCase):
+    def test_malformed_entries_get_their_own_error(self):
+        users = [
+            {'user_id': 'a', 'transactions': [{'amount': 100, 'category': 'food'}]},
+            'not a user',
+            {'transactions': 'nope'},
+            {'transactions': [1, 2]},
+        ]
+        results = list(analyze_spending_batch(users, include_ai=False, chunk_size=2))
+        self.assertEqual([r['user_id'] for r in results], ['a', 1, 2, 3])
+        self.assertEqual([r['success'] for r in results], [True, False, False, False])
+
+    def test_ai_insights_per_user(self):
+        agent = stub_agent(StubBackend('primary', StubCompletions('Cut fuel costs.')))
+        users = [{'user_id': i, 'transactions': [{'amount': 100 + i, 'category': 'fuel'}]} for i in range(5)]
+        results = sorted(analyze_spending_batch(users, agent, chunk_size=2, max_workers=2, rate_per_second=0),
+                         key=lambda r: r['user_id'])
+        self.assertEqual([r['analysis_type'] for r in results], ['ai_powered'] * 5)
+        self.assertEqual([r['basic_analysis']['total_spent'] for r in results], [100.0, 101.0, 102.0, 103.0, 104.0])
+        self.assertEqual(results[0]['ai_insights'], 'Cut fuel costs.')
+
+    def test_failed_insights_fall_back_to_basic(self):
+        agent = stub_agent(StubBackend('primary', StubCompletions(status_error(400))))
+        [result] = analyze_spending_batch([{'transactions': [{'amount': 10}]}], agent, rate_per_second=0)
+        self.assertEqual((result['success'], result['analysis_type']), (True, 'basic'))
+
+    def test_run_bounded_yields_errors_as_results(self):
+        def fn(n):
+            if n == 3:
+                raise ValueError('bad item')
+            return n * 2
+
+        results = dict(run_bounded(range(10), fn, max_workers=2))
+        self.assertEqual(sorted(results), list(range(10)))
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(results[4], 8)
+
+    def test_users_turned_away_by_the_gate_get_basic_analysis(self):
+        completions = StubCompletions('Cut fuel costs.')
+        agent = stub_agent(StubBackend('primary', completions))
+        admitted = iter([True, False, True])
+        users = [{'user_id': i, 'transactions': [{'amount': 100, 'category': 'fuel'}]} for i in range(3)]
+        results = list(analyze_spending_batch(users, agent, max_workers=1, rate_per_second=0,
+                                              admit=lambda: next(admitted)))
+        self.assertEqual(sorted(r['analysis_type'] for r in results), ['ai_powered', 'ai_powered', 'basic'])
+        self.assertEqual([r['ai_insights'] for r in results].count(THROTTLED_INSIGHTS), 1)
+        self.assertEqual(completions.calls, 2)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('h', 'Test histogram.', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, endpoint='chat')
+        self.assertEqual(histogram.render()[2:], [
+            'h_bucket{endpoint="chat",le="0.1"} 1',
+            'h_bucket{endpoint="chat",le="1.0"} 2',
+            'h_bucket{endpoint="chat",le="+Inf"} 3',
+            'h_sum{endpoint="chat"} 5.55',
+            'h_count{endpoint="chat"} 3',
+        ])
+
+
+class RetryBudgetTests(SimpleTestCase):
+    def test_minimum_then_ratio_of_requests(self):
+        budget = RetryBudget(ratio=0.5, min_retries=2)
+        self.assertTrue(budget.try_spend())
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+
+        for _ in range(10):
+            budget.record_request()
+        spent = sum(budget.try_spend() for _ in range(10))
+        self.assertEqual(spent, 3)  # 5 allowed by the ratio, 2 already used
+
+    def test_window_expiry_refills_budget(self):
+        budget = RetryBudget(ratio=0.0, min_retries=1, window_seconds=0.05)
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+        time.sleep(0.06)
+        self.assertTrue(budget.try_spend())
+
+    def test_call_retries_retryable_errors_only(self):
+        policy = Resilience(budget=RetryBudget(min_retries=5), backoff_base=0.0, hedge_delay=0)
+        attempts = []
+
+        def flaky(timeout):
+            attempts.append(timeout)
+            if len(attempts) == 1:
+                raise connection_error()
+            return 'ok'
+
+        self.assertEqual(policy.call('quick_chat', flaky), 'ok')
+        self.assertEqual(len(attempts), 2)
+
+        attempts.clear()
+        with self.assertRaises(ValueError):
+            policy.call('quick_chat', lambda timeout: attempts.append(timeout) or int('x'))
+        self.assertEqual(len(attempts), 1)
+
+    def test_exhausted_budget_stops_retries(self):
+        policy = Resilience(budget=RetryBudget(ratio=0.0, min_retries=0), backoff_base=0.0, hedge_delay=0)
+        attempts = []
+
+        def failing(timeout):
+            attempts.append(timeout)
+            raise connection_error()
+
+        with self.assertRaises(openai.APIConnectionError):
+            policy.call('quick_chat', failing)
+        self.assertEqual(len(attempts), 1)
+
+    def test_every_attempt_holds_its_own_slot(self):
+        completions = StubCompletions(connection_error(), 'second try')
+        agent = stub_agent(StubBackend('primary', completions), max_in_flight=1, coalesce=False)
+
+        result = agent.quick_chat('How do I save?')
+
+        self.assertEqual(result['response'], 'second try')
+        self.assertEqual(completions.calls, 2)
+        self.assertEqual(agent.quota.limiter.snapshot()['in_flight'], 0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def breaker(self):
+        return CircuitBreaker(failure_rate=0.5, min_calls=4, window_seconds=30.0, open_seconds=0.05)
+
+    def test_opens_after_min_calls_at_failure_rate(self):
+        breaker = self.breaker()
+        for ok in (True, False, False):
+            breaker.record(ok)
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record(True)  # 2 of 4 failed
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_allows_one_trial_that_closes(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record(False)
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record(False)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_abandoned_trial_frees_the_slot(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.record(False)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.abandon()
+        self.assertTrue(breaker.allow())
+
+
+class HedgeTests(SimpleTestCase):
+    def policy(self, deadline=2.0):
+        return Resilience(budget=RetryBudget(min_retries=10), backoff_base=0.0, hedge_delay=0.05,
+                          deadlines={'quick_chat': deadline})
+
+    def test_fast_primary_runs_on_the_caller_thread_without_a_hedge(self):
+        threads = []
+        answer = self.policy().call('quick_chat', lambda timeout: threads.append(threading.current_thread()) or 'ok')
+        time.sleep(0.1)
+        self.assertEqual((answer, threads), ('ok', [threading.current_thread()]))
+
+    def test_slow_primary_is_hedged_on_the_pool(self):
+        caller = threading.current_thread()
+        timeouts = []
+
+        def attempt(timeout):
+            timeouts.append(timeout)
+            if threading.current_thread() is caller:
+                time.sleep(0.3)
+                return 'primary'
+            return 'hedge'
+
+        self.assertEqual(self.policy().call('quick_chat', attempt), 'hedge')
+        self.assertEqual(len(timeouts), 2)
+        # The hedge only gets what is left of the deadline
+        self.assertLess(timeouts[1], 2.0 - 0.05 + 0.01)
+
+    def test_hedge_answers_when_the_primary_fails(self):
+        caller = threading.current_thread()
+
+        def attempt(timeout):
+            if threading.current_thread() is caller:
+                time.sleep(0.15)
+                raise ValueError('primary failed')
+            time.sleep(0.05)
+            return 'hedge'
+
+        self.assertEqual(self.policy().call('quick_chat', attempt), 'hedge')
+
+    def test_primary_failing_before_the_delay_sends_no_hedge(self):
+        calls = []
+
+        def attempt(timeout):
+            calls.append(timeout)
+            raise ValueError('bad request')
+
+        with self.assertRaises(ValueError):
+            self.policy().call('quick_chat', attempt)
+        time.sleep(0.1)
+        self.assertEqual(len(calls), 1)
+
+    def test_wait_for_the_hedge_is_bounded_by_the_deadline(self):
+        caller = threading.current_thread()
+
+        def attempt(timeout):
+            if threading.current_thread() is caller:
+                time.sleep(0.1)
+                raise ValueError('primary failed')
+            time.sleep(1.0)
+            return 'too late'
+
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            self.policy(deadline=0.3).call('quick_chat', attempt)
+        self.assertLess(time.monotonic() - start, 0.6)
+
+    def test_async_hedge_wins_without_waiting_for_the_primary(self):
+        calls = []
+
+        async def attempt(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                await asyncio.sleep(1.0)
+                return 'primary'
+            return 'hedge'
+
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(self.policy().acall('quick_chat', attempt)), 'hedge')
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+class RouterTests(SimpleTestCase):
+    def test_kinds_stay_within_their_tier(self):
+        cheap, premium = StubBackend('cheap', tier=1), StubBackend('premium', tier=2)
+        router = ModelRouter([cheap, premium], kind_tiers={'quick_chat': 1}, explore=0)
+        premium.latency_ms, cheap.latency_ms = 10.0, 500.0
+        self.assertEqual(router.choose('quick_chat'), cheap)
+        self.assertEqual(router.choose('get_financial_advice'), premium)
+
+    def test_kind_without_an_eligible_tier_uses_any_backend(self):
+        premium = StubBackend('premium', tier=2)
+        router = ModelRouter([premium], kind_tiers={'quick_chat': 1}, explore=0)
+        self.assertEqual(router.choose('quick_chat'), premium)
+
+    def test_fastest_healthy_backend_first_and_tried_ones_last(self):
+        slow, fast = StubBackend('slow'), StubBackend('fast')
+        router = ModelRouter([slow, fast], explore=0)
+        self.assertEqual(router.choose('quick_chat'), slow)  # untried backends get measured first
+        router.record(slow, 400.0)
+        router.record(fast, 50.0)
+        self.assertEqual(router.choose('quick_chat'), fast)
+        self.assertEqual(router.choose('quick_chat', exclude={'fast'}), slow)
+
+    def test_errors_rank_a_backend_down_but_client_errors_do_not(self):
+        flaky, steady = StubBackend('flaky'), StubBackend('steady')
+        router = ModelRouter([flaky, steady], explore=0)
+        router.record(flaky, 50.0)
+        router.record(steady, 80.0)
+        router.record(flaky, 50.0, status_error(400))
+        self.assertEqual(router.choose('quick_chat'), flaky)
+        for _ in range(3):
+            router.record(flaky, 50.0, status_error(503))
+        self.assertEqual(router.choose('quick_chat'), steady)
+
+    def test_backend_kinds(self):
+        chat_only = StubBackend('chat-only', kinds=['quick_chat'])
+        general = StubBackend('general')
+        router = ModelRouter([chat_only, general], explore=0)
+        self.assertEqual(router.candidates('get_financial_advice'), [general])
+        self.assertEqual(router.display_name('chat-only-model'), 'chat-only-model')
+
+    def test_agent_fails_over_when_primary_circuit_opens(self):
+        primary = StubBackend('primary', StubCompletions(connection_error()), tier=1,
+                              breaker=CircuitBreaker(min_calls=1, open_seconds=60))
+        fallback = StubBackend('fallback', StubCompletions('from fallback'), tier=1)
+        agent = stub_agent(primary, fallback, coalesce=False)
+        primary.latency_ms, fallback.latency_ms = 1.0, 50.0  # primary ranks first
+
+        result = agent.quick_chat('How do I save?')
+
+        self.assertEqual(result['response'], 'from fallback')
+        self.assertEqual(primary.breaker.state, OPEN)
+        self.assertEqual(primary.completions.calls, 1)
+        agent.quick_chat('How do I budget?')
+        self.assertEqual(primary.completions.calls, 1)
+
+
+class ChatSessionTests(TestCase):
+    def test_split_window_keeps_the_newest_turns_within_budget(self):
+        turns = [SimpleNamespace(index=i, tokens=100) for i in range(6)]
+        to_fold, recent = split_window(turns, budget=250, max_turns=4)
+        self.assertEqual(([t.index for t in to_fold], [t.index for t in recent]), ([0, 1, 2, 3], [4, 5]))
+        to_fold, recent = split_window(turns, budget=10_000, max_turns=4)
+        self.assertEqual(len(recent), 4)
+        # A single turn over budget is still sent verbatim
+        self.assertEqual(len(split_window([SimpleNamespace(tokens=900)], budget=100, max_turns=4)[1]), 1)
+
+    def test_merge_summary_drops_the_oldest_lines(self):
+        summary = merge_summary('- one\n- two', ['- three'], budget=4)
+        self.assertEqual(summary, '- two\n- three')
+
+    def test_old_turns_fold_into_the_summary(self):
+        session = create_session({'occupation': 'cab driver'})
+        for i in range(6):
+            session, turn = record_turn(session.pk, f'Question {i}?', f'Answer {i}. More detail.', 'm')
+        self.assertEqual((turn.index, session.turn_count, session.summarized_through), (5, 6, 2))
+        self.assertEqual(session.summary.splitlines(), ['- Asked: Question 0? | Advised: Answer 0.',
+                                                        '- Asked: Question 1? | Advised: Answer 1.'])
+
+    def test_reply_sends_summary_and_recent_turns(self):
+        completions = StubCompletions('Answer')
+        agent = stub_agent(StubBackend('primary', completions))
+        session = create_session({'occupation': 'cab driver'})
+        for i in range(6):
+            result, turn = reply(agent, session, f'Question {i}?')
+            session.refresh_from_db()
+        messages = completions.requests[-1]['messages']
+        self.assertIn('- Asked: Question 0? | Advised: Answer', messages[1]['content'])
+        self.assertEqual([m['content'] for m in messages[1:] if m['role'] == 'user'],
+                         ['Question 1?', 'Question 2?', 'Question 3?', 'Question 4?', 'Question 5?'])
+        self.assertEqual((turn.index, turn.model), (5, 'primary-model'))
+
+    def test_fallback_answers_are_not_stored(self):
+        agent = stub_agent(StubBackend('primary', StubCompletions(status_error(500))))
+        session = create_session()
+        result, turn = reply(agent, session, 'How do I save?')
+        session.refresh_from_db()
+        self.assertEqual((result['success'], turn, session.turn_count), (False, None, 0))
+
+
+class FastPathTests(SimpleTestCase):
+    def test_classify(self):
+        self.assertEqual(classify('How much should my emergency fund be?')[:2], ('emergency_fund', 1.0))
+        self.assertEqual(classify('How much should I save each month?')[0], 'savings_rate')
+        self.assertEqual(classify('How can I save 5000 in 3 months?')[:2], ('savings_goal', 0.95))
+        self.assertEqual(classify('Is 50/30/20 good?')[:2], ('budget_split', 0.7))
+        self.assertEqual(classify('How much should I invest in mutual funds?')[0], None)
+        self.assertEqual(classify('What is inflation?')[0], None)
+
+    def test_answers_only_confident_templatable_questions(self):
+        fast_path = FastPath(min_confidence=0.85)
+        answer = fast_path.answer('How much should I save each month?', {'income': '₹20,000'})
+        self.assertEqual(answer.intent, 'savings_rate')
+        self.assertIn('₹2,000 to ₹4,000', answer.text)
+
+        goal = fast_path.answer('How can I save 6k in 2 months?')
+        self.assertIn('₹3,000 a month', goal.text)
+
+        self.assertIsNone(fast_path.answer('Is 50/30/20 good?', {'income': 20000}))  # low confidence
+        self.assertIsNone(fast_path.answer('How much should I save each month?'))  # no income to use
+        self.assertIsNone(fast_path.answer('How much should I save ' + 'really ' * 30))
+        self.assertEqual(fast_path.stats()['hits'], 2)
+        self.assertEqual(fast_path.stats()['misses'], 3)
+
+    def test_agent_answers_without_the_upstream(self):
+        completions = StubCompletions('from upstream')
+        agent = stub_agent(StubBackend('primary', completions))
+        agent.fast_path = FastPath(min_confidence=0.85)
+        result = agent.quick_chat('How big should my emergency fund be?', {'income': '20000', 'expenses': '15000'})
+        self.assertEqual((result['model'], result['fast_path'], completions.calls), (FAST_PATH_MODEL, 'emergency_fund', 0))
+        self.assertEqual(agent.quick_chat('What is inflation?')['response'], 'from upstream')
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.records = [
+            {'id': 't1', 'amount': 300, 'category': 'food', 'date': self.today.isoformat(), 'type': 'expense'},
+            {'id': 't2', 'amount': 400, 'category': 'fuel', 'date': self.today.isoformat()},
+            {'id': 't3', 'amount': 20000, 'category': 'salary', 'date': self.today.isoformat(), 'type': 'income'},
+            {'id': 't4', 'amount': 'abc', 'category': 'food'},
+        ]
+
+    def test_ingest_folds_rows_into_rollups_once(self):
+        result = ledger.ingest('u1', self.records)
+        self.assertEqual(result, {'ingested': 3, 'duplicates': 0, 'rejected': 1})
+
+        again = ledger.ingest('u1', self.records[:2])
+        self.assertEqual(again, {'ingested': 0, 'duplicates': 2, 'rejected': 0})
+        self.assertEqual(Transaction.objects.filter(user_id='u1').count(), 3)
+
+        daily = {(r.category, r.is_income): (float(r.total), r.count)
+                 for r in DailyRollup.objects.filter(user_id='u1', date=self.today)}
+        self.assertEqual(daily, {('food', False): (300.0, 1), ('fuel', False): (400.0, 1),
+                                 ('salary', True): (20000.0, 1)})
+        ledger.ingest('u1', [{'amount': 50, 'category': 'food', 'date': self.today.isoformat()}])
+        food = CategoryRollup.objects.get(user_id='u1', category='food', is_income=False)
+        self.assertEqual((float(food.total), food.count), (350.0, 2))
+
+    def test_stored_summary_excludes_income(self):
+        ledger.ingest('u1', self.records)
+        summary, recent = ledger.stored_summary('u1')
+
+        self.assertEqual(summary['total_spent'], 700)
+        self.assertEqual(summary['transaction_count'], 2)
+        self.assertNotIn('salary', summary['category_breakdown'])
+        self.assertEqual(summary['all_time']['total'], 700)
+        self.assertNotIn('salary', summary['all_time']['category_breakdown'])
+        self.assertEqual(len(recent), 3)
+
+    def test_stored_summary_window(self):
+        old = (self.today - timedelta(days=200)).isoformat()
+        ledger.ingest('u1', self.records[:2] + [{'amount': 1000, 'category': 'rent', 'date': old}])
+        summary, _ = ledger.stored_summary('u1', days=30)
+        self.assertEqual(summary['total_spent'], 700)
+        self.assertEqual(summary['all_time']['total'], 1700)
+        self.assertIsNone(ledger.stored_summary('nobody'))
+
+    def test_claim_and_owns(self):
+        key = ledger.claim('u1')
+        self.assertTrue(key)
+        self.assertIsNone(ledger.claim('u1'))
+        self.assertTrue(ledger.owns('u1', key))
+        self.assertFalse(ledger.owns('u1', 'wrong'))
+        self.assertFalse(ledger.owns('u1', None))
+
+        ledger.ingest('u2', self.records[:1])
+        self.assertIsNone(ledger.claim('u2'))  # data stored without a key
+        new_key = ledger.issue_key('u1')
+        self.assertTrue(ledger.owns('u1', new_key))
+        self.assertFalse(ledger.owns('u1', key))
+
+    def test_summary_matches_the_ad_hoc_analysis(self):
+        yesterday = (self.today - timedelta(days=1)).isoformat()
+        records = self.records[:3] + [
+            {'id': 't5', 'amount': 120, 'category': 'food', 'date': yesterday},
+            {'id': 't6', 'amount': 900, 'category': 'tips', 'date': yesterday},
+        ]
+        ledger.ingest('u1', records)
+        stored, _ = ledger.stored_summary('u1')
+        ad_hoc = spending_summary(TransactionFrame.from_records(records))
+        for field in ('total_spent', 'category_breakdown', 'transaction_count', 'average_transaction',
+                      'top_categories', 'daily_spending', 'weekly_spending', 'amount_percentiles', 'rolling_7d_average'):
+            self.assertEqual(stored[field], ad_hoc[field], field)
+
+
+class StatementImportTests(TestCase):
+    CSV = (
+        'Txn Date,Narration,Chq./Ref.No.,Withdrawal Amt.,Deposit Amt.\n'
+        '01/03/2024,UPI-SWIGGY-order,,250.00,\n'
+        '01/03/2024,UPI-SWIGGY-order,,250.00,\n'
+        '02/03/2024,NEFT salary credit,REF9,,"18,000.00"\n'
+        '03/03/2024,HPCL petrol pump,,500,\n'
+        'not a date,junk,,1,\n'
+    )
+
+    def test_normalizes_bank_columns(self):
+        records = list(iter_statement(self.CSV.splitlines(keepends=True)))
+        self.assertIsNone(records[-1])
+        food, repeat, salary, fuel = records[:4]
+        self.assertEqual((food['date'], food['amount'], food['type'], food['category']),
+                         ('2024-03-01', 250.0, 'expense', 'food'))
+        self.assertNotEqual(food['id'], repeat['id'])  # two identical purchases stay two
+        self.assertEqual((salary['id'], salary['amount'], salary['type'], salary['category']),
+                         ('REF9', 18000.0, 'income', 'income'))
+        self.assertEqual(fuel['category'], 'fuel')
+
+    def test_json_lines_and_markers(self):
+        lines = [
+            '{"date": "05-Mar-2024", "amount": "1,200 Cr", "description": "refund"}\n',
+            '{"date": "2024-03-06", "amount": "-80", "remarks": "jio recharge"}\n',
+            '[1, 2]\n',
+        ]
+        refund, recharge, bad = iter_statement(lines)
+        self.assertEqual((refund['date'], refund['type'], refund['amount']), ('2024-03-05', 'income', 1200.0))
+        self.assertEqual((recharge['type'], recharge['category']), ('expense', 'mobile'))
+        self.assertIsNone(bad)
+
+    def test_parsers(self):
+        self.assertEqual(parse_amount('₹1,250.50 Dr'), (1250.5, 'dr'))
+        self.assertEqual(parse_amount('(500)'), (500.0, 'dr'))
+        self.assertIsNone(parse_amount('n/a'))
+        self.assertEqual(parse_date('2024-03-01T10:00:00'), '2024-03-01')
+        self.assertEqual(parse_date('1 Mar 24'), '2024-03-01')
+
+    def test_reimport_is_deduplicated(self):
+        lines = list(read_lines(io.BytesIO(('\ufeff' + self.CSV).encode('utf-8'))))
+        first = list(import_batches('u1', lines, batch_size=2))
+        self.assertEqual(len(first), 3)
+        self.assertEqual(first[-1], {'rows': 5, 'ingested': 4, 'duplicates': 0, 'rejected': 1, 'batches': 2})
+
+        second = list(import_batches('u1', lines))[-1]
+        self.assertEqual((second['ingested'], second['duplicates']), (0, 4))
+        self.assertEqual(Transaction.objects.filter(user_id='u1').count(), 4)
+
+    def test_unknown_header_is_rejected(self):
+        with self.assertRaises(ValueError):
+            list(iter_statement(['foo,bar\n', '1,2\n']))
+
+    def test_unsorted_statement_keeps_repeats_apart(self):
+        # The same purchase twice on one day, with a few months of other dates in between
+        lines = ['Date,Narration,Debit,Credit\n', '2024-01-01,Tea stall,20,\n']
+        lines += [f'{date(2024, 1, 2) + timedelta(days=i)},Fuel {i},300,\n' for i in range(90)]
+        lines += ['2024-01-01,Tea stall,20,\n']
+        stats = list(import_batches('u1', lines))[-1]
+        self.assertEqual((stats['ingested'], stats['duplicates']), (92, 0))
+        self.assertEqual(list(import_batches('u1', lines))[-1]['duplicates'], 92)
+
+
+@mock.patch.dict(os.environ, {'ADVICE_JOB_WORKERS': '0'})
+class AdviceJobTests(TestCase):
+    def test_claim_is_exclusive(self):
+        job = jobs.submit({'occupation': 'cab driver'})
+        claimed = jobs.claim('w1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (AdviceJob.RUNNING, 'w1', 1))
+        self.assertIsNone(jobs.claim('w2'))
+
+        self.assertTrue(jobs.finish(claimed, result={'success': True}))
+        self.assertEqual(AdviceJob.objects.get(pk=job.pk).status, AdviceJob.SUCCEEDED)
+
+    def test_expired_lease_requeues_then_fails(self):
+        job = jobs.submit({})
+        first = jobs.claim('w1')
+        AdviceJob.objects.filter(pk=job.pk).update(lease_until=timezone.now() - timedelta(seconds=1))
+        jobs.maintain()
+        self.assertEqual(AdviceJob.objects.get(pk=job.pk).status, AdviceJob.QUEUED)
+        self.assertFalse(jobs.finish(first, result={}))  # the dead worker's late result is dropped
+
+        second = jobs.claim('w2')
+        self.assertEqual(second.attempts, 2)
+        AdviceJob.objects.filter(pk=job.pk).update(lease_until=timezone.now() - timedelta(seconds=1))
+        with mock.patch.object(jobs, 'MAX_ATTEMPTS', 2):
+            jobs.maintain()
+        self.assertEqual(AdviceJob.objects.get(pk=job.pk).status, AdviceJob.FAILED)
+
+    def test_queued_job_expires(self):
+        job = jobs.submit({})
+        AdviceJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(jobs.claim('w1'))
+        jobs.maintain()
+        self.assertEqual(AdviceJob.objects.get(pk=job.pk).status, AdviceJob.EXPIRED)
+
+    def test_cancel_only_queued_jobs(self):
+        queued, running = jobs.submit({}), jobs.submit({})
+        AdviceJob.objects.filter(pk=running.pk).update(status=AdviceJob.RUNNING)
+        self.assertTrue(jobs.cancel(queued.pk))
+        self.assertEqual(AdviceJob.objects.get(pk=queued.pk).status, AdviceJob.CANCELLED)
+        self.assertFalse(jobs.cancel(queued.pk))
+        self.assertFalse(jobs.cancel(running.pk))
+        self.assertIsNone(jobs.claim('w1'))
+
+    def test_queue_limit(self):
+        with mock.patch.object(jobs, 'MAX_QUEUED', 1):
+            jobs.submit({})
+            with self.assertRaises(jobs.QueueFull):
+                jobs.submit({})
+
+    def test_await_job_long_polls_until_finished(self):
+        job = jobs.submit({})
+        start = time.monotonic()
+        waited = async_to_sync(jobs.await_job)(job.pk, 0.2, interval=0.05)
+        self.assertEqual(waited.status, AdviceJob.QUEUED)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+        jobs.finish(jobs.claim('w1'), result={'success': True})
+        start = time.monotonic()
+        self.assertEqual(async_to_sync(jobs.await_job)(job.pk, 5).status, AdviceJob.SUCCEEDED)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertIsNone(async_to_sync(jobs.await_job)('00000000-0000-0000-0000-000000000000', 5))
+
+
+class ForecastingTests(TestCase):
+    def history(self, days=56, income=1000, spending=700):
+        start = date(2024, 1, 1)
+        transactions = []
+        for i in range(days):
+            day = (start + timedelta(days=i)).isoformat()
+            transactions.append({'amount': income, 'category': 'payout', 'type': 'income', 'date': day})
+            transactions.append({'amount': spending, 'category': 'food', 'date': day})
+        return transactions
+
+    def test_savings_risk_level(self):
+        self.assertEqual(savings_risk_level('1000', '20000'), 'High Risk')
+        self.assertEqual(savings_risk_level(4000, 20000), 'Medium Risk')
+        self.assertEqual(savings_risk_level('8000', '20000'), 'Low Risk')
+        for savings, expenses in (('abc', '20000'), (None, 20000), (1000, 0)):
+            self.assertEqual(savings_risk_level(savings, expenses), 'Unknown')
+
+    def test_short_history_gives_no_forecast(self):
+        self.assertIsNone(cash_flow_forecast(self.history(days=20)))
+        self.assertIsNone(cash_flow_forecast([]))
+
+    def test_steady_earner(self):
+        result = cash_flow_forecast(self.history(), savings='10000')
+        self.assertEqual((result['history_days'], result['income']['stability']), (56, 'stable'))
+        self.assertAlmostEqual(result['forecast']['expected_net'], 9000, delta=1)
+        self.assertEqual((result['forecast']['shortfall_probability'], result['risk_level']), (0.0, 'Low Risk'))
+        self.assertIn('- Next 30 days: expected income ₹30,000, spending ₹21,000, net ₹9,000 (1-in-10 chance below ₹9,000)',
+                      forecast_lines(result))
+
+    def test_window_round_trip_and_advance(self):
+        frame = TransactionFrame.from_records(self.history(days=10))
+        window = CashFlowWindow.from_frame(frame, size=7)
+        restored = CashFlowWindow.from_dict(window.to_dict())
+        self.assertEqual((str(restored.end), restored.income.tolist()), ('2024-01-10', [1000.0] * 7))
+        restored.add(np.array(['2024-01-12'], dtype='datetime64[D]'), np.array([500.0]), np.array([False]))
+        self.assertEqual(restored.spending.tolist(), [700.0] * 5 + [0.0, 500.0])
+
+    def test_stored_forecast_matches_the_ad_hoc_one(self):
+        transactions = self.history()
+        for i, t in enumerate(transactions):
+            t['id'] = f't{i}'
+        ledger.ingest('u1', transactions[:60])
+        ledger.ingest('u1', transactions[60:])
+        self.assertEqual(ledger.stored_summary('u1')[0]['cash_flow'], cash_flow_forecast(transactions))
+
+
+class PromptTemplateTests(SimpleTestCase):
+    def test_undeclared_placeholders_are_rejected(self):
+        with self.assertRaises(ValueError):
+            prompts.PromptTemplate('t', 'v1', 'system', 'Hello {name} {age}', fields={'name': 'you'})
+
+    def test_fields_are_coerced(self):
+        template = prompts.get_template('quick_chat')
+        fields = template.coerce({'income': '  20000 ', 'occupation': 'x' * 500, 'location': ''})
+        self.assertEqual(fields['income'], '20000')
+        self.assertEqual(len(fields['occupation']), prompts.MAX_FIELD_CHARS)
+        self.assertEqual((fields['location'], fields['expenses']), ('India', 'N/A'))
+
+    def test_requests_share_the_system_prefix(self):
+        completions = StubCompletions('ok')
+        agent = stub_agent(StubBackend('a', completions))
+        agent.quick_chat('How do I save?')
+        agent.quick_chat('Should I buy gold?', {'income': '30000'})
+        first, second = (request['messages'] for request in completions.requests)
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[0]['content'], prompts.QUICK_CHAT_SYSTEM_PROMPT)
+        self.assertIn('Should I buy gold?', second[-1]['content'])
+
+    def test_variant_selection(self):
+        self.assertEqual(prompts.get_template('financial_advice').key, 'financial_advice/v2')
+        with mock.patch.dict(prompts.VARIANTS, {'financial_advice': 'compact', 'quick_chat': 'missing'}):
+            compact = prompts.get_template('financial_advice')
+            self.assertEqual((compact.key, compact.digest_tokens), ('financial_advice/v2/compact', 200))
+            self.assertEqual(prompts.get_template('quick_chat').key, 'quick_chat/v1')
+            self.assertEqual(prompts.template_stats()['financial_advice']['key'], 'financial_advice/v2/compact')
+        default = prompts.get_template('financial_advice')
+        self.assertLess(compact.static_tokens, default.static_tokens)
+
+    def test_selected_variants_parsing(self):
+        with mock.patch.dict(os.environ, {'PROMPT_VARIANTS': ' financial_advice = compact,broken,=x'}):
+            self.assertEqual(prompts._selected_variants(), {'financial_advice': 'compact'})
+
+
+class UpstreamLimiterTests(SimpleTestCase):
+    def test_caps_in_flight_and_times_out(self):
+        limiter = UpstreamLimiter(max_in_flight=1, queue_timeout=0.05)
+        with limiter.slot('a'):
+            self.assertEqual(limiter.snapshot()['in_flight'], 1)
+            with self.assertRaises(UpstreamBusy):
+                with limiter.slot('b'):
+                    pass
+            self.assertEqual(limiter.snapshot()['waiting'], 0)
+        self.assertEqual(limiter.snapshot()['in_flight'], 0)
+
+    def test_waiting_clients_are_served_round_robin(self):
+        limiter = UpstreamLimiter(max_in_flight=1, queue_timeout=2.0)
+        order = []
+
+        def call(client, name):
+            with limiter.slot(client):
+                order.append(name)
+
+        threads = []
+        with limiter.slot('holder'):
+            for client, name in (('a', 'a1'), ('a', 'a2'), ('b', 'b1')):
+                thread = threading.Thread(target=call, args=(client, name))
+                thread.start()
+                threads.append(thread)
+                while limiter.snapshot()['waiting'] < len(threads):
+                    time.sleep(0.005)
+        for thread in threads:
+            thread.join(2)
+
+        self.assertEqual(order, ['a1', 'b1', 'a2'])
+        self.assertEqual(limiter.snapshot()['in_flight'], 0)
+
+    def test_async_slot_cancelled_while_queued_leaves_the_queue(self):
+        limiter = UpstreamLimiter(max_in_flight=1, queue_timeout=2.0)
+
+        async def run():
+            async with limiter.aslot('a'):
+                async def wait():
+                    async with limiter.aslot('b'):
+                        pass
+                waiter = asyncio.ensure_future(wait())
+                await asyncio.sleep(0.02)
+                self.assertEqual(limiter.snapshot()['waiting'], 1)
+                waiter.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiter
+                self.assertEqual(limiter.snapshot()['waiting'], 0)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.snapshot()['in_flight'], 0)
+
+
+class TokenBudgetTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_charge_level_and_retry_after(self):
+        budget = TokenBudget(600, prefix='test_tokens')  # 10 tokens a second
+        self.assertEqual(budget.level('a'), 600)
+        budget.charge('a', 700)
+        self.assertAlmostEqual(budget.level('a'), -100, delta=1)
+        self.assertAlmostEqual(budget.retry_after('a'), 10.1, delta=0.1)
+        self.assertEqual(budget.level('b'), 600)
+        budget.charge('a', -200)  # refund
+        self.assertAlmostEqual(budget.level('a'), 100, delta=1)
+        self.assertEqual(budget.retry_after('a'), 0.0)
+
+    def test_disabled_budget_never_limits(self):
+        budget = TokenBudget(0, prefix='test_tokens')
+        budget.charge('a', 10_000)
+        self.assertFalse(budget.enabled)
+        self.assertEqual(budget.retry_after('a'), 0.0)
+
+    def test_reservation_is_charged_once_and_settled_to_usage(self):
+        quota = UpstreamQuota(UpstreamLimiter(max_in_flight=2), TokenBudget(6000, prefix='test_client'),
+                              TokenBudget(60000, prefix='test_global'))
+        request = {'messages': [{'role': 'user', 'content': 'How much should I save?'}], 'max_tokens': 200}
+        with quota.reserve(request) as reservation:
+            for _ in range(2):  # a retry
+                with quota.attempt(reservation):
+                    pass
+            self.assertAlmostEqual(quota.client_budget.level(reservation.client), 6000 - reservation.reserved, delta=1)
+            reservation.settle(SimpleNamespace(total_tokens=50))
+        self.assertAlmostEqual(quota.client_budget.level(reservation.client), 5950, delta=1)
+        self.assertAlmostEqual(quota.global_budget.level(GLOBAL_KEY), 59950, delta=1)
+
+    def test_call_that_never_started_is_not_charged(self):
+        quota = UpstreamQuota(UpstreamLimiter(max_in_flight=1, queue_timeout=0.02),
+                              TokenBudget(6000, prefix='test_client'), TokenBudget(0, prefix='test_global'))
+        request = {'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 200}
+        with quota.limiter.slot('other'):
+            with quota.reserve(request) as reservation:
+                with self.assertRaises(UpstreamBusy):
+                    with quota.attempt(reservation):
+                        pass
+        self.assertEqual(quota.client_budget.level(reservation.client), 6000)
+
+    def test_agent_charges_response_usage(self):
+        agent = stub_agent(StubBackend('primary', StubCompletions('Save 10%.')), client_tokens=6000)
+        token = current_client.set('client-a')
+        try:
+            agent.quick_chat('How do I save?')
+        finally:
+            current_client.reset(token)
+        self.assertAlmostEqual(agent.quota.client_budget.level('client-a'), 5950, delta=1)
+
+
+class SectionCompletions(StubCompletions):
+    """Answers each advice section with its name; `failing` sections raise"""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = failing
+
+    def section(self, request):
+        system = request['messages'][0]['content']
+        return next(name for name, title, _ in prompts.ADVICE_SECTIONS if f"the {title} section" in system)
+
+    def _next(self, model, request):
+        name = self.section(request)
+        with self._lock:
+            self.calls += 1
+            self.requests.append(request)
+        if name in self.failing:
+            raise status_error(400)
+        return completion(model, f'{name} advice')
+
+
+class AsyncSectionCompletions(SectionCompletions):
+    """Async variant; `slow` sections take `delay` seconds"""
+
+    def __init__(self, failing=(), slow=(), delay=0.5):
+        super().__init__(failing)
+        self.slow, self.slow_delay = slow, delay
+
+    async def create(self, model, timeout=None, stream=False, **request):
+        if self.section(request) in self.slow:
+            await asyncio.sleep(self.slow_delay)
+        return self._next(model, request)
+
+
+class AdviceFanoutTests(SimpleTestCase):
+    USER = {'occupation': 'delivery driver', 'fanout': True}
+
+    def agent(self, completions=None, async_completions=None, section_deadline=12.0):
+        resilience = Resilience(budget=RetryBudget(min_retries=10), backoff_base=0.0, hedge_delay=0,
+                                deadlines={'advice_section': section_deadline})
+        return stub_agent(StubBackend('primary', completions, async_completions), resilience=resilience)
+
+    def test_sections_are_merged_in_order(self):
+        completions = SectionCompletions()
+        result = self.agent(completions).get_financial_advice(self.USER)
+        self.assertEqual(completions.calls, 4)
+        self.assertTrue(result['advice'].startswith('1. FINANCIAL HEALTH ASSESSMENT\nhealth advice\n\n2. RISK ANALYSIS'))
+        self.assertEqual({section['status'] for section in result['sections'].values()}, {'ok'})
+
+    def test_failed_section_gets_its_fallback(self):
+        completions = SectionCompletions(failing=('risks',))
+        result = self.agent(completions).get_financial_advice(self.USER)
+        self.assertIn(SECTION_FALLBACKS['risks'], result['advice'])
+        self.assertEqual((result['sections']['risks']['status'], result['sections']['tips']['status']), ('error', 'ok'))
+
+    def test_all_sections_failing_falls_back(self):
+        completions = SectionCompletions(failing=tuple(SECTION_FALLBACKS))
+        result = self.agent(completions).get_financial_advice(self.USER)
+        self.assertFalse(result['success'])
+        self.assertIn('fallback_advice', result)
+
+    def test_slow_section_misses_its_deadline(self):
+        agent = self.agent(async_completions=AsyncSectionCompletions(slow=('tips',)), section_deadline=0.1)
+        started = time.perf_counter()
+        result = async_to_sync(agent.aget_financial_advice)(self.USER)
+        self.assertLess(time.perf_counter() - started, 0.45)
+        self.assertEqual(result['sections']['tips']['status'], 'timeout')
+        self.assertIn(SECTION_FALLBACKS['tips'], result['advice'])
+        self.assertIn('health advice', result['advice'])
+
+    def test_fanout_flag(self):
+        agent = self.agent()
+        self.assertTrue(agent._fanout_requested({'fanout': 'yes'}))
+        self.assertFalse(agent._fanout_requested({'fanout': 'false'}))
+        with mock.patch('agents.financial_crew.ADVICE_FANOUT', True):
+            self.assertTrue(agent._fanout_requested({}))
+
+
+class PackIndexTests(SimpleTestCase):
+    def setUp(self):
+        grid = persona_grid(('delivery driver',), ('15000-25000', '25000-40000'), ('1-2 members', '3-4 members'))
+        self.index = PackIndex('test', {key: {'profile': profile, 'result': {'success': True}}
+                                        for key, profile in grid})
+
+    def test_exact_and_nearest_persona(self):
+        key, _, match = self.index.nearest({'occupation': 'Swiggy rider', 'income_range': '20000',
+                                            'family_size': '4'})
+        self.assertEqual(key, 'delivery driver|15000-25000|3-4 members')
+        self.assertTrue(match['exact'])
+
+        key, _, match = self.index.nearest({'occupation': 'delivery', 'income_range': '45000',
+                                            'family_size': '1', 'monthly_expenses': '38000'})
+        self.assertEqual(key, 'delivery driver|25000-40000|1-2 members')
+        self.assertFalse(match['exact'])
+
+    def test_no_pack_when_profile_differs(self):
+        base = {'occupation': 'delivery driver', 'income_range': '20000', 'family_size': '4'}
+        self.assertIsNotNone(self.index.nearest(dict(base, monthly_expenses='17000', current_savings='6000')))
+        self.assertIsNone(self.index.nearest(dict(base, income_range='90000')))
+        self.assertIsNone(self.index.nearest(dict(base, occupation='cab driver')))
+        self.assertIsNone(self.index.nearest(dict(base, monthly_expenses='25000')))
+        self.assertIsNone(self.index.nearest(dict(base, current_savings='0')))
+        self.assertIsNone(self.index.nearest(dict(base, goals='buy a house')))
+
+    def test_occupations_match_whole_words(self):
+        self.assertEqual(persona_occupation('Ola cab driver'), 'cab driver')
+        self.assertEqual(persona_occupation('auto-rickshaw'), 'auto driver')
+        self.assertEqual(persona_occupation('Zomato riders'), 'delivery driver')
+        self.assertEqual(persona_occupation(''), 'gig worker')
+        for occupation in ('solar panel installer', 'vocabulary tutor', 'teacher'):
+            self.assertIsNone(persona_occupation(occupation))
+
+    def test_no_pack_for_an_unknown_occupation(self):
+        grid = persona_grid(('gig worker',), ('15000-25000',), ('3-4 members',))
+        index = PackIndex('test', {key: {'profile': profile, 'result': {'success': True}} for key, profile in grid})
+        base = {'occupation': 'teacher', 'income_range': '20000', 'family_size': '4'}
+        self.assertIsNone(index.nearest(base))
+        self.assertEqual(index.nearest(dict(base, occupation=''))[0], 'gig worker|15000-25000|3-4 members')
@@ -0,0 +1,260 @@
+from contextvars import ContextVar
+from functools import wraps
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from agents import jobs
+from agents.analytics import TransactionFrame
+from agents.chat_sessions import areply
+from agents.metrics import stage
+from agents.models import AdviceJob, ChatSession
+from agents.ratelimit import current_client
+
+from .renderers import compact, compact_requested, dumps
+from .streaming import EventStreamEncoder, event_stream_response, stream_requested
+from .throttling import check_throttles
+from .views import (
+    AGENT_AVAILABLE, ADVICE_REQUIRED_FIELDS, QUICK_CHAT_EXAMPLE, SPENDING_EXAMPLE,
+    advice_payload, basic_spending_analysis, chat_message_payload, error_payload, job_payload, job_requested,
+    job_wait_seconds, owns_user, quick_chat_payload, served_pack, spending_ai_outcome, spending_days,
+    spending_payload, stored_spending, user_not_found, with_stored_profile,
+)
+
+if AGENT_AVAILABLE:
+    from agents.llm_client import get_agent
+
+# Async twins of the LLM-backed views in api/views.py, served when the app runs
+# under ASGI (SERVER_MODE=asgi) so one worker can hold many upstream calls in flight.
+# DRF 3.14 has no async @api_view, so these are plain Django async views; bodies go
+# through the same DRF parsers, so both modes accept (and reject) the same requests.
+
+# Compact mode for the current request (set by async_api_view, see api.renderers)
+compact_response = ContextVar('compact_response', default=False)
+
+def json_response(data, status=200):
+    """JSON response encoded like the DRF views, timed as the serialization stage"""
+    if compact_response.get():
+        data = compact(data)
+    with stage('serialization'):
+        return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+def parse_data(request):
+    """Request body through the parsers the DRF views use (JSON, form, multipart)"""
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+
+def async_api_view(methods):
+    """Minimal async counterpart of DRF's @api_view for JSON endpoints (default throttles included)"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                                    status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            # Throttles may touch the session / user, which is sync-only
+            client, wait = await sync_to_async(check_throttles)(request)
+            current_client.set(client)
+            if wait is not None:
+                seconds = math.ceil(wait)
+                response = JsonResponse({'detail': f'Request was throttled. Expected available in {seconds} seconds.'},
+                                        status=status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = str(seconds)
+                return response
+            try:
+                request.data = parse_data(request)
+            except UnsupportedMediaType as e:
+                return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            except ParseError as e:
+                return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+            compact_response.set(compact_requested(request))
+            return await view(request, *args, **kwargs)
+
+        # Same as DRF: token-less JSON API, no CSRF
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+@async_api_view(['POST'])
+async def quick_financial_chat(request):
+    """Quick chat with Cerebras-powered financial agent (async)"""
+    start_time = time.time()
+
+    try:
+        question = request.data.get('question', '')
+        context = request.data.get('context', {})
+
+        if not question:
+            return json_response(error_payload('No question provided', example=QUICK_CHAT_EXAMPLE),
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        if AGENT_AVAILABLE:
+            try:
+                agent = get_agent()
+
+                if stream_requested(request):
+                    encoder = EventStreamEncoder(quick_chat_payload, 'response', start_time)
+                    return event_stream_response(
+                        encoder.aiter_frames(agent.astream_quick_chat(question, context)))
+
+                result = await agent.aquick_chat(question, context)
+                return json_response(quick_chat_payload(result, start_time))
+
+            except Exception as e:
+                return json_response(error_payload(f'Agent error: {str(e)}'),
+                                    status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        else:
+            return json_response(error_payload('Financial agent not available. Please check configuration.'),
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    except Exception as e:
+        return json_response(error_payload(f'Request processing error: {str(e)}'),
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_api_view(['POST'])
+async def chat_session_message(request, session_id):
+    """Ask a follow-up question inside a chat session (async)"""
+    start_time = time.time()
+
+    try:
+        question = request.data.get('question', '')
+        context = request.data.get('context') or {}
+
+        if not question:
+            return json_response(error_payload('No question provided', example={'question': QUICK_CHAT_EXAMPLE['question']}),
+                                 status=status.HTTP_400_BAD_REQUEST)
+
+        session = await ChatSession.objects.filter(pk=session_id).afirst()
+        if session is None:
+            return json_response(error_payload('Chat session not found'), status=status.HTTP_404_NOT_FOUND)
+
+        if not AGENT_AVAILABLE:
+            return json_response(error_payload('Financial agent not available. Please check configuration.'),
+                                 status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        result, turn = await areply(get_agent(), session, question, context)
+        return json_response(chat_message_payload(result, turn, session.pk, start_time))
+
+    except Exception as e:
+        return json_response(error_payload(f'Request processing error: {str(e)}'),
+                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_api_view(['POST'])
+async def get_financial_advice(request):
+    """Comprehensive financial coaching using Cerebras AI (async)"""
+    start_time = time.time()
+
+    try:
+        user_data = request.data
+
+        if not user_data:
+            return json_response(error_payload('No user data provided', required_fields=ADVICE_REQUIRED_FIELDS),
+                                status=status.HTTP_400_BAD_REQUEST)
+        if user_data.get('user_id') and not await sync_to_async(owns_user)(request, user_data['user_id']):
+            return json_response(user_not_found(user_data['user_id']), status=status.HTTP_404_NOT_FOUND)
+        user_data = await sync_to_async(with_stored_profile)(user_data)
+
+        if AGENT_AVAILABLE:
+            try:
+                if job_requested(request):
+                    job = await sync_to_async(jobs.submit)(
+                        {k: v for k, v in user_data.items() if k not in ('async', 'stream')})
+                    response = json_response(job_payload(job), status=status.HTTP_202_ACCEPTED)
+                    response['Location'] = f'/api/jobs/{job.pk}/'
+                    return response
+
+                if stream_requested(request):
+                    encoder = EventStreamEncoder(advice_payload, 'advice', start_time)
+                    return event_stream_response(
+                        encoder.aiter_frames(get_agent().astream_financial_advice(user_data)))
+
+                pack = await sync_to_async(served_pack)(user_data, start_time)
+                if pack is not None:
+                    return json_response(pack)
+
+                advice_result = await get_agent().aget_financial_advice(user_data)
+                return json_response(advice_payload(advice_result, start_time))
+
+            except jobs.QueueFull as e:
+                return json_response(error_payload(str(e)), status=status.HTTP_429_TOO_MANY_REQUESTS)
+            except Exception as e:
+                return json_response(error_payload(f'Financial analysis error: {str(e)}'),
+                                    status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        else:
+            return json_response(error_payload('Financial agent not available'),
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    except Exception as e:
+        return json_response(error_payload(f'Request error: {str(e)}'),
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_api_view(['GET', 'DELETE'])
+async def advice_job(request, job_id):
+    """Advice job state with async long-polling (?wait=seconds); DELETE cancels a queued job"""
+    if request.method == 'DELETE':
+        if await sync_to_async(jobs.cancel)(job_id):
+            return json_response(job_payload(await AdviceJob.objects.aget(pk=job_id)))
+        job = await AdviceJob.objects.filter(pk=job_id).afirst()
+        if job is None:
+            return json_response(error_payload('Job not found'), status=status.HTTP_404_NOT_FOUND)
+        return json_response(error_payload(f'Job is {job.status} and can no longer be cancelled'),
+                             status=status.HTTP_409_CONFLICT)
+
+    job = await jobs.await_job(job_id, job_wait_seconds(request.GET))
+    if job is None:
+        return json_response(error_payload('Job not found'), status=status.HTTP_404_NOT_FOUND)
+    return json_response(job_payload(job))
+
+@async_api_view(['POST'])
+async def analyze_spending_pattern(request):
+    """AI-powered spending pattern analysis (async)"""
+    start_time = time.time()
+
+    try:
+        transactions = request.data.get('transactions', [])
+        user_context = request.data.get('user_context', {})
+        user_id = request.data.get('user_id')
+        summary = None
+
+        if not transactions and user_id:
+            # Stored history: read the precomputed rollups instead of a resent list
+            stored = None
+            if await sync_to_async(owns_user)(request, user_id):
+                stored = await sync_to_async(stored_spending)(str(user_id), spending_days(request.data))
+            if stored is None:
+                return json_response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+            transactions, frame, summary = stored
+            basic_analysis = summary
+        elif not transactions:
+            return json_response(error_payload('No transaction data provided', example=SPENDING_EXAMPLE),
+                                status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Parse once; the agent reuses the same columns
+            frame = TransactionFrame.from_records(transactions)
+            basic_analysis = basic_spending_analysis(frame)
+
+        if AGENT_AVAILABLE:
+            try:
+                agent = get_agent()
+                ai_result = await agent.aanalyze_spending_with_ai(transactions, user_context, frame=frame,
+                                                                  summary=summary)
+                ai_insights, analysis_type = spending_ai_outcome(ai_result)
+                return json_response(spending_payload(basic_analysis, ai_insights, analysis_type, start_time))
+
+            except Exception as e:
+                return json_response(spending_payload(
+                    basic_analysis, f'AI analysis error: {str(e)}. Basic analysis provided.',
+                    'basic_fallback', start_time))
+        else:
+            return json_response(spending_payload(
+                basic_analysis, 'AI analysis not available. Showing basic spending breakdown.',
+                'basic_only', start_time))
+
+    except Exception as e:
+        return json_response(error_payload(f'Analysis error: {str(e)}'),
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,252 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+# Load-test harness for the /api/* endpoints (used by `manage.py benchmark`).
+# Starts a mock OpenAI-compatible upstream and the app under gunicorn (WSGI or
+# ASGI workers), then drives each endpoint at a fixed concurrency and reports
+# throughput, latency percentiles and error rate per endpoint.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILE = {'income': '20000', 'expenses': '18000', 'occupation': 'delivery driver', 'location': 'Mumbai'}
+
+TRANSACTIONS = [
+    {'amount': 250 + (i * 37) % 400, 'category': category, 'date': f'2024-01-{1 + i % 28:02d}',
+     'description': f'{category} purchase'}
+    for i, category in enumerate(['food', 'fuel', 'rent', 'mobile', 'food', 'transport', 'groceries', 'fuel'] * 5)
+]
+
+
+class Scenario:
+    """One endpoint: how to build the nth request"""
+
+    def __init__(self, name, method, path, body=None, stream=False, needs_session=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.stream = stream
+        self.needs_session = needs_session
+
+    def request(self, n, session_id=None):
+        path = self.path.format(session_id=session_id)
+        body = self.body(n) if callable(self.body) else self.body
+        headers = {'Accept': 'text/event-stream'} if self.stream else {}
+        return path, body, headers
+
+
+def _question(n):
+    # Unique per request so the response cache and single-flight don't hide upstream latency
+    return f'How can I manage irregular income this week? (request {n})'
+
+
+SCENARIOS = [
+    Scenario('health', 'GET', '/api/health/'),
+    Scenario('liveness', 'GET', '/api/health/live/'),
+    Scenario('readiness', 'GET', '/api/health/ready/'),
+    Scenario('metrics', 'GET', '/api/metrics/'),
+    Scenario('quick_chat', 'POST', '/api/quick-chat/', lambda n: {'question': _question(n), 'context': PROFILE}),
+    Scenario('quick_chat_stream', 'POST', '/api/quick-chat/',
+             lambda n: {'question': _question(n), 'context': PROFILE}, stream=True),
+    Scenario('quick_chat_fast_path', 'POST', '/api/quick-chat/',
+             {'question': 'How big should my emergency fund be?', 'context': PROFILE}),
+    Scenario('financial_advice', 'POST', '/api/financial-advice/', lambda n: {
+        'income_pattern': 'irregular', 'income_range': '15000-25000', 'occupation': 'delivery driver',
+        'monthly_expenses': '15000', 'current_savings': str(2000 + n), 'goals': 'emergency fund',
+        'transactions': TRANSACTIONS}),
+    Scenario('analyze_spending', 'POST', '/api/analyze-spending/',
+             lambda n: {'transactions': TRANSACTIONS, 'user_context': dict(PROFILE, request=n)}),
+    Scenario('batch_analyze_spending', 'POST', '/api/batch/analyze-spending/', {
+        'users': [{'user_id': i, 'transactions': TRANSACTIONS} for i in range(20)], 'include_ai': False}),
+    Scenario('chat_session_message', 'POST', '/api/chat/sessions/{session_id}/messages/',
+             lambda n: {'question': _question(n)}, needs_session=True),
+    Scenario('test', 'POST', '/api/test/', {'ping': 'pong'}),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def start_mock_upstream(latency, token_rate, error_rate=0.0):
+    """Mock LLM in its own process so it doesn't compete with the load generator for the GIL"""
+    port = free_port()
+    command = [sys.executable, 'manage.py', 'mock_llm', '--port', str(port), '--latency', str(latency),
+               '--token-delay', str(1.0 / token_rate if token_rate > 0 else 0), '--error-rate', str(error_rate)]
+    process = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}/v1'
+    if not wait_until_up(f'{base_url}/models'):
+        process.terminate()
+        raise RuntimeError('Mock LLM server did not start')
+    return process, base_url
+
+
+def start_app(mode, upstream_url, workers, extra_env=None):
+    """Run the app under gunicorn in WSGI or ASGI mode against the mock upstream"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'SERVER_MODE': mode,
+        'ASYNC_API_VIEWS': 'True' if mode == 'asgi' else 'False',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'LLM_BASE_URL': upstream_url,
+        'LLM_BACKENDS': '',
+        'CEREBRAS_API_KEY': env.get('CEREBRAS_API_KEY') or 'benchmark',
+        'DEBUG': 'False',
+        # One load generator is one client: measure the service, not the per-client limits
+        'THROTTLE_CLIENT_RATE': 'none',
+        'THROTTLE_LLM_RATE': 'none',
+        'LLM_CLIENT_TOKENS_PER_MINUTE': '0',
+    })
+    env.update(extra_env or {})
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    if not wait_until_up(f'{url}/api/health/live/'):
+        process.terminate()
+        raise RuntimeError(f'App did not start in {mode} mode')
+    return process, url
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def _one(client, scenario, n, session_id):
+    """(latency_s, ttfb_s, ok) for one request"""
+    path, body, headers = scenario.request(n, session_id)
+    start = time.perf_counter()
+    try:
+        async with client.stream(scenario.method, path, json=body, headers=headers) as response:
+            ttfb = time.perf_counter() - start
+            async for _ in response.aiter_bytes():
+                pass
+            ok = response.status_code < 400
+    except httpx.HTTPError:
+        return time.perf_counter() - start, None, False
+    return time.perf_counter() - start, ttfb, ok
+
+
+async def drive(url, scenario, requests, concurrency, timeout=60.0):
+    """Send `requests` requests with at most `concurrency` in flight; returns the raw samples"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        # A client has one message in flight per session, so each worker gets its own
+        sessions = [None] * concurrency
+        if scenario.needs_session:
+            for i in range(concurrency):
+                response = await client.post('/api/chat/sessions/', json={'context': PROFILE})
+                if response.status_code != 201:
+                    return None
+                sessions[i] = response.json()['session_id']
+
+        counter = itertools.count()
+        samples = []
+
+        async def worker(session_id):
+            while True:
+                n = next(counter)
+                if n >= requests:
+                    return
+                samples.append(await _one(client, scenario, n, session_id))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session_id) for session_id in sessions))
+        return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    latencies = np.array([latency for latency, _, _ in samples]) * 1000
+    ttfbs = np.array([ttfb for _, ttfb, _ in samples if ttfb is not None]) * 1000
+    errors = sum(1 for _, _, ok in samples if not ok)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'ttfb_p50_ms': round(float(np.percentile(ttfbs, 50)), 2) if len(ttfbs) else None,
+    }
+
+
+def run_mode(url, scenarios, requests, concurrency, warmup=5):
+    """Benchmark every scenario against a running app; {scenario name: summary}"""
+    results = {}
+    for scenario in scenarios:
+        if warmup:
+            asyncio.run(drive(url, scenario, warmup, min(warmup, concurrency)))
+        outcome = asyncio.run(drive(url, scenario, requests, concurrency))
+        if outcome is None:
+            results[scenario.name] = {'skipped': 'could not set up scenario (are migrations applied?)'}
+            continue
+        results[scenario.name] = summarize(*outcome)
+    return results
+
+
+def regressions(results, baseline, tolerance=0.2):
+    """Lines describing p95 / throughput / error-rate regressions against a previous report"""
+    problems = []
+    for mode, endpoints in results.items():
+        for name, current in endpoints.items():
+            previous = baseline.get(mode, {}).get(name)
+            if not previous or 'p95_ms' not in previous or 'p95_ms' not in current:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                problems.append(f"{mode} {name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+                problems.append(f"{mode} {name}: throughput {previous['throughput_rps']} -> "
+                                f"{current['throughput_rps']} req/s")
+            if current['error_rate'] > previous['error_rate'] + 0.01:
+                problems.append(f"{mode} {name}: error rate {previous['error_rate']} -> {current['error_rate']}")
+    return problems
+
+
+def format_table(results):
+    lines = []
+    header = f"{'endpoint':<24}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    for mode, endpoints in results.items():
+        lines += ['', f'[{mode}]', header, '-' * len(header)]
+        for name, row in endpoints.items():
+            if 'skipped' in row:
+                lines.append(f"{name:<24}  skipped: {row['skipped']}")
+                continue
+            lines.append(f"{name:<24}{row['throughput_rps']:>9}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                         f"{row['p99_ms']:>10}{row['error_rate'] * 100:>8.1f}%")
+    return '\n'.join(lines)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
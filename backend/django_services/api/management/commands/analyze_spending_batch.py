@@ -0,0 +1,68 @@
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.batch import analyze_spending_batch
+
+
+def read_users(stream):
+    """Yield one user per non-empty JSON Lines row"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise CommandError(f'Line {line_number}: invalid JSON ({e})')
+
+
+class Command(BaseCommand):
+    help = ('Nightly spending reports: read users as JSON Lines '
+            '({"user_id", "transactions", "user_context"} per line) and write one analysis per line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="JSON Lines file with one user per line, or '-' for stdin")
+        parser.add_argument('-o', '--output', default='-', help="Output JSON Lines file (default: stdout)")
+        parser.add_argument('--workers', type=int, default=settings.BATCH_MAX_WORKERS,
+                            help='Concurrent LLM calls')
+        parser.add_argument('--rate', type=float, default=settings.BATCH_LLM_RATE,
+                            help='Max LLM calls per second (0 = unlimited)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Users parsed and analysed together')
+        parser.add_argument('--no-ai', action='store_true', help='Only compute the basic analysis')
+
+    def handle(self, *args, **options):
+        agent = None
+        if not options['no_ai']:
+            from agents.llm_client import get_agent
+            agent = get_agent()
+
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+        target = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+
+        start = time.time()
+        count = 0
+        try:
+            rows = analyze_spending_batch(
+                read_users(source), agent,
+                include_ai=agent is not None,
+                max_workers=options['workers'],
+                rate_per_second=options['rate'],
+                chunk_size=options['chunk_size'],
+            )
+            for row in rows:
+                target.write(json.dumps(row) + '\n')
+                count += 1
+                if count % 100 == 0:
+                    self.stderr.write(f'{count} users analysed...')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not sys.stdout:
+                target.close()
+
+        self.stderr.write(self.style.SUCCESS(f'✅ Analysed {count} users in {time.time() - start:.1f}s'))
@@ -0,0 +1,92 @@
+import json
+import platform
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Load-test the /api/* endpoints against a mock LLM upstream under WSGI and/or ASGI gunicorn workers, '
+            'reporting throughput, p50/p95/p99 latency and error rate per endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', default='wsgi,asgi', help='Comma-separated deployments to run: wsgi, asgi')
+        parser.add_argument('--url', help='Benchmark an already running server instead of starting one')
+        parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers per deployment')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight per endpoint')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint')
+        parser.add_argument('--endpoints', help='Comma-separated scenario names (default: all)')
+        parser.add_argument('--latency', type=float, default=0.2, help='Mock upstream seconds before first token')
+        parser.add_argument('--token-rate', type=float, default=200.0,
+                            help='Mock upstream streamed tokens per second (0 for no delay)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock completions that fail')
+        parser.add_argument('--no-cache', action='store_true', help='Disable the LLM response cache in the app')
+        parser.add_argument('--no-fast-path', action='store_true', help='Disable rule-based quick chat answers')
+        parser.add_argument('-o', '--output', help='Write the JSON report here')
+        parser.add_argument('--compare', help='Previous JSON report; exit non-zero on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative p95/throughput change for --compare')
+
+    def handle(self, *args, **options):
+        scenarios = benchmark.SCENARIOS
+        if options['endpoints']:
+            wanted = {name.strip() for name in options['endpoints'].split(',')}
+            unknown = wanted - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))} '
+                                   f'(choose from {", ".join(s.name for s in scenarios)})')
+            scenarios = [s for s in scenarios if s.name in wanted]
+
+        extra_env = {}
+        if options['no_cache']:
+            extra_env['LLM_CACHE_BACKEND'] = 'none'
+        if options['no_fast_path']:
+            extra_env['FAST_PATH_ENABLED'] = 'False'
+
+        results = {}
+        if options['url']:
+            self.stdout.write(f'Benchmarking {options["url"]}')
+            results['external'] = benchmark.run_mode(options['url'].rstrip('/'), scenarios, options['requests'],
+                                                     options['concurrency'], options['warmup'])
+        else:
+            modes = [m.strip() for m in options['mode'].split(',') if m.strip()]
+            if not set(modes) <= {'wsgi', 'asgi'}:
+                raise CommandError('--mode takes wsgi, asgi or both')
+            upstream, upstream_url = benchmark.start_mock_upstream(
+                options['latency'], options['token_rate'], options['error_rate'])
+            try:
+                for mode in modes:
+                    self.stdout.write(f'Starting {mode} deployment ({options["workers"]} workers)...')
+                    app, url = benchmark.start_app(mode, upstream_url, options['workers'], extra_env)
+                    try:
+                        results[mode] = benchmark.run_mode(url, scenarios, options['requests'],
+                                                           options['concurrency'], options['warmup'])
+                    finally:
+                        benchmark.stop(app)
+            finally:
+                benchmark.stop(upstream)
+
+        self.stdout.write(benchmark.format_table(results))
+
+        if options['output']:
+            settings = {key: options[key] for key in ('workers', 'concurrency', 'requests', 'latency', 'token_rate',
+                                                      'error_rate', 'no_cache', 'no_fast_path')}
+            report = {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'settings': settings,
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'\nReport written to {options["output"]}')
+
+        if options['compare']:
+            problems = benchmark.regressions(results, benchmark.load_report(options['compare']), options['tolerance'])
+            if problems:
+                self.stderr.write('\nRegressions:\n' + '\n'.join(f'  {p}' for p in problems))
+                raise CommandError(f'{len(problems)} benchmark regression(s)')
+            self.stdout.write(self.style.SUCCESS('\nNo regressions against baseline'))
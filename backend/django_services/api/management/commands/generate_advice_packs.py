@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from agents import advice_packs
+from agents.batch import RateLimiter
+from agents.llm_client import get_agent
+
+
+def _names(value, default):
+    return tuple(v.strip() for v in value.split(',') if v.strip()) if value else default
+
+
+class Command(BaseCommand):
+    help = ('Precompute comprehensive advice for the occupation x income band x family size grid and store it in '
+            'the advice pack index served by /api/financial-advice/ (one index per advice template version).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--occupations', help='Comma-separated personas (default: %s)'
+                            % ', '.join(advice_packs.OCCUPATIONS))
+        parser.add_argument('--income-bands', help='Comma-separated bands like 15000-25000 (default: %s)'
+                            % ', '.join(advice_packs.INCOME_BANDS))
+        parser.add_argument('--family-sizes', help='Comma-separated sizes like "3-4 members" (default: %s)'
+                            % ', '.join(advice_packs.FAMILY_SIZES))
+        parser.add_argument('--concurrency', type=int, default=4, help='Advice requests in flight')
+        parser.add_argument('--rate', type=float, default=settings.BATCH_LLM_RATE,
+                            help='Advice requests started per second (0 for no limit)')
+        parser.add_argument('--output-dir', help=f'Index directory (default: {advice_packs.PACK_DIR})')
+        parser.add_argument('--force', action='store_true', help='Regenerate personas already in the index')
+        parser.add_argument('--checkpoint', type=int, default=10, help='Save the index every N new packs')
+
+    def handle(self, *args, **options):
+        grid = list(advice_packs.persona_grid(
+            _names(options['occupations'], advice_packs.OCCUPATIONS),
+            _names(options['income_bands'], advice_packs.INCOME_BANDS),
+            _names(options['family_sizes'], advice_packs.FAMILY_SIZES),
+        ))
+        for key, _ in grid:
+            try:
+                advice_packs.band_range(key.split('|')[1])
+            except ValueError:
+                raise CommandError(f'Income bands look like 15000-25000, got {key.split("|")[1]!r}')
+
+        version = advice_packs.index_version()
+        path = advice_packs.index_path(options['output_dir'], version)
+        index = advice_packs.PackIndex.load(path) if path.exists() else advice_packs.PackIndex(version)
+        todo = [item for item in grid if options['force'] or item[0] not in index.packs]
+        self.stdout.write(f'{len(grid)} personas, {len(grid) - len(todo)} already in {path}; generating {len(todo)} '
+                          f'(template {version}, {options["concurrency"]} in flight)')
+        if not todo:
+            return
+
+        counts = {'stored': 0, 'failed': 0}
+        started = time.perf_counter()
+
+        def on_result(key, result, elapsed_ms):
+            if result.get('success'):
+                counts['stored'] += 1
+                if counts['stored'] % max(1, options['checkpoint']) == 0:
+                    index.save(path)
+            else:
+                counts['failed'] += 1
+                self.stderr.write(f'  {key}: {result.get("error", "failed")}')
+            done = counts['stored'] + counts['failed']
+            self.stdout.write(f'  [{done}/{len(todo)}] {key} '
+                              f'{"ok" if result.get("success") else "failed"}'
+                              f'{f" in {elapsed_ms:.0f} ms" if elapsed_ms is not None else ""}')
+
+        try:
+            advice_packs.generate(index, todo, get_agent(), max_workers=max(1, options['concurrency']),
+                                  rate_limiter=RateLimiter(options['rate']) if options['rate'] > 0 else None,
+                                  on_result=on_result)
+        finally:
+            index.save(path)
+
+        self.stdout.write(f'Stored {counts["stored"]} packs ({counts["failed"]} failed) in '
+                          f'{time.perf_counter() - started:.1f}s; index now has {len(index.packs)} packs: {path}')
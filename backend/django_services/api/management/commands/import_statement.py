@@ -0,0 +1,38 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.statement_import import import_batches, read_lines
+
+
+class Command(BaseCommand):
+    help = ('Import a bank / UPI statement (CSV or JSON Lines) into the transaction store for one user, '
+            'reading it in batches so memory stays bounded.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id')
+        parser.add_argument('input', help="Statement file, or '-' for stdin")
+        parser.add_argument('--batch-size', type=int, default=settings.LEDGER_IMPORT_BATCH,
+                            help='Rows written per database transaction')
+
+    def handle(self, *args, **options):
+        if len(options['user_id']) > 64:
+            raise CommandError('user_id is limited to 64 characters')
+
+        source = sys.stdin.buffer if options['input'] == '-' else open(options['input'], 'rb')
+        start = time.time()
+        stats = None
+        try:
+            for stats in import_batches(options['user_id'], read_lines(source), options['batch_size']):
+                self.stderr.write(f"{stats['rows']} rows read, {stats['ingested']} imported...")
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"✅ Imported {stats['ingested']} transactions for {options['user_id']} in {time.time() - start:.1f}s "
+            f"({stats['duplicates']} duplicates, {stats['rejected']} rejected)"))
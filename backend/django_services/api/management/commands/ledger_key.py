@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agents import ledger
+
+
+class Command(BaseCommand):
+    help = ('Issue a new access key (X-User-Key) for a user\'s stored transactions, replacing any previous key. '
+            'Use it for lost keys and for data stored with the import_statement command.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id')
+
+    def handle(self, *args, **options):
+        if len(options['user_id']) > 64:
+            raise CommandError('user_id is limited to 64 characters')
+        self.stdout.write(ledger.issue_key(options['user_id']))
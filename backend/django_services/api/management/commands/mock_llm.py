@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from agents.mock_llm import MockLLMServer
+
+
+class Command(BaseCommand):
+    help = ('Run a local OpenAI-compatible stand-in upstream for development and benchmarks '
+            '(use its URL as a backend in LLM_BACKENDS or as LLM_BASE_URL).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9100)
+        parser.add_argument('--model', default='mock-llama', help='Model id reported by the server')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds before each response')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds added to the latency')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of completions answered with 503')
+        parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds between streamed tokens')
+
+    def handle(self, *args, **options):
+        server = MockLLMServer(
+            (options['host'], options['port']),
+            model=options['model'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            token_delay=options['token_delay'],
+        )
+        self.stdout.write(f'Mock LLM listening on {server.base_url} (model {options["model"]})')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
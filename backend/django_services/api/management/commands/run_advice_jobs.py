@@ -0,0 +1,29 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from agents.jobs import JobWorkerPool, queue_stats
+
+
+class Command(BaseCommand):
+    help = ('Run background advice jobs in a dedicated process '
+            '(set ADVICE_JOB_WORKERS=0 on the web workers to leave all jobs to it).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue checks when idle')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        pool = JobWorkerPool(options['concurrency'], poll_interval=options['poll_interval']).start()
+        self.stdout.write(f'Running advice jobs with {options["concurrency"]} workers (queue: {queue_stats()})')
+        try:
+            stop.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.stop()
+        self.stdout.write('Stopped')
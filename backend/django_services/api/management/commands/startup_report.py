@@ -0,0 +1,69 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: load the application like a worker does, then build the
+# agent the way the first LLM request (or LLM_PRELOAD) would.
+CHILD = """
+import json, sys, time
+from moneymitra.{server} import application
+from agents import startup
+from agents.llm_client import get_agent
+report = startup.report()
+started = time.perf_counter()
+get_agent()
+report['agent_ms'] = round((time.perf_counter() - started) * 1000, 1)
+report['agent_max_rss_mb'] = startup.max_rss_mb()
+print(json.dumps(report))
+"""
+
+
+class Command(BaseCommand):
+    help = ('Measure cold start per deployment profile: application load time, modules and peak memory of a fresh '
+            'worker, and the deferred cost of building the LLM agent.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='full,lean', help='Comma-separated API_PROFILE values')
+        parser.add_argument('--server', default='wsgi', choices=['wsgi', 'asgi'])
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per profile (median reported)')
+        parser.add_argument('-o', '--output', help='Write the JSON report here')
+
+    def _measure(self, profile, server):
+        env = {**os.environ, 'API_PROFILE': profile, 'STARTUP_REPORT': 'False', 'ADVICE_JOB_WORKERS': '0',
+               'HEALTH_PROBE_ENABLED': 'False', 'DJANGO_SETTINGS_MODULE': 'moneymitra.settings'}
+        env.setdefault('CEREBRAS_API_KEY', 'startup-report')
+        result = subprocess.run([sys.executable, '-c', CHILD.format(server=server)], cwd=settings.BASE_DIR,
+                                env=env, capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise CommandError(f'{profile} profile failed to start:\n{result.stderr.strip()}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options['profiles'].split(',') if p.strip()]
+        results = {}
+        for profile in profiles:
+            runs = [self._measure(profile, options['server']) for _ in range(max(1, options['runs']))]
+            results[profile] = {
+                'load_ms': statistics.median(r['load_ms'] for r in runs),
+                'modules': runs[-1]['modules'],
+                'max_rss_mb': statistics.median(r['max_rss_mb'] or 0 for r in runs),
+                'llm_sdk_loaded': runs[-1]['llm_sdk_loaded'],
+                'agent_ms': statistics.median(r['agent_ms'] for r in runs),
+                'agent_max_rss_mb': statistics.median(r['agent_max_rss_mb'] or 0 for r in runs),
+            }
+
+        self.stdout.write(f'{"profile":<8} {"load ms":>8} {"modules":>8} {"RSS MB":>7} '
+                          f'{"agent ms":>9} {"RSS with agent":>15}')
+        for profile, r in results.items():
+            self.stdout.write(f'{profile:<8} {r["load_ms"]:>8.0f} {r["modules"]:>8} {r["max_rss_mb"]:>7.1f} '
+                              f'{r["agent_ms"]:>9.0f} {r["agent_max_rss_mb"]:>15.1f}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'server': options['server'], 'runs': options['runs'], 'profiles': results}, f, indent=2)
+            self.stdout.write(f'Report written to {options["output"]}')
@@ -0,0 +1,138 @@
+import gzip
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from agents.metrics import REGISTRY, REQUEST_DURATION, Counter, current_endpoint, record_error
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-only
+    brotli = None
+
+# Quick levels: most bodies are small JSON and are compressed on the request path
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+RESPONSE_BYTES = REGISTRY.register(Counter(
+    'moneymitra_response_body_bytes_total', 'Response body bytes before and after compression.',
+    ('encoding', 'stage')))
+
+
+class MetricsMiddleware:
+    """Request latency histogram and per-request endpoint label for stage timings.
+
+    Works under both WSGI and ASGI. Streaming responses are measured until the
+    response object is returned (time to first byte), not until the stream ends.
+    The endpoint label is not reset on return: streamed bodies are consumed later in
+    the same request context and their stage timings should keep the label.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        current_endpoint.set('-')
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        current_endpoint.set('-')
+        response = await self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            current_endpoint.set(match.url_name)
+        return None
+
+    def process_exception(self, request, exception):
+        record_error('view', exception)
+        return None
+
+    def _observe(self, request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - start,
+                                 endpoint=endpoint, method=request.method, status=response.status_code)
+
+
+def accepted_encoding(header):
+    """Best supported content coding in an Accept-Encoding header: 'br', 'gzip' or None"""
+    offered = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        match = re.search(r'q=([0-9.]+)', params)
+        try:
+            offered[name.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            continue
+    for coding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if offered.get(coding, offered.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware:
+    """gzip / br compression of buffered responses, negotiated per request.
+
+    Streamed responses (SSE, JSON Lines) are passed through untouched: compressing
+    them would buffer tokens that should reach the client as they are produced.
+    Bodies smaller than RESPONSE_COMPRESSION_MIN_BYTES are not worth the CPU.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = settings.RESPONSE_COMPRESSION_MIN_BYTES
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding') or not self.min_bytes:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_bytes:
+            return response
+        coding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        raw = response.content
+        if coding == 'br':
+            body = brotli.compress(raw, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+        if len(body) >= len(raw):
+            return response
+        RESPONSE_BYTES.inc(len(raw), encoding=coding, stage='raw')
+        RESPONSE_BYTES.inc(len(body), encoding=coding, stage='sent')
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = coding
+        return response
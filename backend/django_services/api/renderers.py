@@ -0,0 +1,136 @@
+import json
+import math
+import os
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from agents.metrics import stage
+
+try:
+    import orjson
+except ImportError:  # optional: JSON_RENDERER=fast falls back to the standard encoder
+    orjson = None
+
+# DRF parses request.data lazily and renders after the view returns, so timing the
+# parser/renderer classes captures the parse and serialization stages for every view.
+#
+# Response bodies are encoded by dumps(): orjson when JSON_RENDERER=fast and it is
+# installed, otherwise json with DRF's encoder. Types orjson doesn't know (Decimal,
+# lazy strings, querysets, NumPy values) and datetimes go through DRF's encoder
+# either way, and NaN / Infinity become null in both (orjson's behaviour; strict
+# JSON has no spelling for them), so the two encoders produce equivalent JSON. The
+# bytes can differ in number spelling (orjson writes 1e16 and 1e-7, json 1e+16 and
+# 1e-07). The async views use the same function, so both serving modes send identical
+# bytes.
+#
+# Compact mode (?compact=true, "compact": true in the body, Prefer: return=minimal,
+# or COMPACT_RESPONSES=True) drops request echoes, examples, timestamps and empty
+# fields, and sends top_categories as names only (their totals are already in
+# category_breakdown).
+
+COMPACT_DROP_FIELDS = frozenset(['example', 'data_received', 'timestamp', 'powered_by', 'endpoints'])
+COMPACT_DEFAULT = os.getenv('COMPACT_RESPONSES', 'False').lower() == 'true'
+
+_encoder = JSONEncoder(ensure_ascii=False)
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+
+def fast_json_enabled():
+    return orjson is not None and settings.JSON_RENDERER == 'fast'
+
+
+def finite(data):
+    """data with NaN / Infinity floats replaced by None"""
+    if isinstance(data, float):
+        return data if math.isfinite(data) else None
+    if isinstance(data, dict):
+        return {key: finite(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [finite(item) for item in data]
+    if hasattr(data, 'tolist') and not isinstance(data, (str, bytes)):
+        # NumPy arrays and scalars, as DRF's encoder converts them
+        return finite(data.tolist())
+    return data
+
+
+def _json_dumps(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode()
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes for a response body"""
+    if fast_json_enabled():
+        return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    try:
+        return _json_dumps(data)
+    except ValueError:
+        # Non-finite floats: rare, so only then walk the data
+        return _json_dumps(finite(data))
+
+
+def compact_requested(request):
+    """True when the client asked for compact responses"""
+    if 'return=minimal' in request.META.get('HTTP_PREFER', ''):
+        return True
+    flag = request.GET.get('compact')
+    if flag is None:
+        try:
+            flag = request.data.get('compact')
+        except Exception:  # no parsed body (plain HttpRequest, unparseable input)
+            flag = None
+    if flag is None:
+        return COMPACT_DEFAULT
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+
+def compact(data):
+    """Response body without redundant fields (see above)"""
+    if isinstance(data, dict):
+        out = {}
+        for key, value in data.items():
+            if key in COMPACT_DROP_FIELDS or value is None:
+                continue
+            if key == 'top_categories' and isinstance(value, list):
+                out[key] = [item[0] if isinstance(item, (list, tuple)) else item for item in value]
+            else:
+                out[key] = compact(value)
+        return out
+    if isinstance(data, (list, tuple)):
+        return [compact(item) for item in data]
+    return data
+
+
+class InstrumentedJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        with stage('parse'):
+            return super().parse(stream, media_type, parser_context)
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        if data is not None and request is not None and compact_requested(request):
+            data = compact(data)
+        with stage('serialization'):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        except ValueError:
+            # STRICT_JSON rejects NaN / Infinity; send them as null like dumps()
+            return super().render(finite(data), accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(InstrumentedJSONRenderer):
+    """JSON through dumps(); the standard renderer for indented (browsable) output"""
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not fast_json_enabled() or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().encode(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,132 @@
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+# Server-Sent Events support for the streamed quick-chat and financial-advice modes.
+#
+# Wire format:
+#   event: token   data: {"delta": "..."}          one per model chunk
+#   event: done    data: {...response metadata...}  trailing event, same fields as the
+#                                                   JSON response minus the streamed text
+#
+# Django buffers a sync iterator served over ASGI, so under SERVER_MODE=asgi the JSON
+# Lines streams (batch analysis, statement import) are wrapped in aiter_sync().
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF content negotiation accept text/event-stream.
+
+    Streamed responses bypass rendering; this only renders the JSON error bodies.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class JSONLinesRenderer(BaseRenderer):
+    """Lets DRF content negotiation accept application/x-ndjson (see EventStreamRenderer)"""
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+def streaming_renderers():
+    """Renderer classes for views that can answer with a stream"""
+    return list(api_settings.DEFAULT_RENDERER_CLASSES) + [EventStreamRenderer, JSONLinesRenderer]
+
+
+def stream_requested(request):
+    """True when the client asked for a streamed response"""
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        return True
+    try:
+        flag = request.data.get('stream', False)
+    except AttributeError:
+        return False
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStreamEncoder:
+    """Turns agent ('token', text) / ('done', result) events into SSE frames"""
+
+    def __init__(self, payload_builder, text_field, start_time):
+        # payload_builder(result, start_time) is the view's normal JSON body builder
+        self.payload_builder = payload_builder
+        self.text_field = text_field
+        self.start_time = start_time
+        self.first_token_ms = None
+
+    def encode(self, kind, value):
+        if kind == 'token':
+            if self.first_token_ms is None:
+                self.first_token_ms = round((time.time() - self.start_time) * 1000, 2)
+            return [sse_event('token', {'delta': value})]
+
+        frames = []
+        payload = self.payload_builder(value, self.start_time)
+        text = payload.pop(self.text_field, None)
+        if self.first_token_ms is None and text:
+            # Nothing was streamed (upstream failed early): send the fallback text as one chunk
+            frames.append(sse_event('token', {'delta': text}))
+        payload['time_to_first_token_ms'] = self.first_token_ms
+        frames.append(sse_event('done', payload))
+        return frames
+
+    def iter_frames(self, events):
+        for kind, value in events:
+            yield from self.encode(kind, value)
+
+    async def aiter_frames(self, events):
+        async for kind, value in events:
+            for frame in self.encode(kind, value):
+                yield frame
+
+
+def event_stream_response(frames):
+    """StreamingHttpResponse for SSE frames (sync or async iterator)"""
+    response = StreamingHttpResponse(frames, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def aiter_sync(iterator):
+    """Async iterator over a sync one; every step runs in the request's sync thread (safe for the ORM)"""
+    iterator = iter(iterator)
+    done = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            item = await step(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        # Client gone: let the generator clean up (thread pools, database transactions)
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def json_lines_response(rows):
+    """StreamingHttpResponse writing one JSON document per line (sync or async iterator)"""
+    lines = (json.dumps(row) + '\n' for row in rows)
+    response = StreamingHttpResponse(aiter_sync(lines) if settings.ASYNC_API_VIEWS else lines,
+                                     content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
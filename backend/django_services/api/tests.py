@@ -1,3 +1,520 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from agents import jobs, startup
+from agents.health import UpstreamHealth, UpstreamProber, upstream_status
+from agents.models import Transaction
+from agents.router import ModelRouter
+from agents.tests import (AsyncStubCompletions, StubBackend, StubCompletions, connection_error, status_error,
+                          stub_agent)
+
+from . import async_views, middleware, renderers, views
+from .middleware import CompressionMiddleware, accepted_encoding
+from .throttling import LLMRateThrottle
+
+
+def streamed_body(response):
+    """Body of a streaming response as text (async under ASGI)"""
+    if response.is_async:
+        async def read():
+            return [chunk async for chunk in response.streaming_content]
+        chunks = async_to_sync(read)()
+    else:
+        chunks = list(response.streaming_content)
+    return b''.join(chunks).decode()
+
+
+def sse_events(response):
+    """[(event, data)] of a Server-Sent Events response"""
+    events = []
+    for frame in streamed_body(response).strip().split('\n\n'):
+        event, data = frame.split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def json_lines(response):
+    """Decoded JSON Lines body of a streaming response"""
+    return [json.loads(line) for line in streamed_body(response).splitlines()]
+
+
+def reply_agent(text):
+    """Stub agent answering every question with `text`, sync and async"""
+    return stub_agent(StubBackend('primary', StubCompletions(text), AsyncStubCompletions(text)))
+
+
+@contextmanager
+def serving(agent):
+    """Sync and async views answer with `agent`"""
+    with mock.patch('api.views.get_agent', return_value=agent), \
+            mock.patch.object(async_views, 'get_agent', return_value=agent):
+        yield
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, data, content_type, path='/api/quick-chat/'):
+        return async_to_sync(view)(self.factory.post(path, data, content_type=content_type))
+
+    def test_json_and_form_bodies(self):
+        with mock.patch.object(async_views, 'get_agent', return_value=reply_agent('Keep a buffer.')):
+            as_json = self.call(async_views.quick_financial_chat, {'question': 'How do I save?'},
+                                'application/json')
+            as_form = self.call(async_views.quick_financial_chat, 'question=How+do+I+save%3F',
+                                'application/x-www-form-urlencoded')
+        for response in (as_json, as_form):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['response'], 'Keep a buffer.')
+
+    def test_sync_and_async_views_agree(self):
+        with serving(reply_agent('Keep a buffer.')):
+            sync = self.client.post('/api/quick-chat/', {'question': 'How do I save?'},
+                                    content_type='application/json').json()
+            asynchronous = json.loads(self.call(async_views.quick_financial_chat, {'question': 'How do I save?'},
+                                                'application/json').content)
+        for body in (sync, asynchronous):
+            body.pop('response_time_ms', None)
+            body.pop('timestamp', None)
+        self.assertEqual(sync, asynchronous)
+        self.assertEqual(sync['model'], 'primary-model')
+
+    def test_rejections_match_the_sync_views(self):
+        for data, content_type, status in (('hello', 'text/plain', 415), ('{"question": ', 'application/json', 400)):
+            sync = self.client.post('/api/quick-chat/', data, content_type=content_type)
+            asynchronous = self.call(async_views.quick_financial_chat, data, content_type)
+            self.assertEqual((sync.status_code, asynchronous.status_code), (status, status))
+
+    def test_missing_question(self):
+        response = self.call(async_views.quick_financial_chat, {}, 'application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'No question provided')
+
+
+class EventStreamTests(TestCase):
+    ADVICE = {'occupation': 'cab driver', 'income_range': '20000', 'monthly_expenses': '15000',
+              'current_savings': '3000', 'goals': 'emergency fund', 'pack': False}
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, path, data, agent):
+        with serving(agent):
+            response = self.client.post(path, data, content_type='application/json',
+                                        headers={'Accept': 'text/event-stream'})
+            return response, sse_events(response)
+
+    def test_quick_chat_tokens_then_done(self):
+        response, events = self.post('/api/quick-chat/', {'question': 'How do I save?'},
+                                     reply_agent('Save a fixed share.'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        tokens = [data['delta'] for event, data in events if event == 'token']
+        self.assertEqual(''.join(tokens), 'Save a fixed share.')
+        self.assertEqual(len(tokens), 4)
+        event, done = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertNotIn('response', done)
+        self.assertEqual(done['model'], 'primary-model')
+        self.assertIsNotNone(done['time_to_first_token_ms'])
+
+    def test_advice_stream_reports_the_serving_backend(self):
+        agent = reply_agent('Build an emergency fund.')
+        agent.router.backends[0].display_name = 'Primary Llama'
+        _, events = self.post('/api/financial-advice/', self.ADVICE, agent)
+        self.assertEqual(''.join(d['delta'] for e, d in events if e == 'token'), 'Build an emergency fund.')
+        self.assertEqual(events[-1][1]['model'], 'Primary Llama')
+
+    def test_upstream_failure_sends_the_fallback(self):
+        agent = stub_agent(StubBackend('primary', StubCompletions(status_error(500)), AsyncStubCompletions(status_error(500))))
+        _, events = self.post('/api/quick-chat/', {'question': 'How do I save?'}, agent)
+        self.assertEqual([event for event, _ in events], ['token', 'done'])
+        self.assertIn('How do I save?', events[0][1]['delta'])
+        self.assertEqual(events[1][1]['model'], 'Fallback Mode')
+
+    def test_async_stream(self):
+        request = AsyncRequestFactory().post('/api/quick-chat/', {'question': 'How do I save?', 'stream': True},
+                                             content_type='application/json')
+        with mock.patch.object(async_views, 'get_agent', return_value=reply_agent('Save a fixed share.')):
+            response = async_to_sync(async_views.quick_financial_chat)(request)
+            self.assertTrue(response.is_async)
+            events = sse_events(response)
+        self.assertEqual(''.join(d['delta'] for e, d in events if e == 'token'), 'Save a fixed share.')
+        self.assertEqual(events[-1][1]['model'], 'primary-model')
+
+
+class ReadinessTests(TestCase):
+    def status_for(self, *backends):
+        router = ModelRouter(backends, explore=0)
+        UpstreamProber(UpstreamHealth(), router=router).probe()
+        with mock.patch('api.views.upstream_status', lambda: upstream_status(router)):
+            return self.client.get('/api/health/ready/')
+
+    def test_ready_and_degraded_serve_traffic(self):
+        dead = StubBackend('ready-dead')
+        dead.probe_error = connection_error()
+        self.assertEqual(self.status_for(StubBackend('ready-alive')).json()['status'], 'ready')
+        response = self.status_for(StubBackend('ready-alive'), dead)
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'degraded'))
+
+    def test_unavailable_is_not_ready(self):
+        dead = StubBackend('unready-dead')
+        dead.probe_error = connection_error()
+        response = self.status_for(dead)
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'unavailable'))
+
+    def test_liveness(self):
+        self.assertEqual(self.client.get('/api/health/live/').status_code, 200)
+
+
+class BatchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_malformed_users_get_error_lines(self):
+        users = [{'user_id': 'a', 'transactions': [{'amount': 120, 'category': 'food'}]}, 'oops']
+        response = self.client.post('/api/batch/analyze-spending/', {'users': users, 'include_ai': False},
+                                    content_type='application/json')
+        lines = json_lines(response)
+        self.assertEqual([(line['user_id'], line['success']) for line in lines], [('a', True), (1, False)])
+
+    def post_batch(self, include_ai, count=5):
+        users = [{'user_id': i, 'transactions': [{'amount': 100 + i, 'category': 'fuel'}]} for i in range(count)]
+        response = self.client.post('/api/batch/analyze-spending/', {'users': users, 'include_ai': include_ai},
+                                    content_type='application/json')
+        return sorted((line['user_id'], line['analysis_type']) for line in json_lines(response))
+
+    def test_include_ai_false_as_a_string(self):
+        agent = reply_agent('Cut fuel costs.')
+        with serving(agent):
+            self.assertEqual(self.post_batch('false', count=2), [(0, 'basic_only'), (1, 'basic_only')])
+            self.assertEqual(self.post_batch('true', count=2), [(0, 'ai_powered'), (1, 'ai_powered')])
+        self.assertEqual(agent.router.backends[0].completions.calls, 2)
+
+    def test_each_ai_user_counts_against_the_llm_rate(self):
+        agent = reply_agent('Cut fuel costs.')
+        with serving(agent), mock.patch.object(LLMRateThrottle, 'THROTTLE_RATES', {'llm': '3/min'}):
+            types = [analysis_type for _, analysis_type in self.post_batch(True)]
+        self.assertEqual(types.count('ai_powered'), 3)
+        self.assertEqual(types.count('basic'), 2)
+        self.assertEqual(agent.router.backends[0].completions.calls, 3)
+
+
+def metric_value(text, series):
+    """Value of one exposition line, 0 when the series is absent"""
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def count_after(self, series, request):
+        before = metric_value(self.scrape(), series)
+        request()
+        return metric_value(self.scrape(), series) - before
+
+    def test_requests_are_labelled_by_route_and_status(self):
+        live = 'moneymitra_request_duration_seconds_count{endpoint="liveness",method="GET",status="200"}'
+        self.assertEqual(self.count_after(live, lambda: self.client.get('/api/health/live/')), 1)
+        missing = 'moneymitra_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"}'
+        self.assertEqual(self.count_after(missing, lambda: self.client.get('/api/no-such-endpoint/')), 1)
+
+    def test_stage_timings_carry_the_endpoint(self):
+        upstream = 'moneymitra_stage_duration_seconds_count{endpoint="quick_chat",stage="upstream_total"}'
+
+        def chat():
+            with serving(reply_agent('Keep a buffer.')):
+                self.client.post('/api/quick-chat/', {'question': 'How do I save?'}, content_type='application/json')
+
+        self.assertEqual(self.count_after(upstream, chat), 1)
+
+
+class ChatSessionApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_session_lifecycle(self):
+        created = self.client.post('/api/chat/sessions/', {'context': {'occupation': 'cab driver'}},
+                                   content_type='application/json')
+        self.assertEqual(created.status_code, 201)
+        session_id = created.json()['session_id']
+
+        with serving(reply_agent('Keep a buffer.')):
+            for question in ('How do I save?', 'And for fuel?'):
+                message = self.client.post(f'/api/chat/sessions/{session_id}/messages/', {'question': question},
+                                           content_type='application/json').json()
+        self.assertEqual((message['session_id'], message['turn'], message['response']), (session_id, 1, 'Keep a buffer.'))
+
+        detail = self.client.get(f'/api/chat/sessions/{session_id}/?limit=1').json()
+        self.assertEqual((detail['turn_count'], detail['profile']), (2, {'occupation': 'cab driver'}))
+        self.assertEqual([t['question'] for t in detail['turns']], ['And for fuel?'])
+
+        self.assertEqual(self.client.delete(f'/api/chat/sessions/{session_id}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/chat/sessions/{session_id}/').status_code, 404)
+
+    def test_unknown_session_and_bad_context(self):
+        missing = self.client.post('/api/chat/sessions/00000000-0000-0000-0000-000000000000/messages/',
+                                   {'question': 'hi'}, content_type='application/json')
+        self.assertEqual(missing.status_code, 404)
+        bad = self.client.post('/api/chat/sessions/', {'context': 'cab driver'}, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+
+class UserLedgerApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today().isoformat()
+        self.transactions = [
+            {'id': 't1', 'amount': 300, 'category': 'food', 'date': self.today},
+            {'id': 't2', 'amount': 20000, 'category': 'salary', 'date': self.today, 'type': 'income'},
+        ]
+
+    def post_transactions(self, user_id, transactions, key=None):
+        headers = {'X-User-Key': key} if key else {}
+        return self.client.post(f'/api/users/{user_id}/transactions/', {'transactions': transactions},
+                                content_type='application/json', headers=headers)
+
+    def test_first_write_claims_the_user(self):
+        response = self.post_transactions('u1', self.transactions)
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['ingested'], body['duplicates']), (2, 0))
+        key = body['user_key']
+
+        # Reads and further writes need the key
+        self.assertEqual(self.client.get('/api/users/u1/transactions/').status_code, 404)
+        self.assertEqual(self.client.get('/api/users/u1/spending/', headers={'X-User-Key': 'nope'}).status_code, 404)
+        self.assertEqual(self.post_transactions('u1', self.transactions).status_code, 404)
+
+        again = self.post_transactions('u1', self.transactions, key=key)
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again.json()['duplicates'], 2)
+        self.assertNotIn('user_key', again.json())
+
+        listed = self.client.get('/api/users/u1/transactions/', headers={'X-User-Key': key}).json()
+        self.assertEqual(len(listed['transactions']), 2)
+
+        spending = self.client.get('/api/users/u1/spending/', headers={'X-User-Key': key}).json()
+        self.assertEqual(spending['basic_analysis']['total_spent'], 300)
+        self.assertEqual(spending['analysis_type'], 'stored')
+
+    def test_stored_analysis_requires_the_key(self):
+        self.post_transactions('u1', self.transactions)
+        response = self.client.post('/api/analyze-spending/', {'user_id': 'u1'}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.json()['success'])
+
+    def test_statement_import(self):
+        statement = ('Date,Narration,Debit,Credit\n'
+                     f'{self.today},Zomato order,250,\n'
+                     f'{self.today},Salary,,18000\n')
+        response = self.client.post('/api/users/u2/transactions/import/', statement, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['rows'], body['ingested']), (2, 2))
+        self.assertTrue(body['user_key'])
+
+        again = self.client.post('/api/users/u2/transactions/import/', statement, content_type='text/csv',
+                                 headers={'X-User-Key': body['user_key'], 'Accept': 'application/x-ndjson'})
+        lines = json_lines(again)
+        self.assertEqual((lines[-1]['done'], lines[-1]['duplicates']), (True, 2))
+        self.assertEqual(Transaction.objects.filter(user_id='u2').count(), 2)
+
+    def test_bad_statement_header(self):
+        response = self.client.post('/api/users/u3/transactions/import/', 'foo,bar\n1,2\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.dict('os.environ', {'ADVICE_JOB_WORKERS': '0'})
+class AdviceJobApiTests(TestCase):
+    def test_sync_view_answers_without_waiting(self):
+        job = jobs.submit({'occupation': 'cab driver'})
+        start = time.monotonic()
+        response = views.advice_job(RequestFactory().get(f'/api/jobs/{job.pk}/?wait=20'), job_id=job.pk)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual((response.status_code, response.data['status']), (200, 'queued'))
+
+    def test_async_view_long_polls(self):
+        job = jobs.submit({'occupation': 'cab driver'})
+        request = AsyncRequestFactory().get(f'/api/jobs/{job.pk}/?wait=0.3')
+        start = time.monotonic()
+        response = async_to_sync(async_views.advice_job)(request, job_id=job.pk)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(json.loads(response.content)['status'], 'queued')
+
+    def test_cancel_and_missing_job(self):
+        job = jobs.submit({})
+        self.assertEqual(self.client.delete(f'/api/jobs/{job.pk}/').json()['status'], 'cancelled')
+        self.assertEqual(self.client.delete(f'/api/jobs/{job.pk}/').status_code, 409)
+        self.assertEqual(self.client.get('/api/jobs/00000000-0000-0000-0000-000000000000/').status_code, 404)
+
+
+# Serves one request in a fresh interpreter under the lean profile
+LEAN_CHILD = """
+import django, json
+django.setup()
+from django.conf import settings
+from django.test import Client
+client = Client(HTTP_HOST='localhost')
+response = client.post('/api/analyze-spending/', {'transactions': [{'amount': 120, 'category': 'food'}]},
+                       content_type='application/json')
+print(json.dumps({'apps': settings.INSTALLED_APPS, 'status': response.status_code,
+                  'total_spent': response.json()['basic_analysis']['total_spent']}))
+"""
+
+
+class StartupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        saved = startup._report
+        self.addCleanup(setattr, startup, '_report', saved)
+
+    def test_report_in_health_and_metrics(self):
+        with mock.patch.dict(os.environ, {'STARTUP_REPORT': 'False'}):
+            report = startup.finish(time.perf_counter() - 0.25, 'wsgi')
+        self.assertEqual((report['server'], report['profile']), ('wsgi', settings.API_PROFILE))
+        self.assertGreaterEqual(report['load_ms'], 250)
+
+        health = self.client.get('/api/health/').json()['startup']
+        self.assertEqual(health['load_ms'], report['load_ms'])
+        self.assertIn('llm_sdk_loaded', health)
+        self.assertGreaterEqual(health['modules_now'], health['modules'])
+        self.assertAlmostEqual(metric_value(self.client.get('/api/metrics/').content.decode(),
+                                            'moneymitra_startup_seconds'), report['load_ms'] / 1000, places=3)
+
+    def test_no_report_before_finish(self):
+        startup._report = None
+        self.assertIsNone(startup.report())
+        self.assertNotIn('moneymitra_startup_seconds', self.client.get('/api/metrics/').content.decode())
+
+    def test_lean_profile_serves_the_api(self):
+        env = {**os.environ, 'API_PROFILE': 'lean', 'DJANGO_SETTINGS_MODULE': 'moneymitra.settings'}
+        result = subprocess.run([sys.executable, '-c', LEAN_CHILD], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        body = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(body['apps'], ['rest_framework', 'corsheaders', 'agents', 'api'])
+        self.assertEqual((body['status'], body['total_spent']), (200, 120))
+
+    def test_startup_report_compares_profiles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'startup.json')
+            call_command('startup_report', profiles='full,lean', runs=1, output=output, stdout=io.StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        full, lean = report['profiles']['full'], report['profiles']['lean']
+        self.assertLess(lean['modules'], full['modules'])
+        self.assertFalse(full['llm_sdk_loaded'] or lean['llm_sdk_loaded'])
+        self.assertGreater(lean['agent_ms'], 0)
+
+
+class RendererTests(SimpleTestCase):
+    DATA = {'ratio': float('nan'), 'values': np.array([1.5, np.inf]), 'when': datetime(2024, 3, 1, 10, 30),
+            'name': 'बचत', 'floats': [1e16, 1e-7]}
+
+    def test_encoders_agree(self):
+        with override_settings(JSON_RENDERER='standard'):
+            standard = renderers.dumps(self.DATA)
+        if renderers.orjson is None:
+            self.skipTest('orjson not installed')
+        with override_settings(JSON_RENDERER='fast'):
+            fast = renderers.dumps(self.DATA)
+        # Equivalent JSON, not identical bytes: the encoders spell exponents differently
+        self.assertEqual(json.loads(standard), json.loads(fast))
+        self.assertEqual(json.loads(standard), {'ratio': None, 'values': [1.5, None], 'when': '2024-03-01T10:30:00',
+                                                'name': 'बचत', 'floats': [1e16, 1e-7]})
+
+
+class CompressionTests(TestCase):
+    BODY = json.dumps({'advice': 'Save 10% of every payout. ' * 100}).encode()
+
+    def compress(self, response, accept='gzip, deflate', min_bytes=512):
+        request = RequestFactory().get('/api/health/', HTTP_ACCEPT_ENCODING=accept)
+        with override_settings(RESPONSE_COMPRESSION_MIN_BYTES=min_bytes):
+            return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_bodies_are_compressed(self):
+        response = self.compress(HttpResponse(self.BODY, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_or_unwanted_bodies_are_left_alone(self):
+        small = self.compress(HttpResponse(b'{"ok":true}', content_type='application/json'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', small['Vary'])
+        for accept in ('', 'identity', 'gzip;q=0'):
+            response = self.compress(HttpResponse(self.BODY), accept=accept)
+            self.assertEqual(response.content, self.BODY)
+        self.assertFalse(self.compress(HttpResponse(self.BODY), min_bytes=0).has_header('Content-Encoding'))
+
+    def test_streams_pass_through(self):
+        response = self.compress(StreamingHttpResponse(iter([self.BODY]), content_type='application/x-ndjson'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.BODY)
+
+    def test_accepted_encoding(self):
+        best = 'br' if middleware.brotli is not None else 'gzip'
+        self.assertEqual(accepted_encoding('gzip, br'), best)
+        self.assertEqual(accepted_encoding('*'), best)
+        self.assertEqual(accepted_encoding('GZIP;q=0.5, br;q=0'), 'gzip')
+        self.assertIsNone(accepted_encoding('deflate, gzip;q=0'))
+
+    def test_api_responses_are_compressed(self):
+        response = self.client.get('/api/health/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['status'], 'healthy')
+
+
+class CompactResponseTests(TestCase):
+    TRANSACTIONS = [{'amount': 300, 'category': 'food'}, {'amount': 100, 'category': 'fuel'}]
+
+    def setUp(self):
+        cache.clear()
+
+    def analyze(self, path='/api/analyze-spending/', **headers):
+        with serving(reply_agent('Cook at home.')):
+            return self.client.post(path, {'transactions': self.TRANSACTIONS}, content_type='application/json',
+                                    headers=headers).json()
+
+    def test_compact_drops_redundant_fields(self):
+        full = self.analyze()
+        self.assertIn('timestamp', full)
+        self.assertEqual(full['basic_analysis']['top_categories'][0], ['food', 300.0])
+
+        for body in (self.analyze('/api/analyze-spending/?compact=true'), self.analyze(Prefer='return=minimal')):
+            self.assertNotIn('timestamp', body)
+            self.assertEqual(body['basic_analysis']['top_categories'], ['food', 'fuel'])
+            self.assertEqual(body['basic_analysis']['category_breakdown'], full['basic_analysis']['category_breakdown'])
+
+    def test_compact(self):
+        data = {'success': True, 'example': {}, 'error': None, 'rows': [{'timestamp': 1, 'top_categories': [['a', 1]]}]}
+        self.assertEqual(renderers.compact(data), {'success': True, 'rows': [{'top_categories': ['a']}]})
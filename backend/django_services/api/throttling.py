@@ -0,0 +1,118 @@
+import threading
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from agents.metrics import REGISTRY, Counter
+from agents.ratelimit import current_client, get_quota
+
+# Request throttles (REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES']).
+# Clients are the authenticated user, or the client IP for anonymous requests
+# (honouring NUM_PROXIES like DRF). Three checks run on every request:
+#   client  - requests per client across the API (THROTTLE_CLIENT_RATE)
+#   llm     - requests per client to endpoints that call the LLM (THROTTLE_LLM_RATE)
+#   tokens  - LLM requests from a client whose token budget is spent (agents.ratelimit)
+# Counts live in the Django cache like DRF's own throttles. The async views run the
+# same classes through check_throttles(). A batch passes them as one request but may
+# make one LLM call per user, so BatchLLMGate counts each of those calls as well.
+
+# URL names of views that may call the LLM
+LLM_ENDPOINTS = frozenset([
+    'quick_chat', 'chat_session_message', 'financial_advice', 'analyze_spending', 'batch_analyze_spending',
+])
+# Probes and scrapes are never throttled
+EXEMPT_ENDPOINTS = frozenset(['health_check', 'liveness', 'readiness', 'metrics'])
+
+THROTTLED = REGISTRY.register(Counter(
+    'moneymitra_throttled_requests_total', 'Requests rejected by a throttle.', ('scope',)))
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name if match is not None else None
+
+
+class ClientThrottleMixin:
+    """Cache keys by client: the user when authenticated, else the client IP"""
+
+    def client_id(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class ClientRateThrottle(ClientThrottleMixin, SimpleRateThrottle):
+    scope = 'client'
+
+    def get_cache_key(self, request, view):
+        if _endpoint(request) in EXEMPT_ENDPOINTS:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.client_id(request)}
+
+    def throttle_failure(self):
+        THROTTLED.inc(scope=self.scope)
+        return False
+
+
+class LLMRateThrottle(ClientRateThrottle):
+    scope = 'llm'
+
+    def get_cache_key(self, request, view):
+        if _endpoint(request) not in LLM_ENDPOINTS:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.client_id(request)}
+
+
+class TokenBudgetThrottle(ClientThrottleMixin, BaseThrottle):
+    """Tags the request's upstream calls with its client and rejects LLM calls once its tokens are spent"""
+
+    def __init__(self):
+        self.retry_after = None
+
+    def allow_request(self, request, view):
+        client = self.client_id(request)
+        current_client.set(client)
+        if _endpoint(request) not in LLM_ENDPOINTS:
+            return True
+        self.retry_after = get_quota().retry_after(client)
+        if self.retry_after > 0:
+            THROTTLED.inc(scope='tokens')
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class BatchLLMGate:
+    """Admits a batch's LLM calls one at a time against the client's LLM rate and token budget.
+
+    The request itself already passed the throttles once, which pays for the first call.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.client = TokenBudgetThrottle().client_id(request)
+        self.admitted = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if get_quota().retry_after(self.client) > 0:
+                THROTTLED.inc(scope='tokens')
+                return False
+            if self.admitted and not LLMRateThrottle().allow_request(self.request, None):
+                return False
+            self.admitted += 1
+            return True
+
+
+def check_throttles(request):
+    """(client, None when allowed else seconds to wait) under the default throttles, for views outside DRF"""
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait() or 0)
+    return current_client.get(), max(waits) if waits else None
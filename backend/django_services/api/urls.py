@@ -1,10 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# LLM-backed endpoints switch to their async twins when served over ASGI
+llm_views = async_views if settings.ASYNC_API_VIEWS else views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
-    path('quick-chat/', views.quick_financial_chat, name='quick_chat'),
-    path('financial-advice/', views.get_financial_advice, name='financial_advice'),
-    path('analyze-spending/', views.analyze_spending_pattern, name='analyze_spending'),
+    path('health/live/', views.liveness, name='liveness'),
+    path('health/ready/', views.readiness, name='readiness'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('quick-chat/', llm_views.quick_financial_chat, name='quick_chat'),
+    path('chat/sessions/', views.create_chat_session, name='create_chat_session'),
+    path('chat/sessions/<uuid:session_id>/', views.chat_session_detail, name='chat_session_detail'),
+    path('chat/sessions/<uuid:session_id>/messages/', llm_views.chat_session_message, name='chat_session_message'),
+    path('financial-advice/', llm_views.get_financial_advice, name='financial_advice'),
+    path('jobs/<uuid:job_id>/', llm_views.advice_job, name='advice_job'),
+    path('analyze-spending/', llm_views.analyze_spending_pattern, name='analyze_spending'),
+    path('batch/analyze-spending/', views.batch_analyze_spending, name='batch_analyze_spending'),
+    path('users/<str:user_id>/transactions/', views.user_transactions, name='user_transactions'),
+    path('users/<str:user_id>/transactions/import/', views.import_statement, name='import_statement'),
+    path('users/<str:user_id>/spending/', views.user_spending, name='user_spending'),
     path('test/', views.test_endpoint, name='test_endpoint'),
 ]
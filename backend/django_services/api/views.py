@@ -1,293 +1,735 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from datetime import datetime
+from functools import wraps
+import importlib.util
 import json
+import logging
 import os
 import time
 
-# Import Cerebras agent
+from agents.analytics import TransactionFrame, spending_summary
+from agents import advice_packs, forecasting, jobs, ledger, startup
+from agents.statement_import import import_batches, read_lines
+from agents.batch import analyze_spending_batch
+from agents.models import AdviceJob, ChatSession
+from agents.chat_sessions import create_session, reply, session_payload
+from agents.metrics import render_prometheus
+
+from .streaming import (
+    EventStreamEncoder, event_stream_response, json_lines_response, stream_requested, streaming_renderers,
+)
+from .throttling import BatchLLMGate
+
+# Import Cerebras agent helpers; the agent and the LLM SDK load on first use (agents.llm_client)
 try:
-    from agents.financial_crew import SimpleFinancialAgent
-    AGENT_AVAILABLE = True
+    from agents.health import ensure_prober_started, upstream_status
+    from agents.llm_client import get_agent
+    from agents.router import get_router
+    from agents.fast_path import get_fast_path
+    from agents.prompts import template_stats
+    from agents.ratelimit import get_quota
+    from agents.response_cache import get_response_cache
+    AGENT_AVAILABLE = importlib.util.find_spec('openai') is not None
 except ImportError:
     AGENT_AVAILABLE = False
-    print("⚠️ SimpleFinancialAgent not available - using mock mode")
+logger = logging.getLogger(__name__)
+if not AGENT_AVAILABLE:
+    logger.warning("SimpleFinancialAgent not available - using mock mode")
+
+QUICK_CHAT_EXAMPLE = {
+    'question': 'How can I save money as a delivery driver?',
+    'context': {'income': '20000', 'expenses': '18000', 'occupation': 'delivery driver'}
+}
+
+# Most turns returned by GET /api/chat/sessions/<id>/
+CHAT_TURNS_PAGE = 50
+
+# Most transactions returned by GET /api/users/<user_id>/transactions/
+TRANSACTIONS_PAGE = 200
+
+ADVICE_REQUIRED_FIELDS = ['income_pattern', 'income_range', 'occupation', 'monthly_expenses', 'current_savings', 'goals']
+
+SPENDING_EXAMPLE = {
+    'transactions': [
+        {'amount': '500', 'category': 'food', 'date': '2025-10-14'},
+        {'amount': '200', 'category': 'fuel', 'date': '2025-10-14'}
+    ],
+    'user_context': {'occupation': 'delivery driver', 'income': '20000'}
+}
+
+BATCH_EXAMPLE = {
+    'users': [
+        {'user_id': 'u1', 'transactions': SPENDING_EXAMPLE['transactions'], 'user_context': SPENDING_EXAMPLE['user_context']}
+    ],
+    'include_ai': True
+}
+
+def parsed_body(view):
+    """Parse request.data before the view's catch-all handlers, so DRF answers malformed
+    (400) and unsupported (415) bodies itself, as the async views do"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.data
+        return view(request, *args, **kwargs)
+    return wrapper
+
+# Response builders shared by the sync views below and api/async_views.py
+
+def error_payload(error, **extra):
+    """Error body in the shape every endpoint uses"""
+    payload = {'success': False, 'error': error}
+    payload.update(extra)
+    payload['timestamp'] = datetime.now().isoformat()
+    return payload
+
+def quick_chat_payload(result, start_time):
+    """Build the quick chat response body from an agent result"""
+    response_time = round((time.time() - start_time) * 1000, 2)  # ms
+
+    if result['success']:
+        return {
+            'success': True,
+            'response': result['response'],
+            'timestamp': datetime.now().isoformat(),
+            'model': result.get('model', 'Cerebras Llama3.1-8B'),  # ✅ CHANGED HERE
+            'response_time_ms': response_time,
+            'powered_by': 'MoneyMitra rules' if result.get('fast_path') else 'Cerebras AI',
+            'cached': result.get('cached', False),
+            'fast_path': result.get('fast_path')
+        }
+    # Use fallback response if Cerebras fails
+    return {
+        'success': True,
+        'response': result.get('fallback_response', 'Technical issue occurred. Please try again.'),
+        'timestamp': datetime.now().isoformat(),
+        'model': 'Fallback Mode',
+        'error_details': result.get('error', 'Unknown error')
+    }
+
+def advice_payload(advice_result, start_time):
+    """Build the financial advice response body from an agent result"""
+    response_time = round((time.time() - start_time) * 1000, 2)
+
+    if advice_result['success']:
+        return {
+            'success': True,
+            'advice': advice_result['advice'],
+            'user_profile': advice_result.get('user_profile', {}),
+            'cash_flow': advice_result.get('cash_flow'),
+            'sections': advice_result.get('sections'),
+            'pack': advice_result.get('pack'),
+            'timestamp': datetime.now().isoformat(),
+            'model': advice_result.get('model_used', 'Cerebras Llama3.1-8B'),  # ✅ CHANGED HERE
+            'response_time_ms': response_time,
+            'analysis_type': 'precomputed' if advice_result.get('pack') else 'comprehensive'
+        }
+    return {
+        'success': True,
+        'advice': advice_result.get('fallback_advice', 'Basic financial advice provided due to technical issues.'),
+        'timestamp': datetime.now().isoformat(),
+        'model': 'Fallback Mode',
+        'error_details': advice_result.get('error')
+    }
+
+def basic_spending_analysis(frame):
+    """Basic analysis (always available)"""
+    return spending_summary(frame)
+
+def spending_payload(basic_analysis, ai_insights, analysis_type, start_time):
+    """Build the spending analysis response body"""
+    return {
+        'success': True,
+        'basic_analysis': basic_analysis,
+        'ai_insights': ai_insights,
+        'timestamp': datetime.now().isoformat(),
+        'response_time_ms': round((time.time() - start_time) * 1000, 2),
+        'analysis_type': analysis_type
+    }
+
+def stored_spending(user_id, days=None):
+    """(recent transactions, their frame, basic analysis) from the transaction store, or None"""
+    stored = ledger.stored_summary(user_id, days)
+    if stored is None:
+        return None
+    basic_analysis, transactions = stored
+    return transactions, TransactionFrame.from_records(transactions), basic_analysis
+
+def spending_days(params):
+    """Analysis window in days from a request, or None for the default"""
+    try:
+        days = int(params.get('days') or 0)
+    except (TypeError, ValueError):
+        return None
+    return min(days, 3660) if days > 0 else None
+
+def owns_user(request, user_id):
+    """True when the request carries the user's access key (X-User-Key, see agents.ledger)"""
+    return ledger.owns(str(user_id), request.META.get('HTTP_X_USER_KEY', ''))
+
+def writable_user(request, user_id):
+    """(allowed, new key): the owner may write, and an unused user id is claimed with a key returned once"""
+    if owns_user(request, user_id):
+        return True, None
+    key = ledger.claim(user_id)
+    return key is not None, key
+
+def user_not_found(user_id):
+    """The 404 body for users that don't exist or aren't the caller's"""
+    return error_payload(f'No stored transactions for user {user_id}')
+
+def with_stored_profile(user_data):
+    """Advice request data with recent transactions, expenses and the cash-flow forecast filled in from the store"""
+    user_id = user_data.get('user_id')
+    if not user_id:
+        return user_data
+    user_data = dict(user_data)
+    if not user_data.get('recent_transactions'):
+        user_data['recent_transactions'] = ledger.recent_transactions(user_id, limit=50)
+    if not user_data.get('monthly_expenses'):
+        expenses = ledger.average_monthly_spending(user_id)
+        if expenses is not None:
+            user_data['monthly_expenses'] = str(round(expenses))
+    user_data['cash_flow'] = forecasting.stored_forecast(user_id, user_data.get('current_savings'))
+    return user_data
+
+def job_requested(request):
+    """True when the client asked for advice as a background job"""
+    if 'respond-async' in request.META.get('HTTP_PREFER', ''):
+        return True
+    flag = request.data.get('async', False)
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+def ai_requested(request):
+    """True unless the batch asked for basic analysis only ("include_ai": false)"""
+    flag = request.data.get('include_ai', True)
+    return flag is True or str(flag).lower() in ('1', 'true', 'yes')
+
+def job_payload(job):
+    """Job state for API responses; finished advice jobs carry the usual advice body"""
+    payload = {
+        'success': True,
+        'job_id': str(job.pk),
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.pk}/',
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'expires_at': job.expires_at.isoformat(),
+    }
+    if job.status == AdviceJob.SUCCEEDED:
+        payload['result'] = advice_payload(job.result, job.started_at.timestamp())
+        payload['result']['response_time_ms'] = round((job.finished_at - job.started_at).total_seconds() * 1000, 2)
+    elif job.status in AdviceJob.FINISHED:
+        payload['error'] = job.error
+    return payload
+
+def served_pack(user_data, start_time):
+    """Advice body from the nearest precomputed pack, or None to run the agent.
+
+    With "personalize" the full request is also queued as a background job.
+    """
+    if not advice_packs.pack_requested(user_data):
+        return None
+    found = advice_packs.get_pack_store().lookup(user_data)
+    if found is None:
+        return None
+    payload = advice_payload(advice_packs.pack_result(*found), start_time)
+    if advice_packs.personalize_requested(user_data):
+        try:
+            job = jobs.submit({k: v for k, v in user_data.items()
+                               if k not in ('async', 'stream', 'pack', 'personalize')})
+            payload['personalized_job'] = job_payload(job)
+        except jobs.QueueFull:
+            payload['personalized_job'] = None
+    return payload
+
+def job_wait_seconds(params):
+    try:
+        return float(params.get('wait') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def spending_ai_outcome(ai_result):
+    """Map an agent spending result to (ai_insights, analysis_type)"""
+    if ai_result['success']:
+        return ai_result['ai_insights'], 'ai_powered'
+    # Return basic analysis if AI fails
+    return 'AI analysis temporarily unavailable. Basic analysis provided.', 'basic'
+
+# Upstream readiness -> legacy cerebras_status values
+CEREBRAS_STATUS = {
+    'ready': 'connected',
+    'degraded': 'degraded',
+    'unavailable': 'connection_failed',
+    'unknown': 'unknown',
+}
+
+def upstream_snapshot():
+    """Cached upstream readiness; never calls the LLM on the request path"""
+    ensure_prober_started()
+    return upstream_status()
+
+def advice_job_stats():
+    try:
+        return jobs.queue_stats()
+    except Exception:
+        # Tables missing (migrations not applied) or the database is down
+        return None
 
 @api_view(['GET'])
 def health_check(request):
     """Enhanced health check with Cerebras status"""
     cerebras_status = "unknown"
-    
+    upstream = None
+
     if AGENT_AVAILABLE:
         try:
-            from agents.financial_crew import test_cerebras_connection
-            if test_cerebras_connection():
-                cerebras_status = "connected"
-            else:
-                cerebras_status = "connection_failed"
-        except:
+            upstream = upstream_snapshot()
+            cerebras_status = CEREBRAS_STATUS.get(upstream['status'], 'unknown')
+        except Exception:
             cerebras_status = "error"
-    
+
     return Response({
         'status': 'healthy',
         'service': 'MoneyMitra Financial Coaching API - Production Ready',
         'timestamp': datetime.now().isoformat(),
         'version': '2.0.0',
         'cerebras_status': cerebras_status,
+        'upstream': upstream,
+        'response_cache': get_response_cache().stats() if AGENT_AVAILABLE else None,
+        'fast_path': get_fast_path().stats() if AGENT_AVAILABLE else None,
+        'backends': get_router().snapshot() if AGENT_AVAILABLE else None,
+        'prompts': template_stats() if AGENT_AVAILABLE else None,
+        'upstream_quota': get_quota().snapshot() if AGENT_AVAILABLE else None,
+        'advice_jobs': advice_job_stats(),
+        'startup': startup.report(),
+        'advice_packs': advice_packs.get_pack_store().stats(),
         'endpoints': [
             '/api/health/',
+            '/api/health/live/',
+            '/api/health/ready/',
+            '/api/metrics/',
             '/api/quick-chat/',
+            '/api/chat/sessions/',
             '/api/financial-advice/',
+            '/api/jobs/<job_id>/',
             '/api/analyze-spending/',
+            '/api/users/<user_id>/transactions/',
+            '/api/users/<user_id>/transactions/import/',
+            '/api/users/<user_id>/spending/',
             '/api/test/'
         ]
     })
 
+@api_view(['GET'])
+def liveness(request):
+    """Liveness probe: the process is up and serving requests"""
+    return Response({'status': 'alive', 'timestamp': datetime.now().isoformat()})
+
+@api_view(['GET'])
+def readiness(request):
+    """Readiness probe from the background prober's cached upstream status"""
+    if not AGENT_AVAILABLE:
+        return Response({'status': 'unavailable', 'reason': 'agent not available'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    upstream = upstream_snapshot()
+    # Fallback answers keep the API usable while degraded; only a dead upstream is "not ready"
+    http_status = status.HTTP_503_SERVICE_UNAVAILABLE if upstream['status'] == 'unavailable' else status.HTTP_200_OK
+    return Response(dict(upstream, timestamp=datetime.now().isoformat()), status=http_status)
+
+def metrics(request):
+    """Prometheus text exposition of this worker's metrics"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @api_view(['POST'])
+@renderer_classes(streaming_renderers())
 @csrf_exempt
+@parsed_body
 def quick_financial_chat(request):
     """Quick chat with Cerebras-powered financial agent"""
     start_time = time.time()
-    
+
     try:
         question = request.data.get('question', '')
         context = request.data.get('context', {})
-        
+
         if not question:
-            return Response({
-                'success': False,
-                'error': 'No question provided',
-                'example': {
-                    'question': 'How can I save money as a delivery driver?',
-                    'context': {'income': '20000', 'expenses': '18000', 'occupation': 'delivery driver'}
-                }
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
+            return Response(error_payload('No question provided', example=QUICK_CHAT_EXAMPLE),
+                            status=status.HTTP_400_BAD_REQUEST)
+
         if AGENT_AVAILABLE:
             try:
-                agent = SimpleFinancialAgent()
+                agent = get_agent()
+
+                if stream_requested(request):
+                    encoder = EventStreamEncoder(quick_chat_payload, 'response', start_time)
+                    return event_stream_response(
+                        encoder.iter_frames(agent.stream_quick_chat(question, context)))
+
                 result = agent.quick_chat(question, context)
-                
-                response_time = round((time.time() - start_time) * 1000, 2)  # ms
-                
-                if result['success']:
-                    return Response({
-                        'success': True,
-                        'response': result['response'],
-                        'timestamp': datetime.now().isoformat(),
-                        'model': result.get('model', 'Cerebras Llama3.1-8B'),  # ✅ CHANGED HERE
-                        'response_time_ms': response_time,
-                        'powered_by': 'Cerebras AI'
-                    })
-                else:
-                    # Use fallback response if Cerebras fails
-                    return Response({
-                        'success': True,
-                        'response': result.get('fallback_response', 'Technical issue occurred. Please try again.'),
-                        'timestamp': datetime.now().isoformat(),
-                        'model': 'Fallback Mode',
-                        'error_details': result.get('error', 'Unknown error')
-                    })
-                    
+                return Response(quick_chat_payload(result, start_time))
+
             except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': f'Agent error: {str(e)}',
-                    'timestamp': datetime.now().isoformat()
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                return Response(error_payload(f'Agent error: {str(e)}'),
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
-            return Response({
-                'success': False,
-                'error': 'Financial agent not available. Please check configuration.',
-                'timestamp': datetime.now().isoformat()
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
+            return Response(error_payload('Financial agent not available. Please check configuration.'),
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
     except Exception as e:
-        return Response({
-            'success': False,
-            'error': f'Request processing error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(error_payload(f'Request processing error: {str(e)}'),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@csrf_exempt
+@parsed_body
+def create_chat_session(request):
+    """Start a server-side chat session; later messages only send the question"""
+    context = request.data.get('context', {})
+    if not isinstance(context, dict):
+        return Response(error_payload('context must be an object'), status=status.HTTP_400_BAD_REQUEST)
+    session = create_session(context)
+    return Response(dict(session_payload(session), success=True), status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'DELETE'])
+@csrf_exempt
+def chat_session_detail(request, session_id):
+    """Session state with its latest turns, or delete the session"""
+    session = ChatSession.objects.filter(pk=session_id).first()
+    if session is None:
+        return Response(error_payload('Chat session not found'), status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        limit = min(max(int(request.query_params.get('limit', CHAT_TURNS_PAGE)), 1), CHAT_TURNS_PAGE)
+    except ValueError:
+        limit = CHAT_TURNS_PAGE
+    turns = list(session.turns.order_by('-index')[:limit])[::-1]
+    return Response(dict(session_payload(session, turns), success=True))
+
+def chat_message_payload(result, turn, session_id, start_time):
+    """Quick chat response body plus the session fields"""
+    payload = quick_chat_payload(result, start_time)
+    payload['session_id'] = str(session_id)
+    payload['turn'] = turn.index if turn is not None else None
+    return payload
 
 @api_view(['POST'])
 @csrf_exempt
+@parsed_body
+def chat_session_message(request, session_id):
+    """Ask a follow-up question inside a chat session"""
+    start_time = time.time()
+
+    try:
+        question = request.data.get('question', '')
+        context = request.data.get('context') or {}
+
+        if not question:
+            return Response(error_payload('No question provided', example={'question': QUICK_CHAT_EXAMPLE['question']}),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        session = ChatSession.objects.filter(pk=session_id).first()
+        if session is None:
+            return Response(error_payload('Chat session not found'), status=status.HTTP_404_NOT_FOUND)
+
+        if not AGENT_AVAILABLE:
+            return Response(error_payload('Financial agent not available. Please check configuration.'),
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        result, turn = reply(get_agent(), session, question, context)
+        return Response(chat_message_payload(result, turn, session.pk, start_time))
+
+    except Exception as e:
+        return Response(error_payload(f'Request processing error: {str(e)}'),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@renderer_classes(streaming_renderers())
+@csrf_exempt
+@parsed_body
 def get_financial_advice(request):
     """Comprehensive financial coaching using Cerebras AI"""
     start_time = time.time()
-    
+
     try:
         user_data = request.data
-        
+
         if not user_data:
-            return Response({
-                'success': False,
-                'error': 'No user data provided',
-                'required_fields': ['income_pattern', 'income_range', 'occupation', 'monthly_expenses', 'current_savings', 'goals']
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
+            return Response(error_payload('No user data provided', required_fields=ADVICE_REQUIRED_FIELDS),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if user_data.get('user_id') and not owns_user(request, user_data['user_id']):
+            return Response(user_not_found(user_data['user_id']), status=status.HTTP_404_NOT_FOUND)
+        user_data = with_stored_profile(user_data)
+
         if AGENT_AVAILABLE:
             try:
-                agent = SimpleFinancialAgent()
-                advice_result = agent.get_financial_advice(user_data)
-                
-                response_time = round((time.time() - start_time) * 1000, 2)
-                
-                if advice_result['success']:
-                    return Response({
-                        'success': True,
-                        'advice': advice_result['advice'],
-                        'user_profile': advice_result.get('user_profile', {}),
-                        'timestamp': datetime.now().isoformat(),
-                        'model': advice_result.get('model_used', 'Cerebras Llama3.1-8B'),  # ✅ CHANGED HERE
-                        'response_time_ms': response_time,
-                        'analysis_type': 'comprehensive'
-                    })
-                else:
-                    return Response({
-                        'success': True,
-                        'advice': advice_result.get('fallback_advice', 'Basic financial advice provided due to technical issues.'),
-                        'timestamp': datetime.now().isoformat(),
-                        'model': 'Fallback Mode',
-                        'error_details': advice_result.get('error')
-                    })
-                    
+                if job_requested(request):
+                    job = jobs.submit({k: v for k, v in user_data.items() if k not in ('async', 'stream')})
+                    response = Response(job_payload(job), status=status.HTTP_202_ACCEPTED)
+                    response['Location'] = f'/api/jobs/{job.pk}/'
+                    return response
+
+                if stream_requested(request):
+                    encoder = EventStreamEncoder(advice_payload, 'advice', start_time)
+                    return event_stream_response(
+                        encoder.iter_frames(get_agent().stream_financial_advice(user_data)))
+
+                pack = served_pack(user_data, start_time)
+                if pack is not None:
+                    return Response(pack)
+
+                advice_result = get_agent().get_financial_advice(user_data)
+                return Response(advice_payload(advice_result, start_time))
+
+            except jobs.QueueFull as e:
+                return Response(error_payload(str(e)), status=status.HTTP_429_TOO_MANY_REQUESTS)
             except Exception as e:
-                return Response({
-                    'success': False,
-                    'error': f'Financial analysis error: {str(e)}',
-                    'timestamp': datetime.now().isoformat()
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                return Response(error_payload(f'Financial analysis error: {str(e)}'),
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
-            return Response({
-                'success': False,
-                'error': 'Financial agent not available',
-                'timestamp': datetime.now().isoformat()
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
+            return Response(error_payload('Financial agent not available'),
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
     except Exception as e:
-        return Response({
-            'success': False,
-            'error': f'Request error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(error_payload(f'Request error: {str(e)}'),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'DELETE'])
+@csrf_exempt
+def advice_job(request, job_id):
+    """Advice job state (GET); DELETE cancels a queued job.
+
+    ?wait=seconds long-polls only in the async view (SERVER_MODE=asgi): here the
+    state is returned at once and the client polls again.
+    """
+    if request.method == 'DELETE':
+        if jobs.cancel(job_id):
+            return Response(job_payload(AdviceJob.objects.get(pk=job_id)))
+        job = AdviceJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response(error_payload('Job not found'), status=status.HTTP_404_NOT_FOUND)
+        return Response(error_payload(f'Job is {job.status} and can no longer be cancelled'),
+                        status=status.HTTP_409_CONFLICT)
+
+    job = AdviceJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return Response(error_payload('Job not found'), status=status.HTTP_404_NOT_FOUND)
+    return Response(job_payload(job))
 
 @api_view(['POST'])
 @csrf_exempt
+@parsed_body
 def analyze_spending_pattern(request):
     """AI-powered spending pattern analysis"""
     start_time = time.time()
-    
+
     try:
         transactions = request.data.get('transactions', [])
         user_context = request.data.get('user_context', {})
-        
-        if not transactions:
-            return Response({
-                'success': False,
-                'error': 'No transaction data provided',
-                'example': {
-                    'transactions': [
-                        {'amount': '500', 'category': 'food', 'date': '2025-10-14'},
-                        {'amount': '200', 'category': 'fuel', 'date': '2025-10-14'}
-                    ],
-                    'user_context': {'occupation': 'delivery driver', 'income': '20000'}
-                }
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Basic analysis (always available)
-        total_spent = 0
-        categories = {}
-        daily_spending = {}
-        
-        for transaction in transactions:
-            try:
-                amount = float(transaction.get('amount', 0))
-                category = transaction.get('category', 'other').lower()
-                date = transaction.get('date', 'unknown')
-                
-                total_spent += amount
-                categories[category] = categories.get(category, 0) + amount
-                daily_spending[date] = daily_spending.get(date, 0) + amount
-                
-            except (ValueError, TypeError):
-                continue
-        
-        basic_analysis = {
-            'total_spent': total_spent,
-            'category_breakdown': categories,
-            'transaction_count': len(transactions),
-            'average_transaction': round(total_spent / len(transactions), 2) if transactions else 0,
-            'top_categories': sorted(categories.items(), key=lambda x: x[1], reverse=True)[:3]
-        }
-        
-        response_time = round((time.time() - start_time) * 1000, 2)
-        
+        user_id = request.data.get('user_id')
+        summary = None
+
+        if not transactions and user_id:
+            # Stored history: read the precomputed rollups instead of a resent list
+            stored = stored_spending(str(user_id), spending_days(request.data)) if owns_user(request, user_id) else None
+            if stored is None:
+                return Response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+            transactions, frame, summary = stored
+            basic_analysis = summary
+        elif not transactions:
+            return Response(error_payload('No transaction data provided', example=SPENDING_EXAMPLE),
+                            status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Parse once; the agent reuses the same columns
+            frame = TransactionFrame.from_records(transactions)
+            basic_analysis = basic_spending_analysis(frame)
+
         if AGENT_AVAILABLE:
             try:
-                agent = SimpleFinancialAgent()
-                ai_result = agent.analyze_spending_with_ai(transactions, user_context)
-                
-                if ai_result['success']:
-                    return Response({
-                        'success': True,
-                        'basic_analysis': basic_analysis,
-                        'ai_insights': ai_result['ai_insights'],
-                        'timestamp': datetime.now().isoformat(),
-                        'response_time_ms': response_time,
-                        'analysis_type': 'ai_powered'
-                    })
-                else:
-                    # Return basic analysis if AI fails
-                    return Response({
-                        'success': True,
-                        'basic_analysis': basic_analysis,
-                        'ai_insights': 'AI analysis temporarily unavailable. Basic analysis provided.',
-                        'timestamp': datetime.now().isoformat(),
-                        'response_time_ms': response_time,
-                        'analysis_type': 'basic'
-                    })
-                    
+                agent = get_agent()
+                ai_result = agent.analyze_spending_with_ai(transactions, user_context, frame=frame, summary=summary)
+                ai_insights, analysis_type = spending_ai_outcome(ai_result)
+                return Response(spending_payload(basic_analysis, ai_insights, analysis_type, start_time))
+
             except Exception as e:
-                return Response({
-                    'success': True,
-                    'basic_analysis': basic_analysis,
-                    'ai_insights': f'AI analysis error: {str(e)}. Basic analysis provided.',
-                    'timestamp': datetime.now().isoformat(),
-                    'response_time_ms': response_time,
-                    'analysis_type': 'basic_fallback'
-                })
+                return Response(spending_payload(
+                    basic_analysis, f'AI analysis error: {str(e)}. Basic analysis provided.',
+                    'basic_fallback', start_time))
         else:
-            return Response({
-                'success': True,
-                'basic_analysis': basic_analysis,
-                'ai_insights': 'AI analysis not available. Showing basic spending breakdown.',
-                'timestamp': datetime.now().isoformat(),
-                'response_time_ms': response_time,
-                'analysis_type': 'basic_only'
-            })
-        
+            return Response(spending_payload(
+                basic_analysis, 'AI analysis not available. Showing basic spending breakdown.',
+                'basic_only', start_time))
+
+    except Exception as e:
+        return Response(error_payload(f'Analysis error: {str(e)}'),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@renderer_classes(streaming_renderers())
+@csrf_exempt
+@parsed_body
+def batch_analyze_spending(request):
+    """Bulk spending analysis for many users, streamed back as JSON Lines"""
+    try:
+        users = request.data.get('users', [])
+
+        if not users or not isinstance(users, list):
+            return Response(error_payload('No users provided', example=BATCH_EXAMPLE),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(users) > settings.BATCH_MAX_USERS:
+            return Response(error_payload(f'Too many users in one batch (max {settings.BATCH_MAX_USERS})'),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        agent = None
+        if AGENT_AVAILABLE and ai_requested(request):
+            try:
+                agent = get_agent()
+            except Exception:
+                agent = None
+
+        rows = analyze_spending_batch(
+            users, agent,
+            include_ai=agent is not None,
+            max_workers=settings.BATCH_MAX_WORKERS,
+            rate_per_second=settings.BATCH_LLM_RATE,
+            admit=BatchLLMGate(request),
+        )
+        return json_lines_response(rows)
+
     except Exception as e:
+        return Response(error_payload(f'Batch error: {str(e)}'),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'POST'])
+@csrf_exempt
+@parsed_body
+def user_transactions(request, user_id):
+    """Store transactions for a user (POST) or list the latest ones (GET).
+
+    Reads and later writes need the X-User-Key returned by the first write.
+    """
+    if request.method == 'GET':
+        if not owns_user(request, user_id):
+            return Response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(max(int(request.query_params.get('limit', TRANSACTIONS_PAGE)), 1), TRANSACTIONS_PAGE)
+        except ValueError:
+            limit = TRANSACTIONS_PAGE
         return Response({
-            'success': False,
-            'error': f'Analysis error: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            'success': True,
+            'user_id': user_id,
+            'transactions': ledger.recent_transactions(user_id, limit=limit),
+        })
+
+    issued = {}
+    try:
+        transactions = request.data.get('transactions', [])
+
+        if not transactions or not isinstance(transactions, list):
+            return Response(error_payload('No transaction data provided',
+                                          example={'transactions': SPENDING_EXAMPLE['transactions']}),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(user_id) > 64:
+            return Response(error_payload('user_id is limited to 64 characters'), status=status.HTTP_400_BAD_REQUEST)
+        if len(transactions) > settings.LEDGER_MAX_BATCH:
+            return Response(error_payload(f'Too many transactions in one request (max {settings.LEDGER_MAX_BATCH})'),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        allowed, key = writable_user(request, user_id)
+        if not allowed:
+            return Response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+        issued = {'user_key': key} if key else {}
+
+        result = ledger.ingest(user_id, transactions)
+        return Response(dict(result, success=True, user_id=user_id, **issued), status=status.HTTP_201_CREATED)
+
+    except Exception as e:
+        return Response(error_payload(f'Ingestion error: {str(e)}', **issued),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@renderer_classes(streaming_renderers())
+@csrf_exempt
+def import_statement(request, user_id):
+    """Import a CSV or JSON Lines statement (raw body or multipart 'file') in bounded-memory batches.
+
+    With Accept: application/x-ndjson, progress is streamed as one JSON line per batch.
+    A first import for an unused user id returns its X-User-Key as "user_key".
+    """
+    if len(user_id) > 64:
+        return Response(error_payload('user_id is limited to 64 characters'), status=status.HTTP_400_BAD_REQUEST)
+    issued = {}
+
+    try:
+        # Never touch request.data here: the body is read line by line below
+        if request.content_type.startswith('multipart/form-data'):
+            source = request.FILES.get('file')
+        else:
+            source = request.stream
+        if source is None:
+            return Response(error_payload('No statement provided: send CSV / JSON Lines as the body or a "file" upload'),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        allowed, key = writable_user(request, user_id)
+        if not allowed:
+            return Response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+        issued = {'user_key': key} if key else {}
+
+        batches = import_batches(user_id, read_lines(source), batch_size=settings.LEDGER_IMPORT_BATCH)
+
+        if 'application/x-ndjson' in request.META.get('HTTP_ACCEPT', ''):
+            def progress():
+                stats = None
+                try:
+                    for stats in batches:
+                        yield dict(stats, user_id=user_id, done=False, **issued)
+                except Exception as e:
+                    yield error_payload(f'Import error: {str(e)}', user_id=user_id, done=True, progress=stats, **issued)
+                    return
+                yield dict(stats, success=True, user_id=user_id, done=True, **issued)
+            return json_lines_response(progress())
+
+        stats = None
+        for stats in batches:
+            pass
+        return Response(dict(stats, success=True, user_id=user_id, **issued), status=status.HTTP_201_CREATED)
+
+    except ValueError as e:
+        return Response(error_payload(f'Invalid statement: {str(e)}', **issued), status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(error_payload(f'Import error: {str(e)}', **issued),
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def user_spending(request, user_id):
+    """Precomputed spending aggregates for a user (no LLM call)"""
+    start_time = time.time()
+    stored = ledger.stored_summary(user_id, spending_days(request.query_params)) if owns_user(request, user_id) else None
+    if stored is None:
+        return Response(user_not_found(user_id), status=status.HTTP_404_NOT_FOUND)
+    return Response(spending_payload(stored[0], None, 'stored', start_time))
 
 @api_view(['GET', 'POST'])
 def test_endpoint(request):
     """Enhanced test endpoint"""
     cerebras_test = False
-    
+
     if AGENT_AVAILABLE and request.method == 'POST':
         try:
-            from agents.financial_crew import test_cerebras_connection
-            cerebras_test = test_cerebras_connection()
+            cerebras_test = upstream_snapshot()['status'] in ('ready', 'degraded')
         except:
             pass
-    
+
     return Response({
         'message': 'MoneyMitra API - Production Ready! 🚀',
         'method': request.method,
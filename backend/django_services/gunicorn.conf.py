@@ -0,0 +1,49 @@
+import os
+
+# Gunicorn settings for both serving modes.
+#   SERVER_MODE=wsgi  -> sync workers, one in-flight LLM call per worker
+#   SERVER_MODE=asgi  -> uvicorn workers, async views keep many LLM calls in flight
+
+server_mode = os.getenv('SERVER_MODE', 'wsgi').lower()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+if server_mode == 'asgi':
+    wsgi_app = 'moneymitra.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'moneymitra.wsgi:application'
+    worker_class = 'sync'
+
+
+def post_worker_init(worker):
+    # Run queued advice jobs inside each worker (ADVICE_JOB_WORKERS=0 leaves them to manage.py run_advice_jobs)
+    try:
+        from agents.jobs import ensure_workers_started
+        ensure_workers_started()
+    except Exception:
+        pass
+    # Import the LLM SDK and build the agent in the background (LLM_PRELOAD=False: on first use)
+    try:
+        from agents.llm_client import preload_agent
+        preload_agent()
+    except Exception:
+        pass
+
+
+def worker_exit(server, worker):
+    # Stop claiming advice jobs; unfinished ones are picked up again when their lease runs out
+    try:
+        from agents.jobs import stop_workers
+        stop_workers()
+    except Exception:
+        pass
+    # Release pooled upstream connections
+    try:
+        from agents.llm_client import close_clients
+        close_clients()
+    except Exception:
+        pass
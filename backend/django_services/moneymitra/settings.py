@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,6 +17,12 @@ DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
+# Deployment profile: 'full' (admin site, sessions, auth) or 'lean' (JSON API only:
+# no admin/auth/sessions/messages apps or their middleware, for faster cold starts
+# and smaller workers). The API itself is the same in both.
+API_PROFILE = os.getenv('API_PROFILE', 'full').lower()
+LEAN_API = API_PROFILE == 'lean'
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -32,6 +39,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +50,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if LEAN_API:
+    INSTALLED_APPS = ['rest_framework', 'corsheaders', 'agents', 'api']
+    MIDDLEWARE = [
+        'corsheaders.middleware.CorsMiddleware',
+        'api.middleware.CompressionMiddleware',
+        'api.middleware.MetricsMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+
 ROOT_URLCONF = 'moneymitra.urls'
 
 TEMPLATES = [
@@ -52,14 +71,20 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
+            ] + ([] if LEAN_API else [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-            ],
+            ]),
         },
     },
 ]
 
 WSGI_APPLICATION = 'moneymitra.wsgi.application'
+ASGI_APPLICATION = 'moneymitra.asgi.application'
+
+# Serving mode: 'wsgi' (gunicorn sync workers) or 'asgi' (uvicorn workers, async LLM views)
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
+ASYNC_API_VIEWS = SERVER_MODE == 'asgi'
 
 # Database
 DATABASES = {
@@ -69,21 +94,64 @@ DATABASES = {
     }
 }
 
+def _throttle_rate(name, default):
+    """DRF rate string from the environment; 'none' turns the throttle off"""
+    rate = os.getenv(name, default)
+    return None if rate.lower() in ('', 'none', 'off') else rate
+
+# Response encoding: 'fast' (orjson when installed) or 'standard' (json); see api/renderers.py
+JSON_RENDERER = os.getenv('JSON_RENDERER', 'fast').lower()
+
+# Compress JSON responses of at least this many bytes (gzip, or br with brotli installed;
+# streams are never compressed); 0 disables
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '512'))
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer' if JSON_RENDERER == 'fast' else 'api.renderers.InstrumentedJSONRenderer',
     ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.InstrumentedJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Per-client request rates and LLM token budgets (api/throttling.py, agents/ratelimit.py)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBudgetThrottle',
+        'api.throttling.ClientRateThrottle',
+        'api.throttling.LLMRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'client': _throttle_rate('THROTTLE_CLIENT_RATE', '600/min'),
+        'llm': _throttle_rate('THROTTLE_LLM_RATE', '60/min'),
+    },
 }
 
+if LEAN_API:
+    # No auth apps: requests are anonymous and throttled by client IP
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = []
+    REST_FRAMEWORK['UNAUTHENTICATED_USER'] = None
+
+# Batch spending analysis (/api/batch/analyze-spending/ and the analyze_spending_batch command)
+BATCH_MAX_USERS = int(os.getenv('BATCH_MAX_USERS', '1000'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+BATCH_LLM_RATE = float(os.getenv('BATCH_LLM_RATE', '5'))  # upstream calls per second
+
+# Transaction store (/api/users/<user_id>/transactions/)
+LEDGER_MAX_BATCH = int(os.getenv('LEDGER_MAX_BATCH', '5000'))  # transactions per ingest request
+LEDGER_IMPORT_BATCH = int(os.getenv('LEDGER_IMPORT_BATCH', '1000'))  # rows written per statement import batch
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+# Access key for a user's stored transactions (agents.ledger)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-user-key')
 
-# Password validation
+# Password validation (full profile)
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
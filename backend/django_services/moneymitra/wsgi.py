@@ -8,9 +8,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+import time
+
+# Start-up timing covers importing Django too (agents.startup)
+STARTED = time.perf_counter()
 
 from django.core.wsgi import get_wsgi_application
 
+from agents import startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moneymitra.settings')
 
 application = get_wsgi_application()
+
+startup.finish(STARTED, 'wsgi')